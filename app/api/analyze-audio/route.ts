@@ -1,6 +1,36 @@
 import { type NextRequest, NextResponse } from "next/server"
 
 const BACKEND_URL = process.env.BACKEND_API_URL || "http://localhost:8000"
+const POLL_INTERVAL_MS = 1000
+const ANALYSIS_TIMEOUT_MS = Number(process.env.ANALYSIS_TIMEOUT_MS || 10 * 60 * 1000)
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms))
+
+// Consulta o job no backend até concluir (sem manter uma conexão aberta durante a análise)
+async function waitForJob(jobId: string) {
+  const deadline = Date.now() + ANALYSIS_TIMEOUT_MS
+
+  while (Date.now() < deadline) {
+    const response = await fetch(`${BACKEND_URL}/api/jobs/${jobId}`, { cache: "no-store" })
+
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({}))
+      throw new Error(errorData.detail || "Erro ao consultar análise")
+    }
+
+    const job = await response.json()
+    if (job.status === "done") {
+      return job.result
+    }
+    if (job.status === "error") {
+      throw new Error(job.error || "Erro ao analisar áudio")
+    }
+
+    await sleep(POLL_INTERVAL_MS)
+  }
+
+  throw new Error("Tempo limite excedido aguardando a análise")
+}
 
 export async function POST(request: NextRequest) {
   try {
@@ -14,17 +44,38 @@ export async function POST(request: NextRequest) {
     const backendFormData = new FormData()
     backendFormData.append("file", audioFile)
 
-    const response = await fetch(`${BACKEND_URL}/api/analyze`, {
+    // Identifica o cliente para o limite de taxa do backend: o endereço da
+    // conexão (X-Real-IP, definido por frontend-server.js) entra como último
+    // salto; o backend só confia nele, os anteriores vêm do cliente
+    const peer = request.headers.get("x-real-ip")
+    const forwardedFor = peer
+      ? [request.headers.get("x-forwarded-for"), peer].filter(Boolean).join(", ")
+      : null
+    const response = await fetch(`${BACKEND_URL}/api/jobs`, {
       method: "POST",
       body: backendFormData,
+      headers: forwardedFor ? { "X-Forwarded-For": forwardedFor } : undefined,
     })
 
+    // Limite de taxa (429) e sobrecarga (503) são repassados ao cliente
+    if (response.status === 429 || response.status === 503) {
+      const errorData = await response.json().catch(() => ({}))
+      return NextResponse.json(
+        { error: errorData.detail || "Servidor ocupado, tente novamente" },
+        {
+          status: response.status,
+          headers: { "Retry-After": response.headers.get("Retry-After") || "5" },
+        },
+      )
+    }
+
     if (!response.ok) {
       const errorData = await response.json()
       throw new Error(errorData.detail || "Erro ao analisar áudio")
     }
 
-    const result = await response.json()
+    const { job_id: jobId } = await response.json()
+    const result = await waitForJob(jobId)
 
     return NextResponse.json({
       detected: result.analysis.gunshot_detected,
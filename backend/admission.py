@@ -0,0 +1,312 @@
+"""
+Controle de admissão das análises.
+
+Cada análise reserva, antes de decodificar o áudio, uma estimativa da
+memória que vai usar (a partir do tamanho do upload e da duração lida do
+cabeçalho); a soma das reservas nunca passa de ``ADMISSION_MEMORY_MB``.
+Quem não cabe espera em uma de duas faixas de prioridade:
+
+- ``interactive``: requisições de um único arquivo (/api/analyze, jobs);
+- ``batch``: /api/batch-analyze, que só ocupa ``ADMISSION_BATCH_FRACTION``
+  do orçamento e só é admitido quando não há interativo esperando.
+
+Assim um pedido interativo passa à frente de todo o lote pendente (o arquivo
+do lote que já está rodando termina normalmente). Quando a faixa está cheia
+(``ADMISSION_MAX_WAITING``) ou a espera passa de ``ADMISSION_TIMEOUT_SECONDS``
+a requisição é descartada com 503; cada cliente ainda tem um token bucket
+(``RATE_LIMIT_PER_MINUTE``/``RATE_LIMIT_BURST``, 429 ao esgotar).
+
+O cliente é o endereço da conexão. ``X-Forwarded-For`` só é lido quando a
+conexão vem de um proxy em ``TRUSTED_PROXIES`` (o frontend), e então só o
+último salto da lista, o que o próprio proxy acrescentou: os anteriores vêm
+do cliente e podem ser forjados.
+"""
+
+import ipaddress
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+from audio_decoder import audio_channels, audio_duration
+from audio_processor import CHUNKED_THRESHOLD_SECONDS
+from generate_audio_graphs import GRAPH_MAX_SECONDS
+from metrics import (
+    ADMISSION_REJECTIONS,
+    ADMISSION_WAIT_SECONDS,
+    MEMORY_RESERVED,
+    QUEUE_DEPTH,
+)
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_MEMORY_MB = float(os.getenv("ADMISSION_MEMORY_MB", "2048"))
+ADMISSION_BATCH_FRACTION = float(os.getenv("ADMISSION_BATCH_FRACTION", "0.5"))
+ADMISSION_MAX_WAITING = int(os.getenv("ADMISSION_MAX_WAITING", "32"))
+ADMISSION_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_TIMEOUT_SECONDS", "60"))
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "20"))
+# Proxies cujo X-Forwarded-For é aceito: IPs, redes (CIDR) ou nomes de host
+# (o serviço "frontend" do docker-compose); vazio ignora o cabeçalho
+TRUSTED_PROXIES = os.getenv("TRUSTED_PROXIES", "")
+# Nomes de host em TRUSTED_PROXIES são resolvidos de novo após este intervalo
+TRUSTED_PROXIES_TTL_SECONDS = 60.0
+
+LANES = ("interactive", "batch")
+
+# Pico de memória por segundo de áudio e custo fixo de uma análise, medidos
+# com run_analysis em WAV 44.1 kHz (~8.7 MiB/s: decodificação, STFT/MFCC,
+# espectrograma do modelo e, principalmente, os gráficos). Acima de
+# CHUNKED_THRESHOLD_SECONDS as features são extraídas em blocos e os gráficos
+# param em GRAPH_MAX_SECONDS, então a duração efetiva é limitada.
+BYTES_PER_AUDIO_SECOND = 9 * 1024 * 1024
+BASE_ANALYSIS_BYTES = 64 * 1024 * 1024
+MAX_RESIDENT_SECONDS = max(CHUNKED_THRESHOLD_SECONDS, GRAPH_MAX_SECONDS)
+# Formatos cujo cabeçalho o libsndfile não lê (M4A): duração pelo tamanho,
+# supondo 128 kbit/s
+COMPRESSED_BYTES_PER_SECOND = 16000
+
+
+class AdmissionRejected(Exception):
+    """Análise recusada; ``status_code`` 429 (limite do cliente) ou 503 (carga)"""
+
+    def __init__(self, reason: str, retry_after: float, status_code: int = 503):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.status_code = status_code
+
+
+def estimate_memory(audio_path: str, file_size: int, per_channel: bool = False) -> int:
+    """Memória (bytes) reservada para analisar o arquivo"""
+    duration = audio_duration(audio_path)
+    if duration is None:
+        duration = file_size / COMPRESSED_BYTES_PER_SECOND
+    # A decodificação multicanal mantém todos os canais na taxa nativa; em
+    # blocos (acima de CHUNKED_THRESHOLD_SECONDS) só a mistura mono é analisada
+    chunked = duration > CHUNKED_THRESHOLD_SECONDS
+    channels = audio_channels(audio_path) if per_channel and not chunked else 1
+    duration = min(duration, MAX_RESIDENT_SECONDS)
+    return int(BASE_ANALYSIS_BYTES + duration * channels * BYTES_PER_AUDIO_SECOND)
+
+
+class TokenBucket:
+    """Limite de taxa por cliente (``rate`` fichas por segundo, até ``burst``)"""
+
+    # Acima disso, clientes com o balde cheio (inativos) são descartados
+    MAX_CLIENTS = 10000
+
+    def __init__(self, rate_per_minute: float, burst: float):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def consume(self, client: str, tokens: float = 1.0) -> float:
+        """Retira ``tokens``; devolve 0 se permitido ou os segundos até haver saldo"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            level, updated = self._buckets.get(client, (self.burst, now))
+            level = min(self.burst, level + (now - updated) * self.rate)
+            # Um lote maior que o burst é aceito com o balde cheio (fica negativo)
+            needed = min(tokens, self.burst)
+            if level < needed:
+                self._buckets[client] = (level, now)
+                return (needed - level) / self.rate
+            self._buckets[client] = (level - tokens, now)
+            if len(self._buckets) > self.MAX_CLIENTS:
+                self._prune(now)
+        return 0.0
+
+    def _prune(self, now: float):
+        full = [
+            client
+            for client, (level, updated) in self._buckets.items()
+            if level + (now - updated) * self.rate >= self.burst
+        ]
+        for client in full:
+            del self._buckets[client]
+
+
+def _parse_ip(value: str) -> Optional[ipaddress._BaseAddress]:
+    """Endereço IP (IPv4 mapeado em IPv6 vira IPv4) ou None se inválido"""
+    try:
+        address = ipaddress.ip_address(value.strip())
+    except ValueError:
+        return None
+    if address.version == 6 and address.ipv4_mapped is not None:
+        return address.ipv4_mapped
+    return address
+
+
+class ProxyTrust:
+    """
+    Identifica o cliente de uma requisição que pode ter passado por proxies
+
+    ``trusted`` lista IPs, redes (CIDR) ou nomes de host; os nomes são
+    resolvidos a cada ``ttl`` segundos (o IP de um contêiner muda ao recriá-lo).
+    """
+
+    def __init__(
+        self, trusted: str = TRUSTED_PROXIES, ttl: float = TRUSTED_PROXIES_TTL_SECONDS
+    ):
+        self.ttl = ttl
+        self.networks: List[ipaddress._BaseNetwork] = []
+        self.hostnames: List[str] = []
+        for item in (i.strip() for i in trusted.split(",")):
+            if not item:
+                continue
+            try:
+                self.networks.append(ipaddress.ip_network(item, strict=False))
+            except ValueError:
+                self.hostnames.append(item)
+        self._resolved: FrozenSet[ipaddress._BaseAddress] = frozenset()
+        self._resolved_at = -math.inf
+        self._lock = threading.Lock()
+
+    def _resolve(self) -> FrozenSet[ipaddress._BaseAddress]:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._resolved_at < self.ttl:
+                return self._resolved
+            addresses = set()
+            for host in self.hostnames:
+                try:
+                    infos = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+                except OSError as e:
+                    logger.warning(f"Proxy confiável não resolvido ({host}): {e}")
+                    continue
+                addresses.update(_parse_ip(info[4][0]) for info in infos)
+            addresses.discard(None)
+            self._resolved = frozenset(addresses)
+            self._resolved_at = now
+            return self._resolved
+
+    def is_trusted(self, peer: str) -> bool:
+        address = _parse_ip(peer)
+        if address is None:
+            return False
+        if any(address in network for network in self.networks):
+            return True
+        return bool(self.hostnames) and address in self._resolve()
+
+    def client(self, peer: Optional[str], forwarded_for: Optional[str]) -> str:
+        """
+        Endereço do cliente: o último salto de ``forwarded_for`` se ``peer``
+        (a conexão) é um proxy confiável, senão o próprio ``peer``
+        """
+        if not peer:
+            return "unknown"
+        if forwarded_for and self.is_trusted(peer):
+            last_hop = _parse_ip(forwarded_for.rsplit(",", 1)[-1])
+            if last_hop is not None:
+                return str(last_hop)
+        address = _parse_ip(peer)
+        return str(address) if address is not None else peer
+
+
+class AdmissionController:
+    """
+    Orçamento de memória compartilhado pelas análises do processo
+
+    ``admit(custo, faixa)`` bloqueia até a reserva caber (threads: workers de
+    jobs e o threadpool das rotas) e a libera ao sair do bloco.
+    """
+
+    def __init__(
+        self,
+        memory_budget: float = ADMISSION_MEMORY_MB * 1024 * 1024,
+        batch_fraction: float = ADMISSION_BATCH_FRACTION,
+        max_waiting: int = ADMISSION_MAX_WAITING,
+        timeout: float = ADMISSION_TIMEOUT_SECONDS,
+    ):
+        self.memory_budget = int(memory_budget)
+        self.limits = {
+            "interactive": self.memory_budget,
+            "batch": int(self.memory_budget * batch_fraction),
+        }
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.reserved = 0
+        self._waiting = {lane: deque() for lane in LANES}
+        self._cond = threading.Condition()
+
+    def _can_admit(self, ticket: object, lane: str, cost: int) -> bool:
+        if self._waiting[lane][0] is not ticket:
+            return False  # FIFO dentro da faixa
+        if lane == "batch" and self._waiting["interactive"]:
+            return False  # interativos têm prioridade
+        return self.reserved + cost <= self.limits[lane]
+
+    @contextmanager
+    def admit(
+        self, cost: int, lane: str = "interactive", shed: bool = True
+    ) -> Iterator[None]:
+        """
+        Reserva ``cost`` bytes na faixa ``lane`` durante o bloco
+
+        Com ``shed=False`` (jobs já persistidos na fila) espera sem limite e
+        nunca descarta.
+        """
+        # Uma análise maior que o limite da faixa roda sozinha
+        cost = min(int(cost), self.limits[lane])
+        ticket = object()
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.timeout if shed else None
+
+        with self._cond:
+            queue = self._waiting[lane]
+            if shed and len(queue) >= self.max_waiting:
+                ADMISSION_REJECTIONS.labels(lane=lane, reason="queue_full").inc()
+                raise AdmissionRejected("queue_full", self.timeout)
+
+            queue.append(ticket)
+            QUEUE_DEPTH.labels(queue=f"admission_{lane}").set(len(queue))
+            try:
+                while not self._can_admit(ticket, lane, cost):
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            ADMISSION_REJECTIONS.labels(
+                                lane=lane, reason="timeout"
+                            ).inc()
+                            raise AdmissionRejected("timeout", self.timeout)
+                    self._cond.wait(remaining)
+            finally:
+                queue.remove(ticket)
+                QUEUE_DEPTH.labels(queue=f"admission_{lane}").set(len(queue))
+                # A saída (admitido ou não) pode liberar o próximo da fila
+                self._cond.notify_all()
+
+            self.reserved += cost
+            MEMORY_RESERVED.set(self.reserved)
+        ADMISSION_WAIT_SECONDS.labels(lane=lane).observe(time.perf_counter() - start)
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.reserved -= cost
+                MEMORY_RESERVED.set(self.reserved)
+                self._cond.notify_all()
+
+
+admission = AdmissionController()
+rate_limiter = TokenBucket(RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST)
+proxy_trust = ProxyTrust()
+
+
+def check_rate_limit(client: str, lane: str, tokens: float = 1.0):
+    """Consome fichas do cliente; AdmissionRejected (429) se esgotadas"""
+    retry_after = rate_limiter.consume(client, tokens)
+    if retry_after > 0:
+        ADMISSION_REJECTIONS.labels(lane=lane, reason="rate_limited").inc()
+        raise AdmissionRejected("rate_limited", retry_after, status_code=429)
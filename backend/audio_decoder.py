@@ -0,0 +1,292 @@
+"""
+Camada de decodificação de áudio usada pelo backend.
+
+O arquivo é lido na taxa nativa via soundfile (WAV/FLAC/OGG e, com
+libsndfile >= 1.1, MP3), sem passar pelo librosa.load; a reamostragem é
+pulada quando as taxas coincidem e, quando necessária, usa
+``AUDIO_RESAMPLER`` (qualquer ``res_type`` do librosa). O padrão soxr_hq
+custa o mesmo que soxr_qq com o soxr atual e não tem o aliasing deste;
+polyphase é mais lento para 44.1k -> 22.05k (ver bench_decode.py).
+Formatos que o libsndfile não abre (ex.: M4A) caem no librosa/audioread
+(ffmpeg); a leitura em blocos (iter_audio_blocks) e a duração também usam o
+audioread nesse caso, sem decodificar o arquivo inteiro de uma vez.
+
+Política de tipos do pipeline: o sinal sai daqui em float32 e segue assim
+(STFT/rfft em complex64, features por quadro, log-mel do modelo e vetores do
+treino em float32); só acumuladores escalares ficam em float64.
+"""
+
+import contextlib
+import logging
+import os
+import warnings
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+AUDIO_RESAMPLER = os.getenv("AUDIO_RESAMPLER", "soxr_hq")
+AUDIO_DTYPE = np.float32
+# Blocos da leitura de trechos sem seek (formatos fora do libsndfile)
+SEGMENT_BLOCK_SECONDS = 30.0
+
+# Qualidade equivalente do soxr.ResampleStream (decodificação em blocos)
+_SOXR_QUALITY = {
+    "soxr_qq": "QQ",
+    "soxr_lq": "LQ",
+    "soxr_mq": "MQ",
+    "soxr_hq": "HQ",
+    "soxr_vhq": "VHQ",
+}
+
+
+def resample(
+    y: np.ndarray,
+    orig_sr: int,
+    target_sr: Optional[int],
+    res_type: Optional[str] = None,
+) -> np.ndarray:
+    """Reamostra ao longo do último eixo; não faz nada se as taxas coincidem"""
+    if target_sr is None or orig_sr == target_sr:
+        return y
+    return librosa.resample(
+        y, orig_sr=orig_sr, target_sr=target_sr, res_type=res_type or AUDIO_RESAMPLER
+    )
+
+
+def _read_soundfile(audio_path: str, duration: Optional[float]):
+    with sf.SoundFile(audio_path) as f:
+        frames = f.frames
+        if duration is not None:
+            frames = min(frames, int(round(duration * f.samplerate)))
+        data = f.read(frames, dtype=AUDIO_DTYPE, always_2d=True)
+        return data.T, f.samplerate
+
+
+def _open_fallback(audio_path: str):
+    """Leitor audioread (ffmpeg) para formatos que o libsndfile não abre"""
+    import audioread  # dependência do librosa
+
+    return audioread.audio_open(audio_path)
+
+
+def _fallback_blocks(reader, blocksize: int) -> Iterator[np.ndarray]:
+    """Blocos (amostras, canais) float32 de ``blocksize`` amostras de um leitor audioread"""
+    pending, size = [], 0
+    for buf in reader:
+        frames = librosa.util.buf_to_float(buf, dtype=AUDIO_DTYPE)
+        pending.append(frames.reshape(-1, reader.channels))
+        size += len(pending[-1])
+        if size >= blocksize:
+            data = np.concatenate(pending)
+            for i in range(0, len(data) - blocksize + 1, blocksize):
+                yield data[i : i + blocksize]
+            rest = data[len(data) - len(data) % blocksize :]
+            pending, size = [rest], len(rest)
+    if size:
+        yield np.concatenate(pending)
+
+
+def _read_fallback(audio_path: str, duration: Optional[float]):
+    """Decodificação via librosa (audioread/ffmpeg) na taxa nativa"""
+    with warnings.catch_warnings():
+        # "PySoundFile failed. Trying audioread instead." é esperado aqui
+        warnings.simplefilter("ignore", UserWarning)
+        warnings.simplefilter("ignore", FutureWarning)
+        y, sr = librosa.load(audio_path, sr=None, mono=False, duration=duration)
+    return np.atleast_2d(y).astype(AUDIO_DTYPE, copy=False), sr
+
+
+def load_audio(
+    audio_path: str,
+    sr: Optional[int] = 22050,
+    mono: bool = True,
+    duration: Optional[float] = None,
+    res_type: Optional[str] = None,
+) -> Tuple[np.ndarray, int]:
+    """
+    Substituto de ``librosa.load`` para o backend
+
+    Args:
+        audio_path: Arquivo de áudio
+        sr: Taxa desejada (None mantém a nativa)
+        mono: Média dos canais; se False devolve (canais, amostras)
+        duration: Lê apenas os primeiros ``duration`` segundos
+        res_type: Reamostrador (padrão AUDIO_RESAMPLER)
+
+    Returns:
+        (sinal float32, taxa de amostragem)
+    """
+    try:
+        y, native_sr = _read_soundfile(audio_path, duration)
+    except Exception as e:
+        logger.debug(f"soundfile não abriu {audio_path} ({e}); usando audioread")
+        y, native_sr = _read_fallback(audio_path, duration)
+
+    if mono:
+        y = np.ascontiguousarray(y[0]) if y.shape[0] == 1 else np.mean(y, axis=0)
+
+    y = resample(y, native_sr, sr, res_type)
+    return y, (sr or native_sr)
+
+
+def load_segments(
+    audio_path: str,
+    spans: Sequence[Tuple[float, float]],
+    sr: int = 22050,
+    res_type: Optional[str] = None,
+) -> List[np.ndarray]:
+    """
+    Lê apenas os trechos ``spans`` ([(início, fim)] em segundos), em mono float32
+
+    Com o libsndfile cada trecho é lido com seek: o resto do arquivo não é
+    decodificado. Formatos que ele não abre são decodificados em blocos do
+    início ao fim do último trecho, guardando só os trechos pedidos.
+    """
+    try:
+        f = sf.SoundFile(audio_path)
+    except Exception as e:
+        logger.debug(f"soundfile não abriu {audio_path} ({e}); usando audioread")
+        return _stream_segments(audio_path, spans, sr, res_type)
+
+    segments = []
+    with f:
+        for start, end in spans:
+            first = min(f.frames, max(0, int(round(start * f.samplerate))))
+            last = min(f.frames, max(first, int(round(end * f.samplerate))))
+            f.seek(first)
+            block = f.read(last - first, dtype=AUDIO_DTYPE, always_2d=True)
+            y = block.mean(axis=1) if block.shape[1] > 1 else block[:, 0].copy()
+            segments.append(resample(y, f.samplerate, sr, res_type))
+    return segments
+
+
+def _stream_segments(
+    audio_path: str,
+    spans: Sequence[Tuple[float, float]],
+    sr: int,
+    res_type: Optional[str],
+) -> List[np.ndarray]:
+    """load_segments sem seek: percorre os blocos e recorta os trechos"""
+    bounds = [(max(0, int(s * sr)), max(0, int(e * sr))) for s, e in spans]
+    if not bounds:
+        return []
+    last = max(end for _, end in bounds)
+    pieces = [[] for _ in bounds]
+    position = 0
+    for _, y in iter_audio_blocks(audio_path, sr, SEGMENT_BLOCK_SECONDS, res_type):
+        for k, (start, end) in enumerate(bounds):
+            lo, hi = max(start, position), min(end, position + len(y))
+            if lo < hi:
+                pieces[k].append(y[lo - position : hi - position].copy())
+        position += len(y)
+        if position >= last:
+            break
+    return [np.concatenate(p) if p else np.zeros(0, dtype=AUDIO_DTYPE) for p in pieces]
+
+
+def audio_duration(audio_path: str) -> Optional[float]:
+    """
+    Duração lida do cabeçalho, sem decodificar
+
+    Formatos que o libsndfile não abre usam a duração informada pelo
+    audioread (ffmpeg); None se nenhum dos dois souber.
+    """
+    try:
+        info = sf.info(audio_path)
+        return info.frames / info.samplerate
+    except Exception:
+        pass
+    try:
+        with _open_fallback(audio_path) as reader:
+            return float(reader.duration) or None
+    except Exception:
+        return None
+
+
+def audio_channels(audio_path: str) -> int:
+    """Número de canais lido do cabeçalho (1 se nenhum leitor abrir o formato)"""
+    try:
+        return int(sf.info(audio_path).channels)
+    except Exception:
+        pass
+    try:
+        with _open_fallback(audio_path) as reader:
+            return int(reader.channels)
+    except Exception:
+        return 1
+
+
+def iter_audio_blocks(
+    audio_path: str,
+    sample_rate: int,
+    block_seconds: float,
+    res_type: Optional[str] = None,
+) -> Iterator[Tuple[float, np.ndarray]]:
+    """
+    Decodifica o arquivo em blocos mono float32 já na taxa ``sample_rate``
+
+    Só um bloco fica em memória por vez, também nos formatos que o
+    libsndfile não abre (lidos pelo audioread). Gera (início do bloco em
+    segundos, sinal).
+    """
+    res_type = res_type or AUDIO_RESAMPLER
+    with contextlib.ExitStack() as stack:
+        try:
+            info = sf.info(audio_path)
+        except Exception as e:
+            logger.debug(f"soundfile não abriu {audio_path} ({e}); usando audioread")
+            reader = stack.enter_context(_open_fallback(audio_path))
+            native_sr = reader.samplerate
+            blocks = _fallback_blocks(reader, max(1, int(block_seconds * native_sr)))
+        else:
+            native_sr = info.samplerate
+            blocks = sf.blocks(
+                audio_path,
+                blocksize=max(1, int(block_seconds * native_sr)),
+                dtype=AUDIO_DTYPE,
+                always_2d=True,
+            )
+        yield from _resampled_blocks(blocks, native_sr, sample_rate, res_type)
+
+
+def _resampled_blocks(
+    blocks: Iterator[np.ndarray], native_sr: int, sample_rate: int, res_type: str
+) -> Iterator[Tuple[float, np.ndarray]]:
+    """Mistura mono e reamostragem contínua de blocos (amostras, canais)"""
+    resampler = None
+    if native_sr != sample_rate and res_type in _SOXR_QUALITY:
+        try:
+            import soxr  # dependência do librosa>=0.10; reamostra sem emendas entre blocos
+
+            resampler = soxr.ResampleStream(
+                native_sr,
+                sample_rate,
+                1,
+                dtype=AUDIO_DTYPE,
+                quality=_SOXR_QUALITY[res_type],
+            )
+        except ImportError:
+            pass
+
+    read = 0
+    for block in blocks:
+        start = read / native_sr
+        read += len(block)
+        y = block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+
+        if resampler is not None:
+            y = resampler.resample_chunk(y)
+        else:
+            y = resample(y, native_sr, sample_rate, res_type)
+        if len(y):
+            yield start, y
+
+    if resampler is not None:
+        # Amostras ainda retidas no filtro do reamostrador
+        y = resampler.resample_chunk(np.zeros(0, dtype=AUDIO_DTYPE), last=True)
+        if len(y):
+            yield read / native_sr, y
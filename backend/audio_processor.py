@@ -1,12 +1,64 @@
 import librosa
 import numpy as np
+import scipy.fft
 import soundfile as sf
 from pathlib import Path
 import logging
-from typing import Dict, Any
+import os
+import sys
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from audio_decoder import audio_channels, audio_duration, iter_audio_blocks, load_audio
+from fingerprint import FINGERPRINT_CACHE, fingerprint
+from records import AudioFeatures, ChannelFeatures, first_onset_times
+from tracing import span
+
+try:
+    from ml.feature_plan import feature_plan
+except ImportError:  # backend executado de dentro de backend/ (fora do container)
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from ml.feature_plan import feature_plan
 
 logger = logging.getLogger(__name__)
 
+# Gravações mais longas que isto são processadas em blocos (memória constante)
+CHUNKED_THRESHOLD_SECONDS = float(os.getenv("CHUNKED_THRESHOLD_SECONDS", "300"))
+CHUNK_SECONDS = float(os.getenv("CHUNK_SECONDS", "30"))
+ONSET_HOP = 512
+ONSET_CONTEXT = 4 * ONSET_HOP  # amostras do bloco anterior (uma janela n_fft)
+# Gravações em blocos guardam o RMS reduzido a pico e média a cada N quadros (~0,19 s)
+CHUNKED_RMS_DECIMATION = 8
+
+# Modo por canal: maior atraso físico esperado entre microfones e eventos analisados
+MAX_TDOA_SECONDS = float(os.getenv("MAX_TDOA_SECONDS", "0.01"))
+MAX_TDOA_EVENTS = 20
+
+
+def gcc_phat(sig: np.ndarray, ref: np.ndarray, sr: int, max_tau: Optional[float] = None, interp: int = 4) -> float:
+    """
+    Atraso de ``sig`` em relação a ``ref`` (segundos) por GCC-PHAT
+
+    A correlação cruzada é calculada no domínio da frequência com
+    ponderação de fase (robusta a reverberação) e interpolada ``interp``
+    vezes para resolução abaixo de uma amostra. Positivo: ``sig`` chega depois.
+    """
+    n = len(sig) + len(ref)
+    nfft = 1 << (n - 1).bit_length()
+    # scipy.fft preserva float32/complex64 (np.fft sempre promove a complex128)
+    R = scipy.fft.rfft(sig, n=nfft) * np.conj(scipy.fft.rfft(ref, n=nfft))
+    cc = scipy.fft.irfft(R / (np.abs(R) + 1e-12), n=interp * nfft)
+
+    max_shift = interp * nfft // 2
+    if max_tau is not None:
+        max_shift = min(int(interp * sr * max_tau), max_shift)
+    if max_shift <= 0:
+        # cc[-0:] seria o array inteiro; atraso limitado a zero
+        return 0.0
+    cc = np.concatenate((cc[-max_shift:], cc[: max_shift + 1]))
+    shift = int(np.argmax(np.abs(cc))) - max_shift
+    return shift / float(interp * sr)
+
+
 class AudioProcessor:
     """
     Processa arquivos de áudio e extrai características
@@ -15,62 +67,292 @@ class AudioProcessor:
     def __init__(self, sample_rate: int = 22050):
         self.sample_rate = sample_rate
     
-    def extract_features(self, audio_path: str) -> Dict[str, Any]:
+    def extract_features(self, audio_path: str, per_channel: bool = False) -> AudioFeatures:
         """
         Extrai características do áudio para análise
+
+        Todos os canais são decodificados uma única vez; as características
+        principais usam a mistura mono. Com ``per_channel=True`` (e mais de um
+        canal) inclui também as características de cada canal e, para cada
+        evento, a diferença de tempo de chegada entre canais (``events``).
+        Gravações acima de CHUNKED_THRESHOLD_SECONDS são processadas em blocos,
+        sempre na mistura mono: ``per_channel`` fica None e ``chunked`` True.
         """
         try:
-            # Carregar áudio
-            y, sr = librosa.load(audio_path, sr=self.sample_rate)
-            
-            # Informações básicas
-            duration = librosa.get_duration(y=y, sr=sr)
-            
-            # Características espectrais
-            spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-            spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
-            
-            # Zero crossing rate (útil para detectar transientes)
-            zcr = librosa.feature.zero_crossing_rate(y)[0]
-            
-            # MFCCs (Mel-frequency cepstral coefficients)
-            mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-            
-            # Energia do sinal
-            rms = librosa.feature.rms(y=y)[0]
-            
-            # Transformada de Fourier para análise de frequência
-            fft = np.fft.fft(y)
-            magnitude = np.abs(fft)
-            frequency = np.linspace(0, sr, len(magnitude))
-            
-            # Encontrar frequência dominante
-            peak_freq_idx = np.argmax(magnitude[:len(magnitude)//2])
-            peak_frequency = frequency[peak_freq_idx]
-            
-            # Onset detection (detecção de eventos súbitos)
-            onset_frames = librosa.onset.onset_detect(y=y, sr=sr)
-            onset_times = librosa.frames_to_time(onset_frames, sr=sr)
-            
-            features = {
-                "duration": float(duration),
-                "sample_rate": int(sr),
-                "channels": 1,
-                "energy": float(np.mean(rms)),
-                "peak_frequency": float(peak_frequency),
-                "spectral_centroid": float(np.mean(spectral_centroids)),
-                "spectral_rolloff": float(np.mean(spectral_rolloff)),
-                "zero_crossing_rate": float(np.mean(zcr)),
-                "mfccs": [float(x) for x in np.mean(mfccs, axis=1)],
-                "onset_count": len(onset_times),
-                "onset_times": [float(t) for t in onset_times[:10]],  # Primeiros 10
-                "audio_path": audio_path  # Adicionar caminho do áudio para o modelo ML usar
-            }
-            
-            logger.info(f"Features extraídas: duration={duration:.2f}s, energy={features['energy']:.3f}")
-            
+            duration = audio_duration(audio_path)
+            if duration is None:
+                logger.warning(f"Duração desconhecida, sem processamento em blocos: {audio_path} será decodificado inteiro")
+            elif duration > CHUNKED_THRESHOLD_SECONDS:
+                if per_channel:
+                    logger.warning(f"Análise por canal indisponível acima de {CHUNKED_THRESHOLD_SECONDS:g} s: {audio_path}")
+                return self.extract_features_chunked(audio_path)
+
+            # Carregar áudio (canais, amostras)
+            with span("audio_decoder.load", stage="decode"):
+                channels, sr = load_audio(audio_path, sr=self.sample_rate, mono=False)
+            y = channels[0] if channels.shape[0] == 1 else np.mean(channels, axis=0)
+
+            with span("audio_processor.features", stage="feature_extraction"):
+                features = self._compute_features(y, sr, audio_path, channels.shape[0])
+
+            if per_channel and channels.shape[0] > 1:
+                with span("audio_processor.per_channel", stage="feature_extraction"):
+                    features.per_channel = self._channel_features(channels, sr)
+                    features.events = self._event_tdoas(channels, sr, features)
             return features
-            
+
         except Exception as e:
             logger.error(f"Erro ao extrair features: {e}")
             raise
+
+    def _compute_features(self, y: np.ndarray, sr: int, audio_path: str, n_channels: int = 1) -> AudioFeatures:
+        """Calcula as características a partir do sinal já decodificado"""
+        # Informações básicas
+        duration = librosa.get_duration(y=y, sr=sr)
+        
+        # Uma única STFT e um log-mel para centroide, rolloff, MFCCs e onsets
+        plan = feature_plan(sr)
+        magnitude = plan.magnitude(y)
+        mel_db = plan.mel_db(magnitude)
+
+        # Características espectrais
+        spectral_centroids = plan.spectral_centroid(magnitude)[0]
+        spectral_rolloff = plan.spectral_rolloff(magnitude)[0]
+        del magnitude  # (1025 x quadros) não precisa coexistir com o rfft abaixo
+        
+        # Zero crossing rate (útil para detectar transientes)
+        zcr = librosa.feature.zero_crossing_rate(y)[0]
+        
+        # MFCCs (Mel-frequency cepstral coefficients)
+        mfccs = plan.mfcc(mel_db)
+        
+        # Energia do sinal
+        rms = librosa.feature.rms(y=y)[0]
+        
+        # Transformada de Fourier para análise de frequência: rfft do sinal
+        # float32 (complex64, só as n/2 + 1 frequências positivas); o eixo de
+        # frequências é o índice do pico * sr / n, sem materializar um array
+        spectrum = np.abs(scipy.fft.rfft(y))
+        
+        # Encontrar frequência dominante
+        peak_frequency = np.argmax(spectrum) * sr / len(y)
+        del spectrum
+        
+        # Onset detection (detecção de eventos súbitos)
+        onset_envelope = plan.onset_strength(mel_db)
+        onset_frames = librosa.onset.onset_detect(onset_envelope=onset_envelope, sr=sr)
+        onset_times = librosa.frames_to_time(onset_frames, sr=sr)
+        
+        features = AudioFeatures(
+            duration=float(duration),
+            sample_rate=int(sr),
+            channels=int(n_channels),
+            energy=float(np.mean(rms)),
+            peak_frequency=float(peak_frequency),
+            spectral_centroid=float(np.mean(spectral_centroids)),
+            spectral_rolloff=float(np.mean(spectral_rolloff)),
+            zero_crossing_rate=float(np.mean(zcr)),
+            mfccs=np.mean(mfccs, axis=1, dtype=np.float32),
+            onset_count=len(onset_times),
+            onset_times=first_onset_times(onset_times),  # Primeiros 10
+            audio_path=audio_path,  # Caminho do áudio para o modelo ML usar
+            # Envelopes por quadro (hop 512) usados pelo filtro da cascata (detection_gate.py)
+            rms_frames=rms.astype(np.float32, copy=False),
+            onset_envelope=onset_envelope.astype(np.float32, copy=False),
+            onsets=onset_times,
+            # Impressão digital dos picos do log-mel (cache de áudio quase duplicado)
+            fingerprint=fingerprint(mel_db) if FINGERPRINT_CACHE else None,
+        )
+        
+        logger.info(f"Features extraídas: duration={duration:.2f}s, energy={features.energy:.3f}")
+        
+        return features
+
+    def _channel_features(self, channels: np.ndarray, sr: int) -> List[ChannelFeatures]:
+        """Características de cada canal, calculadas em lote sobre (canais, amostras)"""
+        # O plano e as funções do librosa aceitam (canais, amostras) e devolvem (canais, 1, quadros)
+        plan = feature_plan(sr)
+        stft_magnitude = plan.magnitude(channels)
+        centroid = np.mean(plan.spectral_centroid(stft_magnitude), axis=(-2, -1))
+        rolloff = np.mean(plan.spectral_rolloff(stft_magnitude), axis=(-2, -1))
+        zcr = np.mean(librosa.feature.zero_crossing_rate(channels), axis=(-2, -1))
+        rms = np.mean(librosa.feature.rms(y=channels), axis=(-2, -1))
+
+        magnitude = np.abs(scipy.fft.rfft(channels, axis=-1))
+        peak_frequency = np.argmax(magnitude, axis=-1) * sr / channels.shape[-1]
+
+        envelopes = plan.onset_strength(plan.mel_db(stft_magnitude))
+
+        result = []
+        for c in range(channels.shape[0]):
+            onset_times = librosa.frames_to_time(librosa.onset.onset_detect(onset_envelope=envelopes[c], sr=sr), sr=sr)
+            result.append(ChannelFeatures(
+                channel=c,
+                duration=float(channels.shape[-1] / sr),
+                energy=float(rms[c]),
+                peak_frequency=float(peak_frequency[c]),
+                spectral_centroid=float(centroid[c]),
+                spectral_rolloff=float(rolloff[c]),
+                zero_crossing_rate=float(zcr[c]),
+                onset_count=len(onset_times),
+                onset_times=first_onset_times(onset_times),
+            ))
+        return result
+
+    def _event_tdoas(self, channels: np.ndarray, sr: int, features: AudioFeatures) -> List[Dict[str, Any]]:
+        """
+        Diferença de tempo de chegada (ms) de cada canal em relação ao canal 0
+        para os eventos detectados na mistura mono (``features.onsets``)
+        """
+        onset_times = features.onsets[:MAX_TDOA_EVENTS] if features.onsets is not None else []
+
+        events = []
+        for t in onset_times:
+            # Janela curta em torno do ataque: o pico de correlação é o do evento
+            start = max(0, int((t - 0.02) * sr))
+            end = min(channels.shape[-1], int((t + 0.1) * sr))
+            ref = channels[0, start:end]
+            tdoa = [0.0]
+            for c in range(1, channels.shape[0]):
+                tdoa.append(round(gcc_phat(channels[c, start:end], ref, sr, MAX_TDOA_SECONDS) * 1000.0, 4))
+            events.append({"time": round(float(t), 4), "reference_channel": 0, "tdoa_ms": tdoa})
+        return events
+
+    def extract_features_chunked(self, audio_path: str, chunk_seconds: float = CHUNK_SECONDS) -> AudioFeatures:
+        """
+        Extrai as mesmas características de extract_features bloco a bloco
+
+        Médias, MFCCs e o espectro de magnitude (resolução fixa: sr / amostras
+        do bloco) são acumulados; além de um bloco só ficam em memória, para a
+        gravação inteira:
+
+        - o envelope de onsets (float32, 1 valor por ONSET_HOP amostras), cujos
+          picos são escolhidos no fim com a normalização global;
+        - pico e média do RMS a cada CHUNKED_RMS_DECIMATION quadros (float32),
+          o que o filtro da cascata (detection_gate.py) usa por janela;
+        - os hashes da impressão digital (se FINGERPRINT_CACHE).
+
+        Os blocos são alinhados a múltiplos de ONSET_HOP: o quadro ``i`` do
+        envelope fica em ``i * ONSET_HOP / sr`` segundos, como no modo normal.
+        """
+        sr = self.sample_rate
+        plan = feature_plan(sr)
+        n_spectrum = int(round(chunk_seconds * sr))
+        spectrum = np.zeros(n_spectrum // 2 + 1, dtype=np.float32)
+
+        sums = {"spectral_centroid": 0.0, "spectral_rolloff": 0.0, "zero_crossing_rate": 0.0, "energy": 0.0}
+        frames = 0
+        mfcc_sum = np.zeros(13, dtype=np.float32)
+        total_samples = 0
+        context = np.zeros(0, dtype=np.float32)
+        rms_peaks = []
+        rms_means = []
+        onset_envelopes = []
+        fingerprints = []
+        chunks = 0
+
+        blocks = _aligned_blocks(iter_audio_blocks(audio_path, sr, chunk_seconds), ONSET_HOP * CHUNKED_RMS_DECIMATION)
+        with span("audio_processor.features_chunked", stage="feature_extraction"):
+            for y, last in blocks:
+                chunks += 1
+                first_frame = total_samples // ONSET_HOP
+                total_samples += len(y)
+
+                # Uma STFT por bloco para centroide, rolloff, MFCCs e onsets. O final do
+                # bloco anterior entra como contexto (os quadros dele são descartados):
+                # sem ele o preenchimento com zeros no início do bloco vira um onset falso.
+                # O quadro centrado no fim do bloco é o primeiro do próximo (exceto no último).
+                skip = len(context) // ONSET_HOP
+                own = slice(skip, skip + len(y) // ONSET_HOP + (1 if last else 0))
+                signal = np.concatenate([context, y])
+                magnitude = plan.magnitude(signal)
+                mel_db = plan.mel_db(magnitude)
+                context = signal[-ONSET_CONTEXT:]
+
+                centroid = plan.spectral_centroid(magnitude)[0, own]
+                sums["spectral_centroid"] += float(np.sum(centroid))
+                sums["spectral_rolloff"] += float(np.sum(plan.spectral_rolloff(magnitude)[0, own]))
+                sums["zero_crossing_rate"] += float(np.sum(librosa.feature.zero_crossing_rate(signal)[0, own]))
+                rms = librosa.feature.rms(y=signal)[0, own]
+                sums["energy"] += float(np.sum(rms))
+                mfcc_sum += np.sum(plan.mfcc(mel_db)[:, own], axis=1)
+                frames += len(centroid)
+
+                # RMS reduzido a pico e média por grupo de quadros (blocos têm grupos inteiros)
+                groups = np.arange(0, len(rms), CHUNKED_RMS_DECIMATION)
+                sizes = np.diff(np.append(groups, len(rms)))
+                rms_peaks.append(np.maximum.reduceat(rms, groups).astype(np.float32))
+                rms_means.append((np.add.reduceat(rms, groups) / sizes).astype(np.float32))
+
+                # Espectro de magnitude acumulado (trechos curtos são completados com zeros)
+                for i in range(0, len(y), n_spectrum):
+                    spectrum += np.abs(scipy.fft.rfft(y[i : i + n_spectrum], n=n_spectrum))
+
+                onset_envelopes.append(plan.onset_strength(mel_db)[own].astype(np.float32))
+                if FINGERPRINT_CACHE:
+                    fingerprints.append(fingerprint(mel_db[:, own], frame_offset=first_frame))
+
+            if frames == 0:
+                raise ValueError(f"Áudio vazio: {audio_path}")
+
+            # Picos escolhidos sobre o envelope inteiro (a normalização é global, como no modo normal)
+            onset_envelope = np.concatenate(onset_envelopes)
+            del onset_envelopes
+            onsets = librosa.onset.onset_detect(onset_envelope=onset_envelope, sr=sr, hop_length=ONSET_HOP)
+            onset_times = librosa.frames_to_time(onsets, sr=sr, hop_length=ONSET_HOP)
+
+        duration = total_samples / sr
+        peak_frequency = np.argmax(spectrum) * sr / n_spectrum
+
+        features = AudioFeatures(
+            duration=float(duration),
+            sample_rate=int(sr),
+            channels=audio_channels(audio_path),
+            energy=sums["energy"] / frames,
+            peak_frequency=float(peak_frequency),
+            spectral_centroid=sums["spectral_centroid"] / frames,
+            spectral_rolloff=sums["spectral_rolloff"] / frames,
+            zero_crossing_rate=sums["zero_crossing_rate"] / frames,
+            mfccs=(mfcc_sum / frames).astype(np.float32),
+            onset_count=len(onset_times),
+            onset_times=first_onset_times(onset_times),
+            audio_path=audio_path,
+            rms_frames=np.concatenate(rms_peaks),
+            rms_means=np.concatenate(rms_means),
+            rms_hop=ONSET_HOP * CHUNKED_RMS_DECIMATION,
+            onset_envelope=onset_envelope,
+            onsets=onset_times,
+            chunked=True,
+            chunks=chunks,
+            fingerprint=np.concatenate(fingerprints) if FINGERPRINT_CACHE else None,
+        )
+
+        logger.info(f"Features extraídas em {chunks} blocos: duration={duration:.2f}s, energy={features.energy:.3f}")
+
+        return features
+
+
+def _aligned_blocks(blocks: Iterator[Tuple[float, np.ndarray]], multiple: int) -> Iterator[Tuple[np.ndarray, bool]]:
+    """
+    Reagrupa os blocos de iter_audio_blocks em blocos com múltiplo de ``multiple`` amostras
+
+    A sobra de cada bloco passa para o seguinte; o último leva o que restou.
+    Gera (sinal, último bloco?).
+    """
+    previous = None
+    pending = np.zeros(0, dtype=np.float32)
+    for _, y in blocks:
+        y = np.concatenate([pending, y]) if len(pending) else y
+        n = len(y) - len(y) % multiple
+        if n == 0:
+            pending = y
+            continue
+        if previous is not None:
+            yield previous, False
+        previous, pending = y[:n], y[n:].copy()
+    if len(pending):
+        if previous is not None:
+            yield previous, False
+        previous = pending
+    if previous is not None:
+        yield previous, True
@@ -0,0 +1,32 @@
+"""
+Acesso ao SQLite compartilhado pelos armazenamentos do backend (jobs, histórico).
+
+Cada operação abre uma conexão curta em modo autocommit; o banco usa WAL,
+então leituras (GET) não bloqueiam a escrita dos workers e vários processos
+uvicorn podem usar o mesmo arquivo.
+"""
+
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+
+def init_db(db_path: str, schema: str):
+    """Cria o diretório, ativa WAL e aplica o esquema (idempotente)"""
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    with connect(db_path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(schema)
+
+
+@contextmanager
+def connect(db_path: str) -> Iterator[sqlite3.Connection]:
+    # isolation_level=None: autocommit; transações só com BEGIN explícito
+    conn = sqlite3.connect(db_path, timeout=30.0, isolation_level=None)
+    try:
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        yield conn
+    finally:
+        conn.close()
@@ -0,0 +1,136 @@
+"""
+Primeiro estágio da cascata de detecção: filtro DSP antes da EfficientNet.
+
+A maior parte do áudio recebido é silêncio ou ruído ambiente estacionário.
+Antes de gerar o log-mel e rodar o modelo Keras, cada janela de
+WINDOW_SECONDS é avaliada com três medidas baratas, calculadas de forma
+vetorizada sobre os envelopes por quadro que o AudioProcessor já produz
+(``rms_frames`` e ``onset_envelope``, hop de 512 amostras):
+
+- pico de energia (dBFS): descarta silêncio;
+- fator de crista (pico / média do RMS na janela, em dB): um tiro é um
+  transiente que se destaca do fundo;
+- razão de fluxo espectral (pico / média do envelope de onsets).
+
+Uma janela segue para o modelo se for audível e tiver crista OU fluxo acima
+do limiar. Os limiares (``GATE_*``) foram escolhidos para favorecer o recall;
+tools/benchmarks/bench_gate.py mostra a perda de recall e o cálculo poupado
+para outros valores.
+"""
+
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+from metrics import GATE_WINDOWS
+from records import AudioFeatures
+
+GATE_ENABLED = os.getenv("DETECTION_GATE", "true").lower() == "true"
+GATE_MIN_PEAK_DB = float(os.getenv("GATE_MIN_PEAK_DB", "-45"))
+GATE_MIN_CREST_DB = float(os.getenv("GATE_MIN_CREST_DB", "4.5"))
+GATE_MIN_FLUX_RATIO = float(os.getenv("GATE_MIN_FLUX_RATIO", "2.5"))
+GATE_HOP = 512  # hop do RMS e do envelope de onsets do librosa (padrão)
+# Quadros iniciais do envelope de onsets afetados pelo preenchimento com zeros
+# (n_fft / hop): sem isso todo arquivo "começa" com um onset falso
+GATE_EDGE_FRAMES = 2048 // GATE_HOP
+
+
+def _window_reduce(frames: np.ndarray, hop: int, window: int, n_windows: int):
+    """Máximo e média de ``frames`` em cada janela de ``window`` amostras"""
+    frames = np.asarray(frames, dtype=np.float32)
+    if frames.size == 0:
+        zeros = np.zeros(n_windows, dtype=np.float32)
+        return zeros, zeros
+    # Primeiro quadro de cada janela (janelas além do fim repetem o último quadro)
+    starts = np.minimum(
+        (np.arange(n_windows) * window + hop - 1) // hop, frames.size - 1
+    )
+    counts = np.diff(np.append(starts, frames.size))
+    peak = np.maximum.reduceat(frames, starts)
+    mean = np.add.reduceat(frames, starts) / np.maximum(counts, 1)
+    # reduceat devolve o próprio elemento quando o índice se repete
+    mean = np.where(counts > 0, mean, peak)
+    return peak, mean
+
+
+class DetectionGate:
+    """Decide, por janela, se vale a pena rodar o modelo"""
+
+    def __init__(
+        self,
+        enabled: bool = GATE_ENABLED,
+        min_peak_db: float = GATE_MIN_PEAK_DB,
+        min_crest_db: float = GATE_MIN_CREST_DB,
+        min_flux_ratio: float = GATE_MIN_FLUX_RATIO,
+    ):
+        self.enabled = enabled
+        self.min_peak_db = min_peak_db
+        self.min_crest_db = min_crest_db
+        self.min_flux_ratio = min_flux_ratio
+
+    def window_scores(
+        self,
+        rms_frames: np.ndarray,
+        onset_envelope: np.ndarray,
+        window: int,
+        n_windows: int,
+        hop: int = GATE_HOP,
+        rms_hop: Optional[int] = None,
+        rms_means: Optional[np.ndarray] = None,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Pico (dBFS), crista (dB) e razão de fluxo de cada janela
+
+        Com ``rms_means`` o RMS vem reduzido (gravações em blocos):
+        ``rms_frames`` traz o pico e ``rms_means`` a média a cada ``rms_hop``
+        amostras.
+        """
+        onset_envelope = np.array(onset_envelope, dtype=np.float32)
+        onset_envelope[:GATE_EDGE_FRAMES] = 0.0
+
+        rms_hop = rms_hop or hop
+        rms_peak, rms_mean = _window_reduce(rms_frames, rms_hop, window, n_windows)
+        if rms_means is not None:
+            _, rms_mean = _window_reduce(rms_means, rms_hop, window, n_windows)
+        flux_peak, flux_mean = _window_reduce(onset_envelope, hop, window, n_windows)
+        return {
+            "peak_db": 20.0 * np.log10(rms_peak + 1e-10),
+            "crest_db": 20.0 * np.log10((rms_peak + 1e-10) / (rms_mean + 1e-10)),
+            "flux_ratio": flux_peak / (flux_mean + 1e-6),
+        }
+
+    def candidates(
+        self,
+        features: AudioFeatures,
+        window: int,
+        n_windows: int,
+    ) -> Optional[np.ndarray]:
+        """
+        Máscara (True = segue para o modelo) das janelas ``k * window``
+
+        Devolve None quando o filtro está desligado ou as features não trazem
+        os envelopes por quadro (ex.: vindas de outra versão do backend).
+        """
+        if not self.enabled or features.rms_frames is None:
+            return None
+        scores = self.window_scores(
+            features.rms_frames,
+            features.onset_envelope,
+            window,
+            n_windows,
+            rms_hop=features.rms_hop,
+            rms_means=features.rms_means,
+        )
+        return (scores["peak_db"] >= self.min_peak_db) & (
+            (scores["crest_db"] >= self.min_crest_db)
+            | (scores["flux_ratio"] >= self.min_flux_ratio)
+        )
+
+
+def count_windows(scored: int, gated: int):
+    """Contabiliza janelas avaliadas pelo modelo e descartadas pelo filtro"""
+    if scored:
+        GATE_WINDOWS.labels(decision="scored").inc(scored)
+    if gated:
+        GATE_WINDOWS.labels(decision="gated").inc(gated)
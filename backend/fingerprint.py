@@ -0,0 +1,277 @@
+"""
+Impressão digital acústica para reconhecer áudio quase duplicado.
+
+O mesmo incidente costuma chegar de várias fontes (reencodado, cortado,
+com outro ganho), e um hash dos bytes não reconhece essas cópias. A
+impressão digital usa o log-mel que o AudioProcessor já calcula (128
+bandas, hop 512): os picos locais do espectrograma são combinados em pares
+(banda do pico âncora, banda do pico alvo, distância em quadros), cada par
+vira um hash de 20 bits com o tempo do âncora. Picos e distâncias
+sobrevivem a reencodagem, mudança de ganho e corte.
+
+``FingerprintIndex`` guarda os hashes em um índice invertido em memória
+(hash -> entradas que o contêm). A consulta conta, por entrada, quantos
+hashes coincidem com o mesmo deslocamento de tempo; a similaridade é essa
+contagem sobre o tamanho da impressão menor. Acima de
+``FINGERPRINT_THRESHOLD`` a análise guardada é devolvida sem rodar o
+modelo. Com ``FINGERPRINT_INDEX_PATH`` o índice é gravado em disco (.npz)
+e recarregado no início.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from itertools import chain
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from scipy.ndimage import maximum_filter
+
+from metrics import CACHE_HIT_RATIO, CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_CACHE = os.getenv("FINGERPRINT_CACHE", "false").lower() == "true"
+# Similaridade medida em gravações de 30 s contra o original: ganho 0.99,
+# reamostrado 0.90, cortado 0.65, ogg/vorbis 0.34, trecho de 4 s 0.22, ruído
+# forte 0.01, áudios diferentes <= 0.002. Um acerto falso devolve a análise
+# de outro incidente, então o limiar fica acima dos casos ambíguos (reencode
+# com perdas, trechos curtos), que são analisados de novo
+FINGERPRINT_THRESHOLD = float(os.getenv("FINGERPRINT_THRESHOLD", "0.5"))
+FINGERPRINT_MAX_ENTRIES = int(os.getenv("FINGERPRINT_MAX_ENTRIES", "5000"))
+FINGERPRINT_INDEX_PATH = os.getenv("FINGERPRINT_INDEX_PATH", "")
+# Gravações a cada N entradas novas (e no desligamento do servidor)
+FINGERPRINT_SAVE_EVERY = 50
+
+# Vizinhança (bandas mel x quadros) em que um pico precisa ser o máximo
+PEAK_NEIGHBORHOOD = (15, 11)
+# Picos até este nível abaixo do máximo do arquivo (o resto é ruído de fundo)
+PEAK_RANGE_DB = 50.0
+# Pares por pico âncora e distância máxima (quadros) até o pico alvo
+FANOUT = 5
+MAX_DT = 63
+# Impressões com menos hashes não são consultadas nem indexadas
+MIN_HASHES = 20
+
+# Hop do log-mel (FeaturePlan): tempos da impressão são quadros deste tamanho
+FRAME_HOP = 512
+
+FINGERPRINT_DTYPE = np.dtype([("hash", np.uint32), ("time", np.int32)])
+# Tempos são empacotados com o id da entrada em 24 bits (~108 h a 22.05 kHz)
+_TIME_BITS = 24
+
+
+def spectral_peaks(mel_db: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(bandas, quadros) dos máximos locais do log-mel (bandas x quadros)"""
+    if mel_db.size == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    local_max = maximum_filter(mel_db, size=PEAK_NEIGHBORHOOD, mode="constant")
+    peaks = (mel_db == local_max) & (mel_db > mel_db.max() - PEAK_RANGE_DB)
+    bands, frames = np.nonzero(peaks)
+    order = np.lexsort((bands, frames))
+    return bands[order], frames[order]
+
+
+def fingerprint(mel_db: np.ndarray, frame_offset: int = 0) -> np.ndarray:
+    """
+    Hashes (banda âncora, banda alvo, distância) e tempo do âncora
+
+    Returns:
+        array estruturado FINGERPRINT_DTYPE (campos ``hash`` e ``time``,
+        tempo em quadros somado a ``frame_offset``)
+    """
+    bands, frames = spectral_peaks(mel_db)
+    hashes, times = [], []
+    # Picos ordenados por tempo: os alvos de cada âncora são os próximos FANOUT
+    for k in range(1, FANOUT + 1):
+        dt = frames[k:] - frames[:-k]
+        valid = (dt >= 1) & (dt <= MAX_DT)
+        anchors = np.flatnonzero(valid)
+        hashes.append((bands[anchors] << 13) | (bands[anchors + k] << 6) | dt[anchors])
+        times.append(frames[anchors])
+
+    result = np.empty(sum(len(h) for h in hashes), dtype=FINGERPRINT_DTYPE)
+    if len(result):
+        result["hash"] = np.concatenate(hashes)
+        result["time"] = np.concatenate(times) + frame_offset
+    return result
+
+
+def _indexable(fp: np.ndarray) -> np.ndarray:
+    """Hashes cujo tempo cabe no empacotamento do índice (0 <= t < 2**24)"""
+    times = fp["time"]
+    valid = (times >= 0) & (times < (1 << _TIME_BITS))
+    return fp if valid.all() else fp[valid]
+
+
+class FingerprintIndex:
+    """
+    Índice invertido hash -> (entrada, tempo) com as análises guardadas
+
+    ``key`` separa análises que não são intercambiáveis (modo por canal,
+    versão do modelo): uma consulta só encontra entradas com a mesma chave.
+    Acima de ``max_entries`` a entrada mais antiga sai do índice.
+    """
+
+    def __init__(
+        self,
+        threshold: float = FINGERPRINT_THRESHOLD,
+        max_entries: int = FINGERPRINT_MAX_ENTRIES,
+        path: Optional[str] = FINGERPRINT_INDEX_PATH or None,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.path = Path(path) if path else None
+        self._postings: Dict[int, list] = {}
+        # id -> (impressão, chave, resultado em JSON)
+        self._entries: "OrderedDict[int, Tuple[np.ndarray, str, str]]" = OrderedDict()
+        self._next_id = 0
+        self._unsaved = 0
+        self._hits = 0
+        self._lookups = 0
+        self._lock = threading.Lock()
+        if self.path is not None and self.path.exists():
+            try:
+                self.load()
+            except Exception as e:
+                logger.warning(f"Índice de impressões ignorado ({self.path}): {e}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, fp: Optional[np.ndarray], key: str) -> Optional[Dict[str, Any]]:
+        """
+        Análise guardada de um áudio quase idêntico, ou None
+
+        Returns:
+            {"result": dict, "similarity": float, "offset_frames": int}; o
+            deslocamento é o tempo na entrada menos o tempo na consulta.
+        """
+        if fp is None:
+            return None
+        fp = _indexable(fp)
+        if len(fp) < MIN_HASHES:
+            return None
+        with self._lock:
+            match = self._best_match(fp, key)
+            self._lookups += 1
+            self._hits += match is not None
+            hit_ratio = self._hits / self._lookups
+        CACHE_LOOKUPS.labels(
+            cache="fingerprint", result="hit" if match else "miss"
+        ).inc()
+        CACHE_HIT_RATIO.labels(cache="fingerprint").set(hit_ratio)
+        return match
+
+    def _best_match(self, fp: np.ndarray, key: str) -> Optional[Dict[str, Any]]:
+        postings = [
+            (self._postings[h], t)
+            for h, t in zip(fp["hash"].tolist(), fp["time"].tolist())
+            if h in self._postings
+        ]
+        if not postings:
+            return None
+        packed = np.fromiter(
+            chain.from_iterable(p for p, _ in postings), dtype=np.int64
+        )
+        query_times = np.repeat([t for _, t in postings], [len(p) for p, _ in postings])
+        ids = packed >> _TIME_BITS
+        offsets = (packed & ((1 << _TIME_BITS) - 1)) - query_times
+
+        # Votos por (entrada, deslocamento), tolerando +-1 quadro
+        votes = ids * (1 << (_TIME_BITS + 1)) + offsets + (1 << _TIME_BITS)
+        keys, counts = np.unique(votes, return_counts=True)
+        smoothed = counts.copy()
+        for shift in (-1, 1):
+            neighbor = np.searchsorted(keys, keys + shift)
+            found = neighbor < len(keys)
+            found[found] &= keys[neighbor[found]] == keys[found] + shift
+            smoothed[found] += counts[neighbor[found]]
+
+        best = None
+        for i in np.argsort(smoothed)[::-1]:
+            entry_id = int(keys[i] >> (_TIME_BITS + 1))
+            entry_fp, entry_key, result = self._entries[entry_id]
+            if entry_key != key:
+                continue
+            similarity = min(1.0, smoothed[i] / min(len(fp), len(entry_fp)))
+            if similarity >= self.threshold:
+                offset = int(keys[i] & ((1 << (_TIME_BITS + 1)) - 1)) - (
+                    1 << _TIME_BITS
+                )
+                best = {
+                    "result": json.loads(result),
+                    "similarity": round(float(similarity), 4),
+                    "offset_frames": offset,
+                }
+            break
+        return best
+
+    def add(self, fp: Optional[np.ndarray], key: str, result: Dict[str, Any]):
+        """Indexa a análise de um áudio (impressões curtas demais são ignoradas)"""
+        if fp is None:
+            return
+        fp = _indexable(fp)
+        if len(fp) < MIN_HASHES:
+            return
+        with self._lock:
+            self._insert(fp, key, json.dumps(result))
+            while len(self._entries) > self.max_entries:
+                self._evict()
+            self._unsaved += 1
+            save = self.path is not None and self._unsaved >= FINGERPRINT_SAVE_EVERY
+        if save:
+            self.save()
+
+    def _insert(self, fp: np.ndarray, key: str, result: str):
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (fp, key, result)
+        base = entry_id << _TIME_BITS
+        for h, t in zip(fp["hash"].tolist(), fp["time"].tolist()):
+            self._postings.setdefault(h, []).append(base | t)
+
+    def _evict(self):
+        entry_id, (fp, _, _) = self._entries.popitem(last=False)
+        for h in set(fp["hash"].tolist()):
+            remaining = [p for p in self._postings[h] if p >> _TIME_BITS != entry_id]
+            if remaining:
+                self._postings[h] = remaining
+            else:
+                del self._postings[h]
+
+    def save(self):
+        """Grava o índice em ``path`` (substituição atômica)"""
+        if self.path is None:
+            return
+        with self._lock:
+            entries = list(self._entries.values())
+            self._unsaved = 0
+        fps = [fp for fp, _, _ in entries]
+        meta = [{"key": key, "result": result} for _, key, result in entries]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                fingerprints=(
+                    np.concatenate(fps) if fps else np.zeros(0, FINGERPRINT_DTYPE)
+                ),
+                lengths=np.array([len(fp) for fp in fps], dtype=np.int64),
+                meta=np.array(json.dumps(meta)),
+            )
+        os.replace(tmp, self.path)
+        logger.info(f"Índice de impressões salvo: {len(entries)} entradas")
+
+    def load(self):
+        """Recarrega as entradas gravadas por ``save``"""
+        with np.load(self.path) as data:
+            fps = np.split(data["fingerprints"], np.cumsum(data["lengths"])[:-1])
+            meta = json.loads(str(data["meta"]))
+        with self._lock:
+            for fp, item in zip(fps, meta):
+                self._insert(fp, item["key"], item["result"])
+        logger.info(f"Índice de impressões carregado: {len(meta)} entradas")
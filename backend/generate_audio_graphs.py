@@ -1,66 +1,159 @@
 import librosa
-import librosa.display
-import matplotlib.pyplot as plt
 import numpy as np
+import os
+import sys
 from pathlib import Path
 
+from audio_decoder import load_audio
+from graph_render import log_frequency_rows, render, write_png
+from tracing import span
+
+try:
+    from ml.feature_plan import feature_plan
+except ImportError:  # backend executado de dentro de backend/ (fora do container)
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from ml.feature_plan import feature_plan
+
 GRAPHS_DIR = Path("graphs")
 GRAPHS_DIR.mkdir(exist_ok=True)
 
+# Gravações longas: os gráficos mostram só o início (memória limitada)
+GRAPH_MAX_SECONDS = float(os.getenv("GRAPH_MAX_SECONDS", "300"))
+# "fast": mapa de cores direto em PNG (graph_render.py); "matplotlib": figuras
+# com eixos e título (mais lento, importa o matplotlib)
+GRAPH_RENDERER = os.getenv("GRAPH_RENDERER", "fast")
+# Tamanho das imagens no modo fast (o de uma figura 6x3 pol. a 100 dpi)
+GRAPH_WIDTH = 600
+GRAPH_HEIGHT = 300
+GRAPH_N_MFCC = 20
+
 
-def generate_audio_graphs(audio_path: str):
+def graph_matrices(y: np.ndarray, sr: int):
     """
-    Gera e salva três gráficos (FFT, MFCC e Log-Mel) a partir de um arquivo de áudio.
-    Retorna os caminhos dos arquivos gerados.
+    Matrizes dos três gráficos a partir de uma única STFT
+
+    Returns:
+        dict com "fft" (|STFT| em dB, ref máx.), "mfcc" (20 coeficientes) e
+        "logmel" (log-mel em dB, ref máx.)
     """
-    try:
-        # Carrega o áudio
-        y, sr = librosa.load(audio_path, sr=None)
+    plan = feature_plan(sr, n_mfcc=GRAPH_N_MFCC)
+    magnitude = plan.magnitude(y)
+    mel_db = plan.mel_db(magnitude)
+    return {
+        "fft": librosa.amplitude_to_db(magnitude, ref=np.max),
+        "mfcc": plan.mfcc(mel_db),
+        # power_to_db(ref=1.0) - máximo == power_to_db(ref=np.max)
+        "logmel": mel_db - mel_db.max() if mel_db.size else mel_db,
+    }
+
 
-        # ----- (a) FFT -----
+def _render_fast(matrices, sr: int, paths):
+    with span("graphs.fft"):
+        fft = matrices["fft"]
+        rows = log_frequency_rows(fft.shape[0], GRAPH_HEIGHT)
+        write_png(
+            paths["fft"], render(fft, "magma", GRAPH_WIDTH, GRAPH_HEIGHT, rows=rows)
+        )
+
+    with span("graphs.mfcc"):
+        write_png(
+            paths["mfcc"],
+            render(matrices["mfcc"], "RdBu_r", GRAPH_WIDTH, GRAPH_HEIGHT),
+        )
+
+    with span("graphs.logmel"):
+        write_png(
+            paths["logmel"],
+            render(matrices["logmel"], "magma", GRAPH_WIDTH, GRAPH_HEIGHT),
+        )
+
+
+def _render_matplotlib(matrices, sr: int, paths):
+    import librosa.display
+    import matplotlib.pyplot as plt
+
+    # ----- (a) FFT -----
+    with span("graphs.fft"):
         plt.figure(figsize=(6, 3))
-        D = np.abs(librosa.stft(y))
         librosa.display.specshow(
-            librosa.amplitude_to_db(D, ref=np.max),
+            matrices["fft"],
             sr=sr,
             x_axis="time",
             y_axis="log",
             cmap="magma",
         )
         plt.title("Extração de características com FFT")
-        fft_path = GRAPHS_DIR / f"{Path(audio_path).stem}_fft.png"
-        plt.savefig(fft_path, bbox_inches="tight")
+        plt.savefig(paths["fft"], bbox_inches="tight")
         plt.close()
 
-        # ----- (b) MFCC -----
+    # ----- (b) MFCC -----
+    with span("graphs.mfcc"):
         plt.figure(figsize=(6, 3))
-        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=20)
-        librosa.display.specshow(mfccs, x_axis="time", cmap="RdBu_r")
+        librosa.display.specshow(matrices["mfcc"], x_axis="time", cmap="RdBu_r")
         plt.title("Extração de características com MFCC")
-        mfcc_path = GRAPHS_DIR / f"{Path(audio_path).stem}_mfcc.png"
-        plt.savefig(mfcc_path, bbox_inches="tight")
+        plt.savefig(paths["mfcc"], bbox_inches="tight")
         plt.close()
 
-        # ----- (c) Log-Mel -----
+    # ----- (c) Log-Mel -----
+    with span("graphs.logmel"):
         plt.figure(figsize=(6, 3))
-        S = librosa.feature.melspectrogram(y=y, sr=sr)
         librosa.display.specshow(
-            librosa.power_to_db(S, ref=np.max),
+            matrices["logmel"],
             sr=sr,
             x_axis="time",
             y_axis="mel",
             cmap="magma",
         )
         plt.title("Extração de características com LogMel")
-        logmel_path = GRAPHS_DIR / f"{Path(audio_path).stem}_logmel.png"
-        plt.savefig(logmel_path, bbox_inches="tight")
+        plt.savefig(paths["logmel"], bbox_inches="tight")
         plt.close()
 
-        return {
-            "fft": str(fft_path),
-            "mfcc": str(mfcc_path),
-            "logmel": str(logmel_path),
+
+RENDERERS = {"fast": _render_fast, "matplotlib": _render_matplotlib}
+
+
+def _check_renderer(renderer: str):
+    """Recusa um renderizador que não está em RENDERERS"""
+    if renderer not in RENDERERS:
+        raise ValueError(
+            f"GRAPH_RENDERER desconhecido: {renderer!r} (use {' ou '.join(RENDERERS)})"
+        )
+
+
+# Configuração inválida falha na inicialização, não na primeira análise
+_check_renderer(GRAPH_RENDERER)
+
+
+def generate_audio_graphs(audio_path: str, renderer: str = GRAPH_RENDERER):
+    """
+    Gera e salva três gráficos (FFT, MFCC e Log-Mel) a partir de um arquivo de áudio.
+    Retorna os caminhos dos arquivos gerados.
+
+    O áudio é decodificado de novo (só os primeiros GRAPH_MAX_SECONDS), em
+    vez de reaproveitar as matrizes do AudioProcessor: os gráficos usam a
+    taxa nativa (eixo de frequências até Nyquist) e 20 MFCCs, enquanto as
+    features usam 22.05 kHz e 13; o AudioProcessor libera a magnitude da
+    STFT logo após usá-la e, em gravações longas, nunca tem a matriz da
+    gravação inteira; e o AudioFeatures atravessa o socket do servidor de
+    inferência, onde matrizes (1025 x quadros) seriam copiadas junto.
+    """
+    _check_renderer(renderer)
+    try:
+        # Carrega o áudio
+        with span("graphs.load"):
+            y, sr = load_audio(audio_path, sr=None, duration=GRAPH_MAX_SECONDS)
+
+        with span("graphs.stft"):
+            matrices = graph_matrices(y, sr)
+
+        stem = Path(audio_path).stem
+        paths = {
+            name: GRAPHS_DIR / f"{stem}_{name}.png"
+            for name in ("fft", "mfcc", "logmel")
         }
+        RENDERERS[renderer](matrices, sr, paths)
+
+        return {name: str(path) for name, path in paths.items()}
 
     except Exception as e:
         raise RuntimeError(f"Erro ao gerar gráficos: {e}")
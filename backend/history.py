@@ -0,0 +1,249 @@
+"""
+Histórico persistente de análises (GET /api/history).
+
+Cada análise concluída (rota síncrona ou job) vira uma linha em ``analyses``
+com os campos usados em filtros e listagens; o resultado completo, as
+detecções e os tempos por etapa ficam em ``analysis_details`` (1:1), para
+que a varredura de índices e páginas não carregue os JSONs grandes.
+
+A paginação é por cursor (keyset) sobre ``(created_at, id)``: cada página é
+uma busca no índice a partir do último item da anterior, com custo
+independente da posição, mesmo com milhões de linhas. Os filtros por
+``risk_level``, ``gunshot_detected`` e hash do conteúdo têm índices próprios
+que terminam em ``(created_at, id)`` pelo mesmo motivo.
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from db import connect, init_db
+
+HISTORY_DB = os.getenv("HISTORY_DB", "data/history.db")
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    filename TEXT,
+    content_hash TEXT,
+    gunshot_detected INTEGER NOT NULL,
+    confidence REAL,
+    probability REAL,
+    risk_level TEXT,
+    method TEXT,
+    model_version TEXT,
+    duration REAL,
+    sample_rate INTEGER,
+    channels INTEGER,
+    detections_count INTEGER NOT NULL DEFAULT 0,
+    total_ms REAL
+);
+CREATE TABLE IF NOT EXISTS analysis_details (
+    analysis_id INTEGER PRIMARY KEY REFERENCES analyses (id) ON DELETE CASCADE,
+    detections TEXT NOT NULL DEFAULT '[]',
+    timings TEXT,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_created ON analyses (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_analyses_risk
+    ON analyses (risk_level, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_analyses_gunshot
+    ON analyses (gunshot_detected, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_analyses_hash
+    ON analyses (content_hash, created_at, id);
+"""
+
+_RECORD_COLUMNS = (
+    "created_at, filename, content_hash, gunshot_detected, confidence,"
+    " probability, risk_level, method, model_version, duration, sample_rate,"
+    " channels, detections_count, total_ms"
+)
+_SUMMARY_COLUMNS = "id, " + _RECORD_COLUMNS
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts).isoformat() if ts else None
+
+
+def encode_cursor(created_at: float, analysis_id: int) -> str:
+    # repr preserva o float exato: a comparação do keyset não repete nem pula linhas
+    return f"{created_at!r}_{analysis_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """Inverso de encode_cursor; ValueError se o cursor for inválido"""
+    created_at, _, analysis_id = cursor.partition("_")
+    return float(created_at), int(analysis_id)
+
+
+def _summary(row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "created_at": _iso(row["created_at"]),
+        "filename": row["filename"],
+        "content_hash": row["content_hash"],
+        "gunshot_detected": bool(row["gunshot_detected"]),
+        "confidence": row["confidence"],
+        "probability": row["probability"],
+        "risk_level": row["risk_level"],
+        "method": row["method"],
+        "model_version": row["model_version"],
+        "duration": row["duration"],
+        "sample_rate": row["sample_rate"],
+        "channels": row["channels"],
+        "detections_count": row["detections_count"],
+        "total_ms": row["total_ms"],
+    }
+
+
+class HistoryStore:
+    """Acesso ao histórico de análises (uma conexão curta por operação)"""
+
+    def __init__(self, db_path: str = HISTORY_DB):
+        self.db_path = str(db_path)
+        init_db(self.db_path, _SCHEMA)
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def record(
+        self,
+        result: Dict[str, Any],
+        content_hash: Optional[str] = None,
+        model_version: Optional[str] = None,
+        timings: Optional[Dict[str, Any]] = None,
+    ) -> int:
+        """
+        Grava o resultado de run_analysis; devolve o id da análise
+
+        Args:
+            result: Resposta da análise (formato de POST /api/analyze)
+            content_hash: SHA-256 do arquivo enviado
+            model_version: Modelo que produziu a predição ("nome@versão")
+            timings: Trace da requisição (tracing.Trace.to_dict)
+        """
+        analysis = result.get("analysis", {})
+        features = result.get("audio_features", {})
+        detections = result.get("detections", [])
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = conn.execute(
+                    f"INSERT INTO analyses ({_RECORD_COLUMNS})"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        time.time(),
+                        result.get("filename"),
+                        content_hash,
+                        int(bool(analysis.get("gunshot_detected"))),
+                        analysis.get("confidence"),
+                        analysis.get("probability"),
+                        analysis.get("risk_level"),
+                        analysis.get("method"),
+                        model_version,
+                        features.get("duration"),
+                        features.get("sample_rate"),
+                        features.get("channels"),
+                        len(detections),
+                        timings.get("total_ms") if timings else None,
+                    ),
+                )
+                analysis_id = cursor.lastrowid
+                conn.execute(
+                    "INSERT INTO analysis_details (analysis_id, detections, timings,"
+                    " result) VALUES (?, ?, ?, ?)",
+                    (
+                        analysis_id,
+                        json.dumps(detections),
+                        json.dumps(timings) if timings else None,
+                        json.dumps(result),
+                    ),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return analysis_id
+
+    def list(
+        self,
+        limit: int = HISTORY_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        risk_level: Optional[str] = None,
+        gunshot_detected: Optional[bool] = None,
+        content_hash: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Uma página do histórico, da análise mais recente para a mais antiga
+
+        ``next_cursor`` (None na última página) é passado como ``cursor``
+        para buscar a página seguinte. ``since``/``until`` são timestamps Unix.
+        """
+        limit = max(1, min(int(limit), HISTORY_MAX_PAGE_SIZE))
+        where: List[str] = []
+        params: List[Any] = []
+        if risk_level is not None:
+            where.append("risk_level = ?")
+            params.append(risk_level)
+        if gunshot_detected is not None:
+            where.append("gunshot_detected = ?")
+            params.append(int(gunshot_detected))
+        if content_hash is not None:
+            where.append("content_hash = ?")
+            params.append(content_hash)
+        if since is not None:
+            where.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("created_at < ?")
+            params.append(until)
+        if cursor:
+            where.append("(created_at, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        query = f"SELECT {_SUMMARY_COLUMNS} FROM analyses"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        # Uma linha a mais indica se existe próxima página
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+        return {"items": [_summary(row) for row in rows], "next_cursor": next_cursor}
+
+    def get(self, analysis_id: int) -> Optional[Dict[str, Any]]:
+        """Análise completa: resumo, detecções, tempos e a resposta original"""
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {_SUMMARY_COLUMNS} FROM analyses WHERE id = ?",
+                (analysis_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            details = conn.execute(
+                "SELECT detections, timings, result FROM analysis_details"
+                " WHERE analysis_id = ?",
+                (analysis_id,),
+            ).fetchone()
+
+        record = _summary(row)
+        if details is not None:
+            record["detections"] = json.loads(details["detections"])
+            record["timings"] = (
+                json.loads(details["timings"]) if details["timings"] else None
+            )
+            record["result"] = json.loads(details["result"])
+        return record
@@ -0,0 +1,428 @@
+"""
+Processo de inferência dedicado (um único dono do modelo).
+
+Em produção com ``uvicorn main:app --workers N`` cada worker carregaria sua
+própria cópia do TensorFlow e dos pesos do EfficientNet. Neste modo um único
+processo carrega o modelo e agrupa pedidos em micro-lotes; os workers HTTP
+calculam o espectrograma localmente e o enviam por um socket local.
+
+As mensagens trafegam com pickle (multiprocessing.connection): quem conecta
+e autentica executa código no servidor. O socket Unix é criado com
+permissão 0600 (só o usuário do servidor conecta); um endereço TCP exige
+``INFERENCE_SERVER_AUTHKEY``, sem valor padrão.
+
+Uso:
+    python inference_server.py --address /tmp/gunshot-inference.sock
+    INFERENCE_SERVER_ADDRESS=/tmp/gunshot-inference.sock uvicorn main:app --workers 4
+"""
+
+import argparse
+import logging
+import os
+import queue
+import socket
+import stat
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from detection_gate import DetectionGate
+from metrics import QUEUE_DEPTH
+from tracing import span
+from model_loader import RULES_CONFIG, ModelLoader, load_rules
+from records import AnalysisResult, AudioFeatures
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADDRESS = "/tmp/gunshot-inference.sock"
+INFERENCE_SERVER_AUTHKEY = os.getenv("INFERENCE_SERVER_AUTHKEY", "").encode()
+# Chave do socket Unix sem INFERENCE_SERVER_AUTHKEY: não é segredo, quem
+# protege o socket é a permissão 0600
+UNIX_SOCKET_AUTHKEY = b"gunshot-inference"
+
+
+def parse_address(address: str):
+    """'host:porta' vira endereço TCP; qualquer outro valor é um socket Unix"""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and not address.startswith("/"):
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+def resolve_authkey(address, authkey: Optional[bytes] = None) -> bytes:
+    """
+    Chave de autenticação da conexão (``authkey`` ou INFERENCE_SERVER_AUTHKEY)
+
+    Raises:
+        ValueError: endereço TCP sem chave definida
+    """
+    authkey = authkey or INFERENCE_SERVER_AUTHKEY
+    if authkey:
+        return authkey
+    if isinstance(address, tuple):
+        raise ValueError(
+            f"Endereço TCP {address[0]}:{address[1]} exige INFERENCE_SERVER_AUTHKEY "
+            "(as mensagens são desserializadas com pickle)"
+        )
+    return UNIX_SOCKET_AUTHKEY
+
+
+def _remove_stale_socket(path: str):
+    """Remove o socket órfão de uma execução anterior; recusa outros arquivos"""
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise RuntimeError(f"{path} existe e não é um socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)  # ninguém ouvindo
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"Outro processo já ouve em {path}")
+
+
+class _PendingPrediction:
+    """Pedido aguardando vaga em um micro-lote"""
+
+    __slots__ = ("spectrogram", "features", "result", "done")
+
+    def __init__(self, spectrogram, features):
+        self.spectrogram = spectrogram
+        self.features = features
+        self.result = None
+        self.done = threading.Event()
+
+
+class InferenceServer:
+    """
+    Serve predições do ModelLoader para vários processos HTTP
+
+    Pedidos de espectrograma são agrupados: o primeiro da fila abre um lote
+    que espera até ``max_wait_ms`` por companheiros (ou até encher
+    ``max_batch_size``) e todos seguem numa única chamada ao modelo.
+    """
+
+    def __init__(
+        self,
+        model_loader: ModelLoader,
+        address=DEFAULT_ADDRESS,
+        authkey: Optional[bytes] = None,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10.0,
+    ):
+        self.model_loader = model_loader
+        self.address = parse_address(address) if isinstance(address, str) else address
+        self.authkey = resolve_authkey(self.address, authkey)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue: "queue.Queue[_PendingPrediction]" = queue.Queue()
+        self._model_lock = threading.Lock()
+
+    def listen(self) -> Listener:
+        """Abre o Listener; o socket Unix nasce com permissão 0600"""
+        if not isinstance(self.address, str):
+            return Listener(self.address, authkey=self.authkey)
+
+        _remove_stale_socket(self.address)
+        # A umask vale no bind, antes de qualquer conexão ser possível
+        previous = os.umask(0o177)
+        try:
+            listener = Listener(self.address, authkey=self.authkey)
+        finally:
+            os.umask(previous)
+        os.chmod(self.address, 0o600)
+        return listener
+
+    def serve_forever(self):
+        """Aceita conexões (uma thread por worker HTTP) até ser interrompido"""
+        listener = self.listen()
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+
+        with listener:
+            logger.info(f"✓ Servidor de inferência ouvindo em {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    logger.warning(f"Conexão recusada: {e}")
+                    continue
+                threading.Thread(
+                    target=self._handle_connection, args=(conn,), daemon=True
+                ).start()
+
+    def _handle_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+
+                try:
+                    response = {"ok": True, "result": self._dispatch(request)}
+                except Exception as e:
+                    logger.error(f"Erro ao atender pedido de inferência: {e}")
+                    response = {"ok": False, "error": str(e)}
+
+                try:
+                    conn.send(response)
+                except (EOFError, OSError):
+                    return
+
+    def _dispatch(self, request: Dict[str, Any]):
+        op = request.get("op")
+
+        if op == "info":
+            return self._info()
+
+        if op == "reload":
+            with self._model_lock:
+                self.model_loader.load_model()
+            return self._info()
+
+        if op == "predict_spectrogram":
+            job = _PendingPrediction(request["spectrogram"], request["features"])
+            self._queue.put(job)
+            QUEUE_DEPTH.labels(queue="inference").set(self._queue.qsize())
+            job.done.wait()
+            return job.result
+
+        if op == "predict_spectrograms":
+            # Lote já montado pelo cliente (janelas de uma gravação longa)
+            with self._model_lock:
+                if self.model_loader.model_framework != "tf_keras":
+                    raise RuntimeError("Modelo carregado não é Keras")
+                probs = self.model_loader.predict_spectrograms(request["spectrograms"])
+            return [float(p) for p in probs]
+
+        if op == "predict":
+            with self._model_lock:
+                return self.model_loader.predict(request["features"])
+
+        raise ValueError(f"Operação desconhecida: {op}")
+
+    def _info(self) -> Dict[str, Any]:
+        loader = self.model_loader
+        return {
+            "framework": loader.model_framework,
+            "loaded": loader.is_loaded(),
+            "input_shape": (
+                loader.model_input_shape()
+                if loader.model_framework == "tf_keras"
+                else None
+            ),
+            "model_info": loader.get_model_info(),
+        }
+
+    def _batch_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            QUEUE_DEPTH.labels(queue="inference").set(self._queue.qsize())
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        loader = self.model_loader
+        try:
+            with self._model_lock:
+                if loader.model_framework != "tf_keras":
+                    # Modelo recarregado para outro framework: predição completa
+                    results = [loader.predict(job.features) for job in batch]
+                else:
+                    probs = loader.predict_spectrograms(
+                        [job.spectrogram for job in batch]
+                    )
+                    results = [
+                        loader._tf_result(float(prob), job.features)
+                        for job, prob in zip(batch, probs)
+                    ]
+            logger.info(f"Micro-lote de inferência: {len(batch)} item(ns)")
+        except Exception as e:
+            logger.error(f"Erro no micro-lote de inferência: {e}")
+            results = [loader._fallback(job.features, "tf_error") for job in batch]
+
+        for job, result in zip(batch, results):
+            job.result = result
+            job.done.set()
+
+
+class RemoteModelLoader(ModelLoader):
+    """
+    ModelLoader dos workers HTTP: delega a inferência ao InferenceServer
+
+    Não importa TensorFlow nem carrega pesos. Para o modelo Keras o
+    espectrograma é calculado localmente e só o array float32 trafega pelo
+    socket. Se o servidor estiver fora do ar, cai no modelo de regras.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey: Optional[bytes] = None):
+        # Sem super().__init__(): nada de carregar modelo neste processo
+        self.address = parse_address(address) if isinstance(address, str) else address
+        self.authkey = resolve_authkey(self.address, authkey)
+        self._local = threading.local()
+
+        self.model = None
+        self.model_framework = None
+        self.last_error: str | None = None
+        self.model_info: Dict[str, Any] = {}
+        self.input_shape = None
+        self.gate = DetectionGate()
+        self.rules = load_rules(RULES_CONFIG)
+        # O frontend no grafo só existe no processo que carrega o modelo
+        self.waveform_model = None
+
+        self._refresh_info()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def _call(self, request: Dict[str, Any]):
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send(request)
+                response = conn.recv()
+                break
+            except (EOFError, OSError):
+                # Servidor reiniciado: descarta a conexão e tenta uma vez mais
+                self._local.conn = None
+                if attempt == 1:
+                    raise
+
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error", "Erro no servidor de inferência"))
+        return response["result"]
+
+    def _apply_info(self, info: Dict[str, Any]):
+        self.model_framework = info.get("framework")
+        self.input_shape = info.get("input_shape")
+        self.model_info = {
+            **info.get("model_info", {}),
+            "inference_server": str(self.address),
+        }
+        # Remove campos de estado; get_model_info os recalcula localmente
+        for key in ("loaded", "load_error"):
+            self.model_info.pop(key, None)
+        self.model = "remote" if info.get("loaded") else None
+        self.last_error = None
+
+    def _refresh_info(self):
+        try:
+            self._apply_info(self._call({"op": "info"}))
+        except Exception as e:
+            logger.error(f"Servidor de inferência indisponível em {self.address}: {e}")
+            self.last_error = str(e)
+            self._load_default_model()
+            self.model_framework = None
+
+    def load_model(self):
+        """Pede ao servidor que recarregue o modelo"""
+        self._apply_info(self._call({"op": "reload"}))
+
+    def model_input_shape(self):
+        if self.input_shape:
+            return tuple(self.input_shape)
+        return 224, 224, 3
+
+    def predict_spectrograms(self, spectrograms) -> np.ndarray:
+        """Envia um lote de log-mels; o servidor roda um único model.predict"""
+        with span("inference_server.predict_spectrograms", stage="model_inference"):
+            probs = self._call(
+                {"op": "predict_spectrograms", "spectrograms": list(spectrograms)}
+            )
+        return np.asarray(probs, dtype=float)
+
+    def _clip_prediction(
+        self, spec: np.ndarray, features: AudioFeatures
+    ) -> AnalysisResult:
+        """O espectrograma do clipe entra em um micro-lote do servidor"""
+        with span("inference_server.predict_spectrogram", stage="model_inference"):
+            return self._call(
+                {"op": "predict_spectrogram", "spectrogram": spec, "features": features}
+            )
+
+    def predict(self, audio_features: AudioFeatures) -> AnalysisResult:
+        if self.model is None or self.model == "rule_based":
+            # Tenta reconectar (servidor pode ter subido depois do worker)
+            self._refresh_info()
+
+        try:
+            if self.model_framework == "tf_keras":
+                audio_path = audio_features.audio_path
+                if not audio_path or not os.path.exists(audio_path):
+                    logger.error("Caminho do áudio não fornecido ou inválido")
+                    return self._fallback(audio_features, "invalid_audio_path")
+
+                return self._keras_prediction(audio_features)
+
+            if self.model == "remote":
+                with span("inference_server.predict", stage="model_inference"):
+                    return self._call({"op": "predict", "features": audio_features})
+
+            return self._fallback(audio_features, "remote_unavailable")
+        except Exception as e:
+            logger.error(f"Erro na predição remota: {e}")
+            return self._fallback(audio_features, "remote_error")
+
+    def get_model_info(self) -> Dict[str, Any]:
+        info = {
+            "model_path": "<rule_based>",
+            "framework": "rules",
+            **self.model_info,
+            "loaded": self.is_loaded(),
+            "load_error": self.last_error,
+        }
+        return info
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de inferência compartilhado")
+    parser.add_argument(
+        "--address",
+        default=os.getenv("INFERENCE_SERVER_ADDRESS", DEFAULT_ADDRESS),
+        help="Caminho do socket Unix ou host:porta",
+    )
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if isinstance(parse_address(args.address), str):
+        Path(args.address).parent.mkdir(parents=True, exist_ok=True)
+
+    server = InferenceServer(
+        ModelLoader(),
+        address=args.address,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+    )
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
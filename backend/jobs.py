@@ -0,0 +1,467 @@
+"""
+Fila persistente de análises assíncronas (POST /api/jobs).
+
+Os jobs ficam em uma tabela SQLite (modo WAL), então sobrevivem a
+reinícios: cada worker marca ``heartbeat_at`` periodicamente e um job
+"running" cujo heartbeat parou há mais de ``JOB_STALE_SECONDS`` volta a ser
+elegível. A reserva de um job é atômica (BEGIN IMMEDIATE), o que permite
+vários processos uvicorn consumindo a mesma fila.
+
+Ao terminar, se o job tiver ``webhook_url``, o resultado é enviado por POST
+(JSON) com algumas tentativas. O endereço é escolhido por quem envia o
+arquivo, então o host é resolvido e endereços internos (loopback, redes
+privadas, link-local) são recusados, na criação do job e a cada envio; a
+conexão vai para o IP validado e redirecionamentos não são seguidos.
+``WEBHOOK_ALLOWED_HOSTS`` restringe os hosts aceitos (e libera os listados
+mesmo em rede interna).
+"""
+
+import http.client
+import ipaddress
+import json
+import logging
+import os
+import socket
+import sqlite3
+import ssl
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import SplitResult, urlsplit
+
+from db import connect, init_db
+from metrics import QUEUE_DEPTH, REQUEST_ERRORS
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB = os.getenv("JOBS_DB", "data/jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = 3
+JOB_ABANDONED_ERROR = "Job interrompido repetidamente (worker reiniciado)"
+JOB_HEARTBEAT_SECONDS = 15.0
+WEBHOOK_TIMEOUT_SECONDS = 10.0
+WEBHOOK_ATTEMPTS = 3
+WEBHOOK_ALLOWED_HOSTS = {
+    host.strip().lower()
+    for host in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",")
+    if host.strip()
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    stage TEXT,
+    filename TEXT,
+    file_path TEXT NOT NULL,
+    options TEXT NOT NULL DEFAULT '{}',
+    webhook_url TEXT,
+    webhook_status TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+"""
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts).isoformat() if ts else None
+
+
+class JobStore:
+    """Acesso à tabela de jobs (uma conexão curta por operação)"""
+
+    def __init__(self, db_path: str = JOBS_DB):
+        self.db_path = str(db_path)
+        init_db(self.db_path, _SCHEMA)
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def create(
+        self,
+        filename: str,
+        file_path: str,
+        options: Optional[Dict[str, Any]] = None,
+        webhook_url: Optional[str] = None,
+    ) -> str:
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, stage, filename, file_path, options,"
+                " webhook_url, created_at) VALUES (?, 'queued', 'queued', ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    filename,
+                    file_path,
+                    json.dumps(options or {}),
+                    webhook_url,
+                    time.time(),
+                ),
+            )
+        self._update_queue_gauge()
+        return job_id
+
+    def claim_next(self) -> Optional[sqlite3.Row]:
+        """
+        Reserva o job mais antigo na fila (ou abandonado por um worker parado)
+
+        Jobs abandonados JOB_MAX_ATTEMPTS vezes passam a erro: o arquivo é
+        removido e o erro vai para o webhook, numa thread à parte para não
+        atrasar o job reservado.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Job que já derrubou seus workers JOB_MAX_ATTEMPTS vezes não volta à fila
+                abandoned = conn.execute(
+                    "SELECT id, file_path, webhook_url FROM jobs WHERE status = 'running'"
+                    " AND heartbeat_at < ? AND attempts >= ?",
+                    (now - JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS),
+                ).fetchall()
+                conn.execute(
+                    "UPDATE jobs SET status = 'error', stage = 'error', error = ?,"
+                    " finished_at = ? WHERE status = 'running' AND heartbeat_at < ?"
+                    " AND attempts >= ?",
+                    (
+                        JOB_ABANDONED_ERROR,
+                        now,
+                        now - JOB_STALE_SECONDS,
+                        JOB_MAX_ATTEMPTS,
+                    ),
+                )
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued'"
+                    " OR (status = 'running' AND heartbeat_at < ?)"
+                    " ORDER BY created_at LIMIT 1",
+                    (now - JOB_STALE_SECONDS,),
+                ).fetchone()
+                job = None
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', stage = 'starting',"
+                        " attempts = attempts + 1, started_at = ?, heartbeat_at = ?"
+                        " WHERE id = ?",
+                        (now, now, row["id"]),
+                    )
+                    job = conn.execute(
+                        "SELECT * FROM jobs WHERE id = ?", (row["id"],)
+                    ).fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        for row in abandoned:
+            remove_upload(row["file_path"])
+            if row["webhook_url"]:
+                payload = {
+                    "job_id": row["id"],
+                    "status": "error",
+                    "error": JOB_ABANDONED_ERROR,
+                }
+                threading.Thread(
+                    target=self.deliver_webhook,
+                    args=(row["id"], row["webhook_url"], payload),
+                    name=f"job-webhook-{row['id']}",
+                    daemon=True,
+                ).start()
+        if job is not None:
+            self._update_queue_gauge()
+        return job
+
+    def update_progress(self, job_id: str, progress: float, stage: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, stage = ?, heartbeat_at = ? WHERE id = ?",
+                (progress, stage, time.time(), job_id),
+            )
+
+    def heartbeat(self, job_ids):
+        if not job_ids:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'",
+                [(time.time(), job_id) for job_id in job_ids],
+            )
+
+    def finish(self, job_id: str, result: Dict[str, Any]):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', progress = 1, stage = 'done',"
+                " result = ?, finished_at = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'error', stage = 'error', error = ?,"
+                " finished_at = ? WHERE id = ?",
+                (error, time.time(), job_id),
+            )
+
+    def set_webhook_status(self, job_id: str, status: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET webhook_status = ? WHERE id = ?", (status, job_id)
+            )
+
+    def deliver_webhook(self, job_id: str, url: str, payload: Dict[str, Any]):
+        """Envia ``payload`` ao webhook do job e registra o resultado do envio"""
+        self.set_webhook_status(job_id, send_webhook(url, payload))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Estado público do job (formato da resposta de GET /api/jobs/{id})"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = {
+            "job_id": row["id"],
+            "status": row["status"],
+            "progress": round(row["progress"], 3),
+            "stage": row["stage"],
+            "filename": row["filename"],
+            "created_at": _iso(row["created_at"]),
+            "started_at": _iso(row["started_at"]),
+            "finished_at": _iso(row["finished_at"]),
+            "attempts": row["attempts"],
+        }
+        if row["webhook_url"]:
+            job["webhook_status"] = row["webhook_status"]
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+        if row["error"] is not None:
+            job["error"] = row["error"]
+        return job
+
+    def queued_count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+            ).fetchone()[0]
+
+    def _update_queue_gauge(self):
+        try:
+            QUEUE_DEPTH.labels(queue="jobs").set(self.queued_count())
+        except sqlite3.Error:
+            pass
+
+
+def remove_upload(file_path: Optional[str]):
+    """Remove o arquivo enviado de um job encerrado"""
+    if not file_path:
+        return
+    try:
+        Path(file_path).unlink(missing_ok=True)
+    except OSError as e:
+        logger.warning(f"Não foi possível remover arquivo do job {file_path}: {e}")
+
+
+class WebhookRejected(ValueError):
+    """webhook_url inválido ou apontando para a rede interna"""
+
+
+def resolve_webhook(url: str) -> Tuple[SplitResult, List[str]]:
+    """
+    Valida ``url`` e resolve o host
+
+    Returns:
+        (URL decomposta, IPs aceitos para a conexão)
+
+    Raises:
+        WebhookRejected: esquema não http(s), host fora de
+            WEBHOOK_ALLOWED_HOSTS ou que resolve para endereço não público
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise WebhookRejected("webhook_url deve ser uma URL http(s)")
+    host = parts.hostname.lower()
+    if WEBHOOK_ALLOWED_HOSTS and host not in WEBHOOK_ALLOWED_HOSTS:
+        raise WebhookRejected(f"Host do webhook não permitido: {host}")
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+    except (OSError, ValueError) as e:
+        raise WebhookRejected(f"Host do webhook inválido ({host}): {e}")
+
+    addresses = []
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        # Qualquer endereço interno recusa o host (não só o primeiro)
+        if not address.is_global and host not in WEBHOOK_ALLOWED_HOSTS:
+            raise WebhookRejected(
+                f"Host do webhook resolve para endereço interno: {host} ({address})"
+            )
+        addresses.append(str(address))
+    return parts, addresses
+
+
+def _post_json(parts: SplitResult, address: str, data: bytes) -> int:
+    """POST para o IP já validado (sem nova resolução nem redirecionamentos)"""
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    sock = socket.create_connection((address, port), timeout=WEBHOOK_TIMEOUT_SECONDS)
+    if parts.scheme == "https":
+        conn = http.client.HTTPSConnection(
+            parts.hostname, port, timeout=WEBHOOK_TIMEOUT_SECONDS
+        )
+        sock = ssl.create_default_context().wrap_socket(
+            sock, server_hostname=parts.hostname
+        )
+    else:
+        conn = http.client.HTTPConnection(
+            parts.hostname, port, timeout=WEBHOOK_TIMEOUT_SECONDS
+        )
+    conn.sock = sock
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    try:
+        conn.request(
+            "POST", path, body=data, headers={"Content-Type": "application/json"}
+        )
+        return conn.getresponse().status
+    finally:
+        conn.close()
+
+
+def send_webhook(url: str, payload: Dict[str, Any]) -> str:
+    """POST JSON com novas tentativas; devolve 'delivered' ou 'failed: ...'"""
+    data = json.dumps(payload).encode("utf-8")
+    error = None
+    for attempt in range(WEBHOOK_ATTEMPTS):
+        try:
+            # Resolvido de novo a cada envio: o DNS pode ter mudado desde a criação
+            parts, addresses = resolve_webhook(url)
+        except WebhookRejected as e:
+            logger.warning(f"Webhook {url} recusado: {e}")
+            return f"failed: {e}"
+        try:
+            status = _post_json(parts, addresses[0], data)
+            if 200 <= status < 300:
+                return "delivered"
+            error = f"HTTP {status}"
+        except Exception as e:
+            error = str(e)
+        if attempt + 1 < WEBHOOK_ATTEMPTS:
+            time.sleep(2**attempt)
+    logger.warning(f"Webhook {url} falhou: {error}")
+    return f"failed: {error}"
+
+
+ProcessFn = Callable[[sqlite3.Row, Callable[[float, str], None]], Dict[str, Any]]
+
+
+class JobWorkerPool:
+    """
+    Threads que consomem a fila de jobs
+
+    ``process(job, progress)`` executa a análise e devolve o resultado;
+    ``progress(fração, etapa)`` atualiza o estado visível em GET /api/jobs/{id}.
+    """
+
+    def __init__(self, store: JobStore, process: ProcessFn, workers: int = JOB_WORKERS):
+        self.store = store
+        self.process = process
+        self.workers = max(1, workers)
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._running = set()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker_loop, name=f"job-worker-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(
+            target=self._heartbeat_loop, name="job-heartbeat", daemon=True
+        )
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        logger.info(
+            f"Fila de jobs: {self.workers} worker(s), banco {self.store.db_path}"
+        )
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def notify(self):
+        """Acorda os workers (novo job na fila)"""
+        self._wakeup.set()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(JOB_HEARTBEAT_SECONDS):
+            with self._lock:
+                running = list(self._running)
+            try:
+                self.store.heartbeat(running)
+            except sqlite3.Error as e:
+                logger.warning(f"Falha no heartbeat dos jobs: {e}")
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                job = self.store.claim_next()
+            except sqlite3.Error as e:
+                logger.error(f"Erro ao reservar job: {e}")
+                job = None
+
+            if job is None:
+                # Sem trabalho: espera um novo job (ou verifica de novo em 1s,
+                # para jobs criados por outros processos)
+                self._wakeup.wait(1.0)
+                self._wakeup.clear()
+                continue
+
+            self._run(job)
+
+    def _run(self, job: sqlite3.Row):
+        job_id = job["id"]
+        with self._lock:
+            self._running.add(job_id)
+
+        def progress(fraction: float, stage: str):
+            self.store.update_progress(job_id, fraction, stage)
+
+        try:
+            result = self.process(job, progress)
+            self.store.finish(job_id, result)
+            payload = {"job_id": job_id, "status": "done", "result": result}
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            REQUEST_ERRORS.labels(endpoint="jobs").inc()
+            logger.error(f"Job {job_id} falhou: {error}")
+            self.store.fail(job_id, error)
+            # Falha definitiva: o arquivo não será reprocessado (no sucesso
+            # run_analysis já o removeu)
+            remove_upload(job["file_path"])
+            payload = {"job_id": job_id, "status": "error", "error": error}
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+
+        if job["webhook_url"]:
+            self.store.deliver_webhook(job_id, job["webhook_url"], payload)
@@ -1,25 +1,69 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Form, Request, UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import uvicorn
 import os
 from pathlib import Path
+import hashlib
 import json
+import time
+import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
 import logging
+from typing import Any, Callable, Dict, Optional, Tuple
 
-from audio_processor import AudioProcessor
+from admission import (
+    AdmissionRejected,
+    admission,
+    check_rate_limit,
+    estimate_memory,
+    proxy_trust,
+)
+from audio_processor import CHUNKED_THRESHOLD_SECONDS, AudioProcessor
+from fingerprint import FINGERPRINT_CACHE, FRAME_HOP, FingerprintIndex
 from model_loader import ModelLoader
 from generate_audio_graphs import generate_audio_graphs
+from history import HISTORY_PAGE_SIZE, HistoryStore
+from jobs import (
+    JobStore,
+    JobWorkerPool,
+    WebhookRejected,
+    remove_upload,
+    resolve_webhook,
+)
+from metrics import (
+    CONTENT_TYPE_LATEST,
+    PREDICTIONS,
+    QUEUE_DEPTH,
+    REQUEST_ERRORS,
+    STAGE_SECONDS,
+    render_latest,
+)
+from records import AudioFeatures
+from tracing import begin_trace, current_trace, end_trace, profile_request, span
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Jobs que ficaram na fila (ou sem heartbeat) antes de um reinício são retomados
+    job_pool.start()
+    yield
+    job_pool.stop()
+    if fingerprint_index is not None:
+        fingerprint_index.save()
+
+
 app = FastAPI(
     title="Gunshot Detection API",
     description="API de detecção de tiros em áudio usando IA",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configurar CORS
@@ -31,13 +75,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Inicializar processador de áudio e modelo
+# Inicializar processador de áudio e modelo.
+# Com INFERENCE_SERVER_ADDRESS definido, o modelo vive em um processo
+# dedicado (inference_server.py) compartilhado por todos os workers.
 audio_processor = AudioProcessor()
-model_loader = ModelLoader()
+INFERENCE_SERVER_ADDRESS = os.getenv("INFERENCE_SERVER_ADDRESS")
+if INFERENCE_SERVER_ADDRESS:
+    from inference_server import RemoteModelLoader
+
+    model_loader = RemoteModelLoader(INFERENCE_SERVER_ADDRESS)
+else:
+    model_loader = ModelLoader()
+
+# Cache de análises por impressão digital acústica (áudio quase duplicado)
+fingerprint_index = FingerprintIndex() if FINGERPRINT_CACHE else None
 
 # Diretórios (usar pasta local para desenvolvimento)
 UPLOAD_DIR = Path("temp")
 UPLOAD_DIR.mkdir(exist_ok=True)
+JOBS_UPLOAD_DIR = UPLOAD_DIR / "jobs"
+JOBS_UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    detail = {
+        "rate_limited": "Limite de requisições excedido",
+        "queue_full": "Servidor sobrecarregado, tente novamente",
+        "timeout": "Servidor sobrecarregado, tente novamente",
+    }[exc.reason]
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": detail, "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _client_id(request: Request) -> str:
+    # X-Forwarded-For só vale vindo do frontend (TRUSTED_PROXIES)
+    return proxy_trust.client(
+        request.client.host if request.client else None,
+        request.headers.get("x-forwarded-for"),
+    )
 
 
 @app.get("/")
@@ -62,87 +142,470 @@ async def health_check():
     }
 
 
-@app.post("/api/analyze")
-async def analyze_audio(file: UploadFile = File(...)):
+ALLOWED_EXTENSIONS = [".wav", ".mp3", ".m4a", ".flac", ".ogg"]
+
+
+def _validate_extension(filename: str):
+    file_ext = Path(filename).suffix.lower()
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formato não suportado. Use: {', '.join(ALLOWED_EXTENSIONS)}",
+        )
+
+
+async def _save_upload(
+    file: UploadFile, directory: Path, prefix: str
+) -> Tuple[Path, str]:
     """
-    Analisa um arquivo de áudio para detectar tiros
+    Grava o upload em disco (somente o nome do arquivo recebido)
+
+    Returns:
+        (caminho do arquivo, SHA-256 do conteúdo)
     """
+    safe_name = Path(file.filename).name
+    temp_file = directory / f"{prefix}_{safe_name}"
+
+    # Copia em pedaços: gravações longas não passam inteiras pela memória.
+    # O hash (usado no histórico) é calculado na mesma passada.
+    size = 0
+    digest = hashlib.sha256()
+    with span("upload_read", stage="upload_read"):
+        try:
+            with open(temp_file, "wb") as buffer:
+                while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                    buffer.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        except BaseException:
+            # Upload interrompido (cliente desconectou, disco cheio): sem sobras
+            temp_file.unlink(missing_ok=True)
+            raise
+
+    logger.info(f"Arquivo recebido: {file.filename} ({size} bytes)")
+    return temp_file, digest.hexdigest()
+
+
+def _no_progress(fraction: float, stage: str):
+    pass
+
+
+def _model_version() -> str:
+    info = model_loader.get_model_info()
+    return f"{info.get('name', 'unknown')}@{info.get('version', 'unknown')}"
+
+
+def _record_history(response: Dict[str, Any], content_hash: Optional[str]):
+    """Grava a análise no histórico; uma falha aqui não derruba a análise"""
+    trace = current_trace()
     try:
-        # Validar tipo de arquivo
-        allowed_extensions = [".wav", ".mp3", ".m4a", ".flac", ".ogg"]
-        file_ext = Path(file.filename).suffix.lower()
+        response["history_id"] = history_store.record(
+            response,
+            content_hash=content_hash,
+            model_version=_model_version(),
+            timings=trace.to_dict() if trace is not None else None,
+        )
+    except Exception as e:
+        logger.warning(f"Não foi possível gravar a análise no histórico: {e}")
 
-        if file_ext not in allowed_extensions:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Formato não suportado. Use: {', '.join(allowed_extensions)}",
-            )
 
-        # Salvar arquivo temporariamente (usar somente o nome do arquivo recebido)
-        safe_name = Path(file.filename).name
-        temp_file = UPLOAD_DIR / f"{datetime.now().timestamp()}_{safe_name}"
+def _cache_key(per_channel: bool) -> str:
+    """Análises só são reaproveitadas com o mesmo modelo e o mesmo modo"""
+    return f"{_model_version()}|per_channel={per_channel}"
+
+
+def _features_summary(audio_features: AudioFeatures) -> Dict[str, Any]:
+    return {
+        "duration": audio_features.duration,
+        "sample_rate": audio_features.sample_rate,
+        "channels": audio_features.channels,
+        "peak_frequency": audio_features.peak_frequency,
+        "energy": audio_features.energy,
+    }
+
 
-        with open(temp_file, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+def _cached_response(
+    match: Dict[str, Any], filename: str, audio_features: AudioFeatures
+) -> Dict[str, Any]:
+    """
+    Resposta de um áudio quase duplicado a partir da análise guardada
+
+    Os tempos (detecções, onsets) são levados para a linha do tempo deste
+    arquivo, que pode ser um trecho cortado do original; as features são as
+    deste arquivo.
+    """
+    cached = match["result"]
+    offset = match["offset_frames"] * FRAME_HOP / audio_features.sample_rate
+    shift = -offset
+    detections = []
+    for detection in cached["detections"]:
+        timestamp = round(detection["timestamp"] + shift, 2)
+        if 0 <= timestamp <= audio_features.duration:
+            detections.append({**detection, "timestamp": timestamp})
+
+    response = {
+        **cached,
+        "filename": filename,
+        "analysis": {**cached["analysis"], "timestamp": datetime.now().isoformat()},
+        "audio_features": _features_summary(audio_features),
+        "detections": detections,
+        "cache": {
+            "source": "fingerprint",
+            "similarity": match["similarity"],
+            "matched_filename": cached["filename"],
+            "offset_seconds": round(offset, 3),
+        },
+    }
+    if "onset_analysis" in cached:
+        response["onset_analysis"] = {
+            **cached["onset_analysis"],
+            "times": [round(t + shift, 3) for t in cached["onset_analysis"]["times"]],
+        }
+    if audio_features.per_channel is not None and "channel_analysis" in cached:
+        response["channel_analysis"] = {
+            **cached["channel_analysis"],
+            "features": [c.to_dict() for c in audio_features.per_channel],
+            "events": audio_features.events,
+        }
+    return response
 
-        logger.info(f"Arquivo recebido: {file.filename} ({len(content)} bytes)")
 
+def _channel_analysis_skipped(
+    response: Dict[str, Any], audio_features: AudioFeatures, per_channel: bool
+):
+    """Informa na resposta que ``per_channel`` não foi atendido (gravação em blocos)"""
+    if per_channel and audio_features.chunked:
+        response["channel_analysis"] = {
+            "skipped": "chunked",
+            "detail": (
+                f"Gravações acima de {CHUNKED_THRESHOLD_SECONDS:g} s são analisadas"
+                " só na mistura mono"
+            ),
+        }
+
+
+def run_analysis(
+    temp_file: Path,
+    filename: str,
+    per_channel: bool = False,
+    progress: Callable[[float, str], None] = _no_progress,
+    content_hash: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Decodificação, features, predição e gráficos de um arquivo já em disco
+
+    Usado pela rota síncrona e pelos workers da fila de jobs; ``progress``
+    recebe (fração concluída, etapa). O resultado é gravado no histórico
+    (GET /api/history). Com FINGERPRINT_CACHE, um áudio quase idêntico a
+    um já analisado devolve a análise guardada sem predição nem gráficos.
+    """
+    match = None
+    cache_key = _cache_key(per_channel)
+    # Perfil (cProfile/pyinstrument) apenas para requisições amostradas
+    with profile_request(Path(filename).name):
         # Processar áudio
-        audio_features = audio_processor.extract_features(str(temp_file))
+        progress(0.1, "feature_extraction")
+        audio_features = audio_processor.extract_features(
+            str(temp_file), per_channel=per_channel
+        )
 
-        # Fazer predição com o modelo
-        prediction = model_loader.predict(audio_features)
+        if fingerprint_index is not None:
+            with span("fingerprint_index.lookup", stage="cache_lookup"):
+                match = fingerprint_index.lookup(audio_features.fingerprint, cache_key)
 
-        # gerar gráficos para analise
-        print("Gerando gráficos para análise...")
-        generate_audio_graphs(str(temp_file))
+        if match is None:
+            # Fazer predição com o modelo
+            progress(0.4, "model_inference")
+            prediction = model_loader.predict(audio_features)
+            PREDICTIONS.labels(method=prediction.method or "unknown").inc()
 
-        # Limpar arquivo temporário
-        try:
-            if temp_file.exists():
-                temp_file.unlink()
-        except Exception:
-            logger.warning(f"Não foi possível remover arquivo temporário: {temp_file}")
-
-        # Retornar resultado
-        return JSONResponse(
-            content={
-                "success": True,
-                "filename": file.filename,
-                "analysis": {
-                    "gunshot_detected": prediction["gunshot_detected"],
-                    "confidence": prediction["confidence"],
-                    "probability": prediction["probability"],
-                    "risk_level": prediction["risk_level"],
-                    "method": prediction.get("method"),
-                    "timestamp": datetime.now().isoformat(),
-                },
-                "audio_features": {
-                    "duration": audio_features["duration"],
-                    "sample_rate": audio_features["sample_rate"],
-                    "channels": audio_features["channels"],
-                    "peak_frequency": audio_features.get("peak_frequency"),
-                    "energy": audio_features.get("energy"),
-                },
-                "detections": prediction.get("detections", []),
-            }
+            # gerar gráficos para analise
+            progress(0.7, "graph_rendering")
+            print("Gerando gráficos para análise...")
+            with span("generate_audio_graphs", stage="graph_rendering"):
+                generate_audio_graphs(str(temp_file))
+
+    # Limpar arquivo temporário
+    try:
+        if temp_file.exists():
+            temp_file.unlink()
+    except Exception:
+        logger.warning(f"Não foi possível remover arquivo temporário: {temp_file}")
+
+    if match is not None:
+        logger.info(
+            f"Áudio quase idêntico a {match['result']['filename']} "
+            f"(similaridade {match['similarity']:.2f}): análise reaproveitada"
         )
+        response = _cached_response(match, filename, audio_features)
+        _channel_analysis_skipped(response, audio_features, per_channel)
+        _record_history(response, content_hash)
+        return response
+
+    # Retornar resultado: os registros viram JSON uma única vez, aqui
+    result = prediction.to_dict()
+    response = {
+        "success": True,
+        "filename": filename,
+        "analysis": {
+            "gunshot_detected": result["gunshot_detected"],
+            "confidence": result["confidence"],
+            "probability": result["probability"],
+            "risk_level": result["risk_level"],
+            "method": prediction.method,
+            "timestamp": datetime.now().isoformat(),
+        },
+        "audio_features": _features_summary(audio_features),
+        "detections": result["detections"],
+    }
+    if "onsets" in result:
+        # Modo por onsets: probabilidade da janela de cada onset
+        response["onset_analysis"] = result["onsets"]
+    if audio_features.per_channel is not None:
+        response["channel_analysis"] = {
+            "features": [c.to_dict() for c in audio_features.per_channel],
+            "predictions": result.get("channels", []),
+            "events": audio_features.events,
+        }
+    _channel_analysis_skipped(response, audio_features, per_channel)
+    if fingerprint_index is not None:
+        fingerprint_index.add(audio_features.fingerprint, cache_key, response)
+    _record_history(response, content_hash)
+    return response
+
+
+def run_admitted_analysis(
+    temp_file: Path,
+    filename: str,
+    lane: str,
+    shed: bool = True,
+    **kwargs,
+) -> Dict[str, Any]:
+    """
+    run_analysis dentro do orçamento de memória (admission.py)
+
+    Bloqueia até a reserva caber; se a análise for descartada
+    (AdmissionRejected) o arquivo temporário é removido.
+    """
+    cost = estimate_memory(
+        str(temp_file), temp_file.stat().st_size, kwargs.get("per_channel", False)
+    )
+    try:
+        with admission.admit(cost, lane, shed=shed):
+            return run_analysis(temp_file, filename, **kwargs)
+    except AdmissionRejected:
+        temp_file.unlink(missing_ok=True)
+        raise
+
+
+async def _analyze_upload(
+    file: UploadFile, lane: str, timings: bool = False, per_channel: bool = False
+) -> Dict[str, Any]:
+    """Grava o upload e o analisa em uma thread, na faixa de prioridade ``lane``"""
+    start = time.perf_counter()
+    QUEUE_DEPTH.labels(queue="analyze").inc()
+    # O trace é sempre coletado: os tempos por etapa vão para o histórico
+    trace, trace_token = begin_trace()
+    try:
+        # Validar tipo de arquivo
+        _validate_extension(file.filename)
+
+        # Salvar arquivo temporariamente
+        temp_file, content_hash = await _save_upload(
+            file, UPLOAD_DIR, str(datetime.now().timestamp())
+        )
+
+        # Fora do event loop: a espera por memória e a análise não bloqueiam
+        # as demais requisições (o trace acompanha o contexto da thread)
+        response = await run_in_threadpool(
+            run_admitted_analysis,
+            temp_file,
+            file.filename,
+            lane,
+            per_channel=per_channel,
+            content_hash=content_hash,
+        )
+        if timings:
+            response["timings"] = trace.to_dict()
+        return response
+    except AdmissionRejected:
+        raise
+    except Exception:
+        REQUEST_ERRORS.labels(endpoint="analyze").inc()
+        raise
+    finally:
+        QUEUE_DEPTH.labels(queue="analyze").dec()
+        STAGE_SECONDS.labels(stage="total").observe(time.perf_counter() - start)
+        end_trace(trace_token)
+
+
+@app.post("/api/analyze")
+async def analyze_audio(
+    request: Request,
+    file: UploadFile = File(...),
+    timings: bool = False,
+    per_channel: bool = False,
+):
+    """
+    Analisa um arquivo de áudio para detectar tiros
+
+    Com ``?timings=true`` a resposta inclui a duração (ms) de cada etapa.
+    Com ``?per_channel=true`` (áudio multicanal) inclui features e predições
+    por canal e a diferença de tempo de chegada entre canais por evento.
+    Para arquivos grandes prefira POST /api/jobs. Responde 429 quando o
+    cliente excede o limite de taxa e 503 quando o servidor está sem memória
+    disponível (ambos com Retry-After).
+    """
+    check_rate_limit(_client_id(request), "interactive")
+    try:
+        response = await _analyze_upload(
+            file, "interactive", timings=timings, per_channel=per_channel
+        )
+        return JSONResponse(content=response)
+    except AdmissionRejected:
+        raise
     except Exception as e:
         logger.error(f"Erro ao processar áudio: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _process_job(job, progress) -> Dict[str, Any]:
+    """Executado por um worker da fila (jobs.JobWorkerPool)"""
+    start = time.perf_counter()
+    options = json.loads(job["options"] or "{}")
+    _, trace_token = begin_trace()
+    try:
+        # Já persistido na fila: espera a vez sem ser descartado
+        return run_admitted_analysis(
+            Path(job["file_path"]),
+            job["filename"],
+            "interactive",
+            shed=False,
+            per_channel=options.get("per_channel", False),
+            progress=progress,
+            content_hash=options.get("content_hash"),
+        )
+    finally:
+        STAGE_SECONDS.labels(stage="total").observe(time.perf_counter() - start)
+        end_trace(trace_token)
+
+
+history_store = HistoryStore()
+job_store = JobStore()
+job_pool = JobWorkerPool(job_store, _process_job)
+
+
+@app.post("/api/jobs", status_code=202)
+async def create_job(
+    request: Request,
+    file: UploadFile = File(...),
+    per_channel: bool = False,
+    webhook_url: Optional[str] = Form(None),
+):
+    """
+    Enfileira a análise e responde imediatamente com o id do job
+
+    Acompanhe por GET /api/jobs/{job_id}; se ``webhook_url`` for informado,
+    o resultado (ou o erro) é enviado por POST ao terminar.
+    """
+    check_rate_limit(_client_id(request), "interactive")
+    _validate_extension(file.filename)
+    if webhook_url:
+        try:
+            # Resolve o host (DNS bloqueante) fora do loop de eventos
+            await run_in_threadpool(resolve_webhook, webhook_url)
+        except WebhookRejected as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    temp_file = None
+    try:
+        temp_file, content_hash = await _save_upload(
+            file, JOBS_UPLOAD_DIR, uuid.uuid4().hex
+        )
+        job_id = job_store.create(
+            file.filename,
+            str(temp_file),
+            options={"per_channel": per_channel, "content_hash": content_hash},
+            webhook_url=webhook_url,
+        )
+    except Exception as e:
+        REQUEST_ERRORS.labels(endpoint="jobs").inc()
+        logger.error(f"Erro ao criar job: {str(e)}")
+        # Sem o registro na fila nenhum worker removeria o arquivo
+        remove_upload(temp_file)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    job_pool.notify()
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/jobs/{job_id}",
+    }
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Estado, progresso e (quando concluído) o resultado de um job"""
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+
+@app.get("/api/history")
+async def list_history(
+    limit: int = HISTORY_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    risk_level: Optional[str] = None,
+    gunshot_detected: Optional[bool] = None,
+    content_hash: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """
+    Histórico de análises, da mais recente para a mais antiga
+
+    Paginação por cursor: repita a chamada com ``cursor=<next_cursor>`` até
+    ``next_cursor`` ser null. ``since``/``until`` aceitam data/hora ISO 8601.
+    """
+    try:
+        return history_store.list(
+            limit=limit,
+            cursor=cursor,
+            risk_level=risk_level,
+            gunshot_detected=gunshot_detected,
+            content_hash=content_hash,
+            since=since.timestamp() if since else None,
+            until=until.timestamp() if until else None,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+@app.get("/api/history/{analysis_id}")
+async def get_history(analysis_id: int):
+    """Análise completa do histórico (detecções, tempos e resposta original)"""
+    record = history_store.get(analysis_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Análise não encontrada")
+    return record
+
+
 @app.post("/api/batch-analyze")
-async def batch_analyze(files: list[UploadFile] = File(...)):
+async def batch_analyze(request: Request, files: list[UploadFile] = File(...)):
     """
     Analisa múltiplos arquivos de áudio
+
+    Roda na faixa "batch" do controle de admissão: usa só parte do orçamento
+    de memória e cede a vez a qualquer análise interativa que esteja esperando.
+    Cada arquivo consome uma ficha do limite de taxa do cliente.
     """
+    check_rate_limit(_client_id(request), "batch", tokens=len(files))
     results = []
 
     for file in files:
         try:
-            result = await analyze_audio(file)
+            result = await _analyze_upload(file, "batch")
             results.append({"filename": file.filename, "success": True, "data": result})
         except Exception as e:
             results.append(
@@ -152,6 +615,12 @@ async def batch_analyze(files: list[UploadFile] = File(...)):
     return {"results": results}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Métricas no formato de texto do Prometheus"""
+    return Response(content=render_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/api/model/info")
 async def model_info():
     """Retorna informações sobre o modelo carregado"""
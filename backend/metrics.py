@@ -0,0 +1,307 @@
+"""
+Métricas no formato de exposição de texto do Prometheus.
+
+Implementação mínima (contadores, gauges e histogramas com labels) para
+não adicionar dependências ao backend. Cada processo mantém seu próprio
+registro: com vários workers do uvicorn, o Prometheus deve coletar cada
+worker ou a soma deve ser feita na consulta.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+# Buckets padrão do Prometheus estendidos para arquivos longos
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values, **kwargs):
+        """Retorna a série para a combinação de labels (criada sob demanda)"""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name}: esperado labels {self.labelnames}")
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._new_child()
+                self._children[key] = child
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            lines.extend(self._collect_child(key, child))
+        return lines
+
+    def _collect_child(self, key, child) -> List[str]:
+        labels = _format_labels(self.labelnames, key)
+        return [f"{self.name}{labels} {_format_value(child.get())}"]
+
+
+class _Value:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = float(value)
+
+    def get(self) -> float:
+        return self._value
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+    def set(self, value: float):
+        self._default().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def _collect_child(self, key, child) -> List[str]:
+        counts, total = child.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            labels = _format_labels(
+                self.labelnames + ("le",), key + (_format_value(bound),)
+            )
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# Etapas: upload_read, decode, feature_extraction, spectrogram_preprocessing,
+# model_inference, graph_rendering, total
+STAGE_SECONDS = REGISTRY.register(
+    Histogram(
+        "gunshot_stage_duration_seconds",
+        "Duração de cada etapa do pipeline de análise",
+        ("stage",),
+    )
+)
+PREDICTIONS = REGISTRY.register(
+    Counter(
+        "gunshot_predictions_total",
+        "Predições concluídas por método (keras_efficientnet, rule_based, machine_learning)",
+        ("method",),
+    )
+)
+FALLBACKS = REGISTRY.register(
+    Counter(
+        "gunshot_prediction_fallbacks_total",
+        "Quedas para o modelo baseado em regras, por motivo",
+        ("reason",),
+    )
+)
+CACHE_LOOKUPS = REGISTRY.register(
+    Counter(
+        "gunshot_cache_lookups_total",
+        "Consultas a caches de análise (result=hit|miss)",
+        ("cache", "result"),
+    )
+)
+CACHE_HIT_RATIO = REGISTRY.register(
+    Gauge(
+        "gunshot_cache_hit_ratio",
+        "Fração das consultas respondidas pelo cache desde o início do processo",
+        ("cache",),
+    )
+)
+QUEUE_DEPTH = REGISTRY.register(
+    Gauge(
+        "gunshot_queue_depth",
+        "Itens aguardando ou em processamento, por fila",
+        ("queue",),
+    )
+)
+MODEL_LOAD_SECONDS = REGISTRY.register(
+    Gauge(
+        "gunshot_model_load_seconds",
+        "Tempo do último carregamento de modelo, por framework",
+        ("framework",),
+    )
+)
+REQUEST_ERRORS = REGISTRY.register(
+    Counter(
+        "gunshot_request_errors_total",
+        "Requisições de análise que terminaram em erro",
+        ("endpoint",),
+    )
+)
+ADMISSION_REJECTIONS = REGISTRY.register(
+    Counter(
+        "gunshot_admission_rejections_total",
+        "Análises descartadas pelo controle de admissão"
+        " (reason=rate_limited|queue_full|timeout)",
+        ("lane", "reason"),
+    )
+)
+ADMISSION_WAIT_SECONDS = REGISTRY.register(
+    Histogram(
+        "gunshot_admission_wait_seconds",
+        "Espera por memória antes de iniciar a análise, por faixa de prioridade",
+        ("lane",),
+    )
+)
+MEMORY_RESERVED = REGISTRY.register(
+    Gauge(
+        "gunshot_admission_memory_reserved_bytes",
+        "Memória estimada reservada pelas análises em andamento",
+    )
+)
+GATE_WINDOWS = REGISTRY.register(
+    Counter(
+        "gunshot_gate_windows_total",
+        "Janelas avaliadas pelo filtro DSP antes do modelo Keras"
+        " (decision=gated|scored)",
+        ("decision",),
+    )
+)
+
+
+def render_latest() -> str:
+    return REGISTRY.render()
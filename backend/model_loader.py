@@ -1,21 +1,133 @@
 import os
 import pickle
+import sys
 import numpy as np
 from pathlib import Path
 import logging
 from typing import Dict, Any
 import json
+import time
+
+from detection_gate import DetectionGate, count_windows
+from metrics import FALLBACKS, MODEL_LOAD_SECONDS
+from records import AnalysisResult, AudioFeatures, Detection
+from tracing import span
 
-# Imports opcionais para TensorFlow/Keras (carregamento preguiçoso)
 try:
-    import tensorflow as tf
-    from tensorflow.keras.models import model_from_json
-except Exception:  # pragma: no cover - ambiente sem TF
-    tf = None
-    model_from_json = None
+    from ml.rules_engine import load_rules
+except ImportError:  # backend executado de dentro de backend/ (fora do container)
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from ml.rules_engine import load_rules
 
 logger = logging.getLogger(__name__)
 
+# Gravações longas (features.chunked) são avaliadas em janelas deste tamanho
+WINDOW_SECONDS = float(os.getenv("MODEL_WINDOW_SECONDS", "3"))
+WINDOW_BATCH_SIZE = int(os.getenv("MODEL_WINDOW_BATCH_SIZE", "16"))
+MAX_WINDOW_DETECTIONS = 100
+# Log-mel calculado dentro do grafo TF (waveform_frontend.py) nas janelas
+WAVEFORM_FRONTEND = os.getenv("MODEL_WAVEFORM_FRONTEND", "false").lower() == "true"
+# Modo por onsets: só janelas centradas nos onsets detectados vão ao modelo
+ONSET_WINDOWS = os.getenv("MODEL_ONSET_WINDOWS", "false").lower() == "true"
+ONSET_MERGE_SECONDS = float(os.getenv("MODEL_ONSET_MERGE_SECONDS", "0.5"))
+# Regras do fallback sem modelo: nome em ml/rules/ ou caminho para um .json
+RULES_CONFIG = os.getenv("MODEL_RULES_CONFIG", "backend")
+
+# Imports opcionais para TensorFlow/Keras (carregamento preguiçoso).
+# Workers HTTP que delegam a inferência a um processo dedicado
+# (inference_server.py) nunca chegam a importar o TensorFlow.
+tf = None
+model_from_json = None
+
+
+def _import_tensorflow():
+    """Importa TensorFlow/Keras sob demanda; retorna None se indisponível"""
+    global tf, model_from_json
+    if tf is None:
+        try:
+            import tensorflow as _tf
+            from tensorflow.keras.models import model_from_json as _model_from_json
+        except Exception:  # pragma: no cover - ambiente sem TF
+            return None
+        tf, model_from_json = _tf, _model_from_json
+    return tf
+
+
+def onset_windows(
+    onsets: np.ndarray,
+    duration: float,
+    window_seconds: float = WINDOW_SECONDS,
+    merge_seconds: float = ONSET_MERGE_SECONDS,
+):
+    """
+    Agrupa onsets próximos e define uma janela do modelo por grupo
+
+    Um onset entra no grupo anterior se vier até ``merge_seconds`` depois do
+    último e o grupo continuar cabendo em meia janela. A janela
+    (``window_seconds``) é centrada no meio do grupo e deslocada para
+    dentro do áudio nas bordas.
+
+    Returns:
+        (spans [(início, fim)] em segundos, índice do grupo de cada onset)
+    """
+    onsets = np.asarray(onsets, dtype=np.float64)
+    if onsets.size == 0:
+        return [], np.zeros(0, dtype=int)
+    groups = np.zeros(onsets.size, dtype=int)
+    first = onsets[0]
+    for i in range(1, onsets.size):
+        if onsets[i] - onsets[i - 1] > merge_seconds or (
+            onsets[i] - first > window_seconds / 2
+        ):
+            first = onsets[i]
+            groups[i] = groups[i - 1] + 1
+        else:
+            groups[i] = groups[i - 1]
+
+    spans = []
+    latest_start = max(0.0, duration - window_seconds)
+    for g in range(groups[-1] + 1):
+        members = onsets[groups == g]
+        center = (members[0] + members[-1]) / 2
+        start = min(max(0.0, center - window_seconds / 2), latest_start)
+        spans.append((start, start + window_seconds))
+    return spans, groups
+
+
+def has_onsets(features: AudioFeatures) -> bool:
+    """Se há onsets para o modo por onsets pontuar"""
+    onsets = features.onsets if features.onsets is not None else features.onset_times
+    return onsets is not None and len(onsets) > 0
+
+
+def mark_onset_fallback(result: AnalysisResult, path: str) -> AnalysisResult:
+    """
+    Modo por onsets sem nenhum onset: ``result`` veio do caminho normal
+
+    ``path`` ("clip", "windowed") informa qual caminho rodou em
+    ``onsets.fallback``.
+    """
+    logger.info(f"Nenhum onset detectado: predição pelo caminho '{path}'")
+    result.onsets = {
+        "count": 0,
+        "windows": 0,
+        "fallback": path,
+        "times": [],
+        "probabilities": [],
+    }
+    return result
+
+
+def _risk_level(gunshot_prob: float) -> str:
+    """Nível de risco a partir da probabilidade de tiro (modelos ML/Keras)"""
+    if gunshot_prob >= 0.8:
+        return "high"
+    if gunshot_prob >= 0.5:
+        return "medium"
+    if gunshot_prob >= 0.3:
+        return "low"
+    return "none"
+
 
 class ModelLoader:
     """
@@ -33,6 +145,9 @@ class ModelLoader:
         self.model_file = self.model_path / "gunshot_detector.pkl"
         self.config_file = self.model_path / "model_metadata.json"
         self.scaler_file = self.model_path / "scaler.joblib"
+        # Formato compacto (árvores achatadas em .npy, memory-mapped)
+        self.compact_dir = self.model_path / "gunshot_detector_compact"
+        self.feature_scaler = None
 
         # Artefatos TF/Keras (novo modelo EfficientNet)
         self.tf_dir = Path("IA_EfficientNet_test")
@@ -40,6 +155,12 @@ class ModelLoader:
         self.tf_weights_path = self.tf_dir / "model.weights.h5"
 
         self.model_info: Dict[str, Any] = {}
+        # EfficientNet com o frontend de forma de onda (MODEL_WAVEFORM_FRONTEND)
+        self.waveform_model = None
+        # Primeiro estágio da cascata: janelas sem transiente não chegam ao Keras
+        self.gate = DetectionGate()
+        # Regras do fallback (ml/rules_engine.py), avaliadas em lote
+        self.rules = load_rules(RULES_CONFIG)
 
         # Garantir diretórios existentes quando aplicável
         self.model_path.mkdir(exist_ok=True)
@@ -49,10 +170,17 @@ class ModelLoader:
 
     def load_model(self):
         """Carrega o modelo de IA (preferência para TF/Keras EfficientNet)."""
+        start = time.perf_counter()
+        self._load_model()
+        MODEL_LOAD_SECONDS.labels(framework=self.model_framework or "rules").set(
+            time.perf_counter() - start
+        )
+
+    def _load_model(self):
         # 1) Tenta carregar o modelo TF/Keras (IA_EfficientNet_test)
         try:
             if self.tf_config_path.exists() and self.tf_weights_path.exists():
-                if tf is None or model_from_json is None:
+                if _import_tensorflow() is None or model_from_json is None:
                     raise RuntimeError(
                         "TensorFlow não está disponível no ambiente para carregar o modelo Keras."
                     )
@@ -82,6 +210,8 @@ class ModelLoader:
                 }
                 logger.info("✓ Modelo Keras carregado com sucesso")
                 self.last_error = None
+                if WAVEFORM_FRONTEND:
+                    self._load_waveform_frontend()
                 return
         except Exception as e:
             logger.error(f"Falha ao carregar modelo Keras: {e}")
@@ -91,7 +221,30 @@ class ModelLoader:
             except Exception:
                 self.last_error = "Unknown error while loading Keras model"
 
-        # 2) Fallback: tenta carregar modelo sklearn legado (se existir)
+        # 2) Fallback: modelo sklearn no formato compacto (carga em milissegundos)
+        try:
+            if (self.compact_dir / "meta.json").exists():
+                from ml.compact_forest import CompactForest
+
+                self.model = CompactForest.load(self.compact_dir, mmap=True)
+                self.model_framework = "sklearn"
+                # O scaler já vem embutido no artefato compacto
+                self.feature_scaler = None
+                self.model_info = {
+                    **self.model.meta,
+                    "model_type": self.model.meta.get(
+                        "model_type", "RandomForestClassifier"
+                    ),
+                }
+                logger.info(f"✓ Modelo compacto carregado: {self.compact_dir}")
+                logger.info(
+                    f"✓ Árvores: {self.model.n_estimators} | Nós: {self.model.meta.get('n_nodes')}"
+                )
+                return
+        except Exception as e:
+            logger.error(f"Falha ao carregar modelo compacto: {e}")
+
+        # 3) Fallback: tenta carregar modelo sklearn legado (se existir)
         try:
             # Desabilitar fallback sklearn se objetivo é usar TF
             if False and self.model_file.exists():
@@ -118,12 +271,28 @@ class ModelLoader:
         except Exception as e:
             logger.error(f"Falha ao carregar modelo sklearn: {e}")
 
-        # 3) Fallback final: modelo baseado em regras
+        # 4) Fallback final: modelo baseado em regras
         logger.warning(
             "⚠️ Nenhum modelo IA encontrado. Usando modelo baseado em regras."
         )
         self._load_default_model()
 
+    def _load_waveform_frontend(self):
+        """Envolve o modelo Keras no frontend tf.signal (janelas de WINDOW_SECONDS)"""
+        try:
+            from waveform_frontend import DEFAULT_SAMPLE_RATE, WaveformModel
+
+            self.waveform_model = WaveformModel(
+                self.model,
+                window_samples=int(WINDOW_SECONDS * DEFAULT_SAMPLE_RATE),
+                sample_rate=DEFAULT_SAMPLE_RATE,
+            )
+            self.model_info["waveform_frontend"] = True
+            logger.info("✓ Frontend de forma de onda no grafo habilitado")
+        except Exception as e:
+            logger.error(f"Falha ao montar o frontend de forma de onda: {e}")
+            self.waveform_model = None
+
     def _load_default_model(self):
         """Carrega um modelo padrão baseado em regras"""
         logger.info("Carregando modelo padrão baseado em regras")
@@ -137,7 +306,12 @@ class ModelLoader:
             "accuracy": "N/A",
         }
 
-    def predict(self, audio_features: Dict[str, Any]) -> Dict[str, Any]:
+    def _fallback(self, features: AudioFeatures, reason: str) -> AnalysisResult:
+        """Cai para o modelo de regras, contabilizando o motivo"""
+        FALLBACKS.labels(reason=reason).inc()
+        return self._rule_based_prediction(features)
+
+    def predict(self, audio_features: AudioFeatures) -> AnalysisResult:
         """
         Faz predição usando o modelo carregado
         """
@@ -145,289 +319,678 @@ class ModelLoader:
             if self.model_framework == "tf_keras":
                 return self._tf_prediction(audio_features)
             if self.model == "rule_based" or self.model is None:
-                return self._rule_based_prediction(audio_features)
+                with span("rule_based", stage="model_inference"):
+                    result = self._rule_based_prediction(audio_features)
             else:
-                return self._ml_prediction(audio_features)
+                result = self._ml_prediction(audio_features)
+            return self._with_channel_scores(result, audio_features)
 
         except Exception as e:
             logger.error(f"Erro na predição: {e}")
-            return {
-                "gunshot_detected": False,
-                "confidence": 0.0,
-                "probability": 0.0,
-                "risk_level": "unknown",
-                "error": str(e),
-            }
+            return AnalysisResult(
+                gunshot_detected=False,
+                probability=0.0,
+                risk_level="unknown",
+                error=str(e),
+            )
+
+    def _rule_columns(self, rows) -> Dict[str, list]:
+        """Colunas lidas pelas regras a partir de registros de features"""
+        return {
+            name: [getattr(row, name, 0) for row in rows]
+            for name in self.rules.features()
+        }
 
-    def _rule_based_prediction(self, features: Dict[str, Any]) -> Dict[str, Any]:
+    def _with_channel_scores(
+        self, result: AnalysisResult, features: AudioFeatures
+    ) -> AnalysisResult:
+        """Modo por canal sem modelo Keras: aplica as regras às features de cada canal"""
+        if features.per_channel and result.channels is None:
+            scored = self.rules.score(self._rule_columns(features.per_channel))
+            result.channels = [
+                {
+                    "channel": channel_features.channel,
+                    "gunshot_detected": bool(scored["gunshot_detected"][i]),
+                    "probability": float(scored["confidence"][i]),
+                    "risk_level": str(scored["risk_level"][i]),
+                    "method": "rule_based",
+                }
+                for i, channel_features in enumerate(features.per_channel)
+            ]
+        return result
+
+    def _rule_based_prediction(self, features: AudioFeatures) -> AnalysisResult:
         """
         Predição baseada em regras de características de áudio
+
+        As regras e limiares vêm de ``self.rules`` (MODEL_RULES_CONFIG).
         """
-        # Características típicas de tiros
-        gunshot_detected = False
-        confidence = 0.0
+        scored = self.rules.score(self._rule_columns([features]))
+        gunshot_detected = bool(scored["gunshot_detected"][0])
+        confidence = float(scored["confidence"][0])
         detections = []
 
-        # Regra 1: Pico de energia alto
-        if features.get("energy", 0) > 0.7:
-            confidence += 0.3
-            gunshot_detected = True
-
-        # Regra 2: Frequência característica (100-4000 Hz)
-        peak_freq = features.get("peak_frequency", 0)
-        if 100 <= peak_freq <= 4000:
-            confidence += 0.25
-            gunshot_detected = True
-
-        # Regra 3: Zero crossing rate alto (transiente rápido)
-        zcr = features.get("zero_crossing_rate", 0)
-        if zcr > 0.15:
-            confidence += 0.2
-            gunshot_detected = True
-
-        # Regra 4: Espectro de frequência característico
-        spectral_centroid = features.get("spectral_centroid", 0)
-        if spectral_centroid > 2000:
-            confidence += 0.25
-            gunshot_detected = True
-
-        # Determinar nível de risco
-        if confidence >= 0.7:
-            risk_level = "high"
-        elif confidence >= 0.4:
-            risk_level = "medium"
-        elif confidence >= 0.2:
-            risk_level = "low"
-        else:
-            risk_level = "none"
-            gunshot_detected = False
-
         # Criar detecções simuladas se tiro detectado
         if gunshot_detected and confidence > 0.5:
-            duration = features.get("duration", 0)
+            duration = features.duration
             num_detections = int(confidence * 3)  # 1-3 detecções
 
             for i in range(num_detections):
                 detections.append(
-                    {
-                        "timestamp": round(
-                            duration * (i + 1) / (num_detections + 1), 2
-                        ),
-                        "confidence": round(
-                            confidence + np.random.uniform(-0.1, 0.1), 2
-                        ),
-                        "type": "gunshot",
-                    }
+                    Detection(
+                        timestamp=duration * (i + 1) / (num_detections + 1),
+                        confidence=confidence + np.random.uniform(-0.1, 0.1),
+                    )
                 )
 
-        return {
-            "gunshot_detected": gunshot_detected,
-            "confidence": round(confidence, 2),
-            "probability": round(confidence, 2),
-            "risk_level": risk_level,
-            "detections": detections,
-            "method": "rule_based",
-        }
+        return AnalysisResult(
+            gunshot_detected=gunshot_detected,
+            probability=confidence,
+            risk_level=str(scored["risk_level"][0]),
+            detections=detections,
+            method="rule_based",
+        )
+
+    def _sklearn_trainer(self):
+        """Extrator de features com os mesmos parâmetros do treinamento"""
+        # Import relativo ao pacote ml
+        from ml.train_gunshot_detector import GunshotDetectorTrainer
 
-    def _ml_prediction(self, features: Dict[str, Any]) -> Dict[str, Any]:
+        trainer = GunshotDetectorTrainer(
+            sample_rate=self.model_info.get("sample_rate", 22050),
+            n_mfcc=self.model_info.get("n_mfcc", 40),
+            n_fft=self.model_info.get("n_fft", 2048),
+            hop_length=self.model_info.get("hop_length", 512),
+        )
+        trainer.model = self.model
+        return trainer
+
+    def _sklearn_proba(self, feature_matrix: np.ndarray) -> np.ndarray:
+        """predict_proba (N, classes), aplicando o scaler se disponível"""
+        with span("sklearn.predict_proba", stage="model_inference"):
+            if self.feature_scaler is not None:
+                feature_matrix = self.feature_scaler.transform(feature_matrix)
+            elif getattr(self.model, "has_scaler", False):
+                # Modelo compacto: aplica o scaler embutido
+                feature_matrix = self.model.transform(feature_matrix)
+            return self.model.predict_proba(feature_matrix)
+
+    def _ml_prediction(self, features: AudioFeatures) -> AnalysisResult:
         """
         Predição usando modelo de Machine Learning treinado
         """
         try:
-            # Import relativo ao pacote ml
-            from ml.train_gunshot_detector import GunshotDetectorTrainer
-
             # Criar extrator com mesmos parâmetros do treinamento
-            trainer = GunshotDetectorTrainer(
-                sample_rate=self.model_info.get("sample_rate", 22050),
-                n_mfcc=self.model_info.get("n_mfcc", 40),
-                n_fft=self.model_info.get("n_fft", 2048),
-                hop_length=self.model_info.get("hop_length", 512),
-            )
-            trainer.model = self.model
+            trainer = self._sklearn_trainer()
 
             # Extrair features do áudio original
-            audio_path = features.get("audio_path")
+            audio_path = features.audio_path
             if not audio_path or not os.path.exists(audio_path):
                 logger.error("Caminho do áudio não fornecido ou inválido")
-                return self._rule_based_prediction(features)
+                return self._fallback(features, "invalid_audio_path")
+
+            # Sem onsets o modo por onsets não teria o que pontuar: o arquivo
+            # inteiro segue para o modelo
+            onset_fallback = ONSET_WINDOWS and not has_onsets(features)
+            if ONSET_WINDOWS and not onset_fallback:
+                return self._onset_prediction(features, trainer)
+
+            # extract_features lê só os primeiros 3 s: gravações longas seguem
+            # janela a janela, como no Keras
+            if features.chunked:
+                result = self._windowed_prediction(features, trainer)
+                if onset_fallback:
+                    return mark_onset_fallback(result, "windowed")
+                return result
 
             # Extrair features usando o mesmo método do treinamento
-            feature_vector = trainer.extract_features(audio_path)
+            with span("trainer.extract_features", stage="ml_feature_extraction"):
+                feature_vector = trainer.extract_features(audio_path)
 
             if feature_vector is None:
                 logger.error("Falha ao extrair features")
-                return self._rule_based_prediction(features)
+                return self._fallback(features, "ml_feature_extraction")
 
             # Fazer predição (aplicar scaler se disponível)
-            feature_vector = feature_vector.reshape(1, -1)
-            if hasattr(self, "feature_scaler") and self.feature_scaler is not None:
-                feature_vector = self.feature_scaler.transform(feature_vector)
-            prediction = self.model.predict(feature_vector)[0]
-            probability = self.model.predict_proba(feature_vector)[0]
+            probability = self._sklearn_proba(feature_vector.reshape(1, -1))[0]
+            prediction = self.model.classes_[int(np.argmax(probability))]
 
-            gunshot_prob = probability[1] if len(probability) > 1 else probability[0]
+            gunshot_prob = float(
+                probability[1] if len(probability) > 1 else probability[0]
+            )
             gunshot_detected = bool(prediction == 1)
 
             # Determinar nível de risco
-            if gunshot_prob >= 0.8:
-                risk_level = "high"
-            elif gunshot_prob >= 0.5:
-                risk_level = "medium"
-            elif gunshot_prob >= 0.3:
-                risk_level = "low"
-            else:
-                risk_level = "none"
+            risk_level = _risk_level(gunshot_prob)
 
             # Criar detecções se tiro detectado
             detections = []
             if gunshot_detected and gunshot_prob > 0.5:
-                duration = features.get("duration", 0)
-                detections.append(
-                    {
-                        "timestamp": round(duration / 2, 2),
-                        "confidence": round(float(gunshot_prob), 2),
-                        "type": "gunshot",
-                    }
-                )
+                duration = features.duration
+                detections.append(Detection(duration / 2, gunshot_prob))
 
             logger.info(
                 f"🎯 Predição ML: {'TIRO' if gunshot_detected else 'NÃO-TIRO'} (confiança: {gunshot_prob:.2%})"
             )
 
-            return {
-                "gunshot_detected": gunshot_detected,
-                "confidence": round(float(gunshot_prob), 2),
-                "probability": round(float(gunshot_prob), 2),
-                "risk_level": risk_level,
-                "detections": detections,
-                "method": "machine_learning",
-                "model_type": self.model_info.get("model_type", "Unknown"),
-            }
+            result = AnalysisResult(
+                gunshot_detected=gunshot_detected,
+                probability=gunshot_prob,
+                risk_level=risk_level,
+                detections=detections,
+                method="machine_learning",
+                model_type=self.model_info.get("model_type", "Unknown"),
+            )
+            return mark_onset_fallback(result, "clip") if onset_fallback else result
 
         except Exception as e:
             logger.error(f"Erro na predição ML: {e}")
             logger.info("Fallback para predição baseada em regras")
-            return self._rule_based_prediction(features)
+            return self._fallback(features, "ml_error")
+
+    def model_input_shape(self):
+        """Retorna (H, W, C) esperado pelo modelo Keras"""
+        try:
+            _, H, W, C = self.model.input_shape
+        except Exception:
+            # Defaults comuns do EfficientNet
+            H, W, C = 224, 224, 3
+        return H, W, C
+
+    @staticmethod
+    def compute_spectrogram(
+        audio_path: str, sample_rate: int = 22050, height: int = 224, width: int = 224
+    ) -> np.ndarray:
+        """
+        Calcula o log-mel normalizado (0..1) usado como entrada do modelo Keras.
+
+        Só depende de librosa/NumPy (via audio_decoder), então pode rodar no worker HTTP e o
+        resultado ser enviado ao processo de inferência.
+        """
+        from audio_decoder import load_audio
+
+        with span("compute_spectrogram", stage="spectrogram_preprocessing"):
+            with span("audio_decoder.load"):
+                y, sr = load_audio(audio_path, sr=sample_rate)
+            with span("spectrogram.log_mel"):
+                return ModelLoader.log_mel_spectrogram(y, sr, height, width)
+
+    @staticmethod
+    def log_mel_spectrogram(
+        y: np.ndarray, sr: int, height: int = 224, width: int = 224, out=None
+    ) -> np.ndarray:
+        """
+        Log-mel normalizado (0..1) de um sinal já decodificado, já em (H, W)
+
+        Ver spectrogram.SpectrogramPlan; ``out`` (H, W) float32 evita a alocação.
+        """
+        from spectrogram import spectrogram_plan
+
+        return spectrogram_plan(sr, height, width, len(y)).log_mel(y, out)
+
+    def predict_spectrograms(self, spectrograms) -> np.ndarray:
+        """
+        Executa o modelo Keras sobre um lote de log-mels (H, W).
+
+        Os log-mels já vêm na resolução do modelo (log_mel_spectrogram): o
+        lote é montado em um buffer float32 com os canais por broadcast e
+        segue numa única chamada ``model.predict``. Retorna a probabilidade
+        de tiro por item.
+        """
+        from spectrogram import model_batch
+
+        H, W, C = self.model_input_shape()
+        for spec in spectrograms:
+            if spec.shape != (H, W):
+                raise ValueError(
+                    f"Espectrograma {spec.shape} difere da entrada do modelo {(H, W)}"
+                )
+
+        # (N, H, W, C)
+        batch = model_batch(spectrograms, C)
+        with span("model.predict", stage="model_inference"):
+            preds = self.model.predict(batch, verbose=0)
+        return self._gunshot_probabilities(np.array(preds))
+
+    def _uses_waveform(self, sr: int) -> bool:
+        return self.waveform_model is not None and sr == self.waveform_model.sample_rate
 
-    def _tf_prediction(self, features: Dict[str, Any]) -> Dict[str, Any]:
+    def window_input(self, segment: np.ndarray, sr: int, H: int, W: int) -> np.ndarray:
+        """
+        Entrada do modelo para uma janela de WINDOW_SECONDS
+
+        Com o frontend no grafo é a própria forma de onda (a última janela,
+        mais curta, é completada com silêncio); senão, o log-mel (H, W).
+        """
+        if not self._uses_waveform(sr):
+            return self.log_mel_spectrogram(segment, sr, H, W)
+        n = self.waveform_model.window_samples
+        if len(segment) == n:
+            return segment
+        return np.pad(segment[:n], (0, max(0, n - len(segment))))
+
+    def predict_windows(self, inputs, sr: int) -> np.ndarray:
+        """Probabilidade de tiro por janela (entradas de ``window_input``)"""
+        if not self._uses_waveform(sr):
+            return self.predict_spectrograms(inputs)
+        with span("model.predict", stage="model_inference"):
+            preds = self.waveform_model.predict(np.stack(inputs).astype(np.float32))
+        return self._gunshot_probabilities(np.array(preds))
+
+    @staticmethod
+    def _gunshot_probabilities(preds: np.ndarray) -> np.ndarray:
+        """
+        Infere a probabilidade de "gunshot" para cada linha da saída do modelo.
+        Heurística: se 1 saída -> sigmoide; se >=2 -> assume índice 1 = gunshot.
+        """
+        if preds.ndim != 2:
+            # Formato inesperado
+            return np.atleast_1d(np.squeeze(preds)).astype(float)
+
+        if preds.shape[1] == 1:
+            return preds[:, 0].astype(float)
+
+        rows = preds.astype(float)
+        # Caso pareçam logits, aplica softmax por segurança
+        looks_like_probs = np.all((rows >= 0.0) & (rows <= 1.0), axis=1) & np.isclose(
+            np.sum(rows, axis=1), 1.0, atol=1e-3
+        )
+        exp = np.exp(rows - np.max(rows, axis=1, keepdims=True))
+        softmax = exp / np.sum(exp, axis=1, keepdims=True)
+        rows = np.where(looks_like_probs[:, None], rows, softmax)
+        return rows[:, 1]
+
+    def _gated_result(self, features: AudioFeatures, windows: int) -> AnalysisResult:
+        """Resposta quando o filtro DSP descartou todas as janelas (sem rodar o Keras)"""
+        result = self._tf_result(0.0, features, method="dsp_gate")
+        result.gate = {"windows": windows, "gated": windows, "scored": 0}
+        return result
+
+    def _gate_clip(self, features: AudioFeatures):
+        """
+        Filtro DSP sobre o áudio inteiro (caminho de um único espectrograma)
+
+        Devolve a resposta pronta se o áudio foi descartado, senão None.
+        """
+        sr = features.sample_rate
+        n_samples = max(1, int(round(features.duration * sr)))
+        mask = self.gate.candidates(features, n_samples, 1)
+        if mask is None:
+            return None
+        passed = bool(mask[0])
+        count_windows(int(passed), int(not passed))
+        return None if passed else self._gated_result(features, 1)
+
+    def _tf_result(
+        self,
+        gunshot_prob: float,
+        features: AudioFeatures,
+        method: str = "keras_efficientnet",
+    ) -> AnalysisResult:
+        """Monta a resposta padrão a partir da probabilidade do modelo Keras"""
+        gunshot_detected = gunshot_prob >= 0.5
+
+        # Uma detecção sintética no meio da duração para UI
+        detections = []
+        if gunshot_detected:
+            detections.append(Detection(features.duration / 2, gunshot_prob))
+
+        logger.info(
+            f"🎯 Predição {method}: {'TIRO' if gunshot_detected else 'NÃO-TIRO'} (conf: {gunshot_prob:.2%})"
+        )
+
+        return AnalysisResult(
+            gunshot_detected=bool(gunshot_detected),
+            probability=float(gunshot_prob),
+            risk_level=_risk_level(gunshot_prob),
+            detections=detections,
+            method=method,
+            model_type=self.model_info.get("type", "keras"),
+        )
+
+    def _tf_prediction(self, features: AudioFeatures) -> AnalysisResult:
         """Predição usando modelo TF/Keras (espectrograma)."""
         try:
             if tf is None or self.model is None:
                 logger.error("TensorFlow/Keras indisponível para predição")
-                return self._rule_based_prediction(features)
+                return self._fallback(features, "tf_unavailable")
 
-            audio_path = features.get("audio_path")
+            audio_path = features.audio_path
             if not audio_path or not os.path.exists(audio_path):
                 logger.error("Caminho do áudio não fornecido ou inválido")
-                return self._rule_based_prediction(features)
+                return self._fallback(features, "invalid_audio_path")
 
-            # Obter input shape do modelo (None, H, W, C)
-            try:
-                _, H, W, C = self.model.input_shape
-            except Exception:
-                # Defaults comuns do EfficientNet
-                H, W, C = 224, 224, 3
-
-            # Preparar espectrograma log-mel
-            import librosa
-
-            target_sr = features.get("sample_rate", 22050)
-            y, sr = librosa.load(audio_path, sr=target_sr)
-
-            # Mel-espectrograma
-            n_mels = min(128, H)  # limitar mels ao tamanho de altura
-            S = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=n_mels, fmax=sr / 2)
-            S_db = librosa.power_to_db(S, ref=np.max)
-
-            # Normalização 0..1
-            S_min, S_max = float(np.min(S_db)), float(np.max(S_db))
-            S_norm = (S_db - S_min) / (S_max - S_min + 1e-8)
-            S_norm = S_norm.astype("float32")
-
-            # Para ter (H, W), redimensionamos usando tf.image.resize
-            # Primeiro garantir shape (n_mels, T, 1)
-            spec = np.expand_dims(S_norm, axis=-1)  # (n_mels, T, 1)
-            spec_tf = tf.convert_to_tensor(spec)
-            spec_tf = tf.image.resize(spec_tf, size=(H, W), method="bilinear")
-
-            # Ajustar canais
-            if C == 3:
-                spec_tf = tf.image.grayscale_to_rgb(spec_tf)
-            elif C == 1:
-                # já é 1 canal
-                pass
+            return self._keras_prediction(features)
+        except Exception as e:
+            logger.error(f"Erro na predição TF/Keras: {e}")
+            return self._fallback(features, "tf_error")
+
+    def _keras_prediction(self, features: AudioFeatures) -> AnalysisResult:
+        """
+        Modo por onsets (MODEL_ONSET_WINDOWS) ou o caminho normal
+
+        Sem nenhum onset o caminho normal roda no lugar do modo por onsets
+        (que não teria janela a pontuar) e o resultado informa qual foi.
+        """
+        if ONSET_WINDOWS and not features.per_channel:
+            if has_onsets(features):
+                return self._onset_prediction(features)
+            path = "windowed" if features.chunked else "clip"
+            return mark_onset_fallback(self._tf_audio_prediction(features), path)
+        return self._tf_audio_prediction(features)
+
+    def _tf_audio_prediction(self, features: AudioFeatures) -> AnalysisResult:
+        """Janelas (gravação longa), por canal ou o clipe inteiro"""
+        if features.chunked:
+            return self._windowed_prediction(features)
+        if features.per_channel:
+            return self._per_channel_tf_prediction(features)
+
+        gated = self._gate_clip(features)
+        if gated is not None:
+            return gated
+
+        H, W, _ = self.model_input_shape()
+        spec = self.compute_spectrogram(features.audio_path, features.sample_rate, H, W)
+        return self._clip_prediction(spec, features)
+
+    def _clip_prediction(
+        self, spec: np.ndarray, features: AudioFeatures
+    ) -> AnalysisResult:
+        """Predição do clipe inteiro a partir do seu espectrograma"""
+        gunshot_prob = float(self.predict_spectrograms([spec])[0])
+        return self._tf_result(gunshot_prob, features)
+
+    def _windowed_prediction(
+        self, features: AudioFeatures, trainer=None
+    ) -> AnalysisResult:
+        """
+        Predição para gravações longas, janela a janela
+
+        O áudio é decodificado em blocos (audio_processor.iter_audio_blocks),
+        cada janela de WINDOW_SECONDS vira um log-mel (ou segue como forma de
+        onda, com o frontend no grafo) e as janelas seguem em lotes de
+        WINDOW_BATCH_SIZE para predict_windows; com ``trainer`` cada janela
+        vira o vetor de features do sklearn. Só um bloco e um lote ficam em
+        memória; a probabilidade final é a da janela mais alta. Janelas
+        descartadas pelo filtro DSP (detection_gate) nem viram log-mel.
+        """
+        from audio_decoder import iter_audio_blocks
+        from audio_processor import CHUNK_SECONDS
+
+        if trainer is None:
+            sr = features.sample_rate
+            H, W, _ = self.model_input_shape()
+        else:
+            sr = trainer.sample_rate
+        window = int(WINDOW_SECONDS * sr)
+        # Blocos com número inteiro de janelas: nenhuma janela cruza blocos
+        block_seconds = WINDOW_SECONDS * max(1, round(CHUNK_SECONDS / WINDOW_SECONDS))
+        n_windows = max(1, int(np.ceil(features.duration * sr / window)))
+        # Os envelopes do filtro estão na taxa das features
+        mask = self.gate.candidates(
+            features, int(WINDOW_SECONDS * features.sample_rate), n_windows
+        )
+
+        specs, starts = [], []
+        stats = {
+            "windows": 0,
+            "scored": 0,
+            "max": 0.0,
+            "sum": 0.0,
+            "above_threshold": 0,
+        }
+        detections = []
+
+        def flush():
+            if not specs:
+                return
+            if trainer is None:
+                probs = self.predict_windows(specs, sr)
             else:
-                # Tila para C canais caso o modelo espere canais diferentes
-                spec_tf = tf.tile(spec_tf, multiples=[1, 1, C])
-
-            # Adicionar batch
-            inp = tf.expand_dims(spec_tf, axis=0)  # (1, H, W, C)
-
-            # Predizer
-            preds = self.model.predict(inp, verbose=0)
-            preds = np.array(preds)
-
-            # Inferir probabilidade de "gunshot".
-            # Heurística: se 1 saída -> sigmoide; se >=2 -> assume índice 1 = gunshot.
-            if preds.ndim == 2:
-                num_classes = preds.shape[1]
-                if num_classes == 1:
-                    gunshot_prob = float(preds[0, 0])
+                proba = self._sklearn_proba(np.stack(specs))
+                probs = proba[:, min(1, proba.shape[1] - 1)]
+            for start, prob in zip(starts, probs):
+                prob = float(prob)
+                stats["scored"] += 1
+                stats["sum"] += prob
+                stats["max"] = max(stats["max"], prob)
+                if prob >= 0.5:
+                    stats["above_threshold"] += 1
+                    detections.append(Detection(start + WINDOW_SECONDS / 2, prob))
+            specs.clear()
+            starts.clear()
+
+        # Sem etapa própria: o lote já mede model.predict em model_inference
+        with span("windowed_prediction"):
+            for offset, y in iter_audio_blocks(features.audio_path, sr, block_seconds):
+                for i in range(0, len(y), window):
+                    segment = y[i : i + window]
+                    # Sobra final muito curta não forma uma janela útil
+                    if len(segment) < window // 4 and (i or stats["windows"]):
+                        continue
+                    stats["windows"] += 1
+                    k = min(
+                        int(round((offset + i / sr) / WINDOW_SECONDS)), n_windows - 1
+                    )
+                    if mask is not None and not mask[k]:
+                        continue
+                    if trainer is None:
+                        specs.append(self.window_input(segment, sr, H, W))
+                    else:
+                        with span(
+                            "trainer.extract_features", stage="ml_feature_extraction"
+                        ):
+                            specs.append(trainer.extract_signal_features(segment, sr))
+                    starts.append(offset + i / sr)
+                    if len(specs) >= WINDOW_BATCH_SIZE:
+                        flush()
+            flush()
+
+        if stats["windows"] == 0:
+            return self._fallback(features, "empty_audio")
+
+        gated = stats["windows"] - stats["scored"]
+        if mask is not None:
+            count_windows(stats["scored"], gated)
+        if stats["scored"] == 0:
+            return self._gated_result(features, stats["windows"])
+
+        if trainer is None:
+            result = self._tf_result(stats["max"], features)
+        else:
+            result = self._tf_result(stats["max"], features, method="machine_learning")
+            result.model_type = self.model_info.get("model_type", "Unknown")
+        # Detecções reais por janela (as mais confiantes, em ordem temporal)
+        detections.sort(key=lambda d: d.confidence, reverse=True)
+        result.detections = sorted(
+            detections[:MAX_WINDOW_DETECTIONS], key=lambda d: d.timestamp
+        )
+        result.windows = {
+            "count": stats["windows"],
+            "window_seconds": WINDOW_SECONDS,
+            "max_probability": round(stats["max"], 4),
+            "mean_probability": round(stats["sum"] / stats["scored"], 4),
+            "above_threshold": stats["above_threshold"],
+        }
+        result.gate = {
+            "windows": stats["windows"],
+            "gated": gated,
+            "scored": stats["scored"],
+        }
+        return result
+
+    def _onset_prediction(
+        self, features: AudioFeatures, trainer=None
+    ) -> AnalysisResult:
+        """
+        Predição só nas janelas em torno dos onsets (MODEL_ONSET_WINDOWS)
+
+        Onsets próximos são agrupados (onset_windows) e cada grupo vira uma
+        janela de WINDOW_SECONDS, lida do arquivo por seek
+        (audio_decoder.load_segments): numa gravação longa só uma fração do
+        áudio é decodificada e pontuada. As janelas seguem em lotes de
+        WINDOW_BATCH_SIZE para o modelo Keras (predict_windows) ou, com
+        ``trainer``, para o sklearn. Cada onset recebe a probabilidade da sua
+        janela e as detecções usam o tempo do primeiro onset do grupo.
+        """
+        from audio_decoder import load_segments
+
+        onsets = (
+            features.onsets if features.onsets is not None else features.onset_times
+        )
+        onsets = np.asarray(onsets, dtype=np.float64)
+        spans, groups = onset_windows(onsets, features.duration)
+
+        if trainer is None:
+            sr = features.sample_rate
+            H, W, _ = self.model_input_shape()
+        else:
+            sr = trainer.sample_rate
+        probs = np.zeros(len(spans))
+        with span("onset_prediction"):
+            for i in range(0, len(spans), WINDOW_BATCH_SIZE):
+                segments = load_segments(
+                    features.audio_path, spans[i : i + WINDOW_BATCH_SIZE], sr
+                )
+                if trainer is None:
+                    inputs = [self.window_input(y, sr, H, W) for y in segments]
+                    probs[i : i + len(segments)] = self.predict_windows(inputs, sr)
                 else:
-                    # Softmax ou logits
-                    row = preds[0]
-                    # Caso pareça logits, aplica softmax por segurança
-                    if not np.all((row >= 0.0) & (row <= 1.0)) or not np.isclose(
-                        np.sum(row), 1.0, atol=1e-3
+                    with span(
+                        "trainer.extract_features", stage="ml_feature_extraction"
                     ):
-                        exp = np.exp(row - np.max(row))
-                        row = exp / np.sum(exp)
-                    gunshot_prob = float(row[1]) if num_classes > 1 else float(row[0])
-            else:
-                # Formato inesperado
-                gunshot_prob = float(np.squeeze(preds))
+                        matrix = np.stack(
+                            [trainer.extract_signal_features(y, sr) for y in segments]
+                        )
+                    proba = self._sklearn_proba(matrix)
+                    probs[i : i + len(segments)] = proba[:, min(1, proba.shape[1] - 1)]
+
+        gunshot_prob = float(probs.max()) if probs.size else 0.0
+        if trainer is None:
+            method, model_type = "keras_efficientnet", self.model_info.get(
+                "type", "keras"
+            )
+        else:
+            method = "machine_learning"
+            model_type = self.model_info.get("model_type", "Unknown")
 
-            gunshot_detected = gunshot_prob >= 0.5
+        # Detecções no primeiro onset de cada janela (as mais confiantes, em ordem temporal)
+        firsts = np.flatnonzero(np.diff(groups, prepend=-1))
+        detections = [
+            Detection(float(onsets[firsts[g]]), float(probs[g]))
+            for g in np.flatnonzero(probs >= 0.5)
+        ]
+        detections.sort(key=lambda d: d.confidence, reverse=True)
+        detections = sorted(
+            detections[:MAX_WINDOW_DETECTIONS], key=lambda d: d.timestamp
+        )
 
-            # Determinar nível de risco
-            if gunshot_prob >= 0.8:
-                risk_level = "high"
-            elif gunshot_prob >= 0.5:
-                risk_level = "medium"
-            elif gunshot_prob >= 0.3:
-                risk_level = "low"
-            else:
-                risk_level = "none"
+        logger.info(
+            f"🎯 Predição por onsets: {len(spans)} janela(s) para {onsets.size} onset(s) (máx: {gunshot_prob:.2%})"
+        )
+        scored_seconds = sum(end - start for start, end in spans)
+        return AnalysisResult(
+            gunshot_detected=gunshot_prob >= 0.5,
+            probability=gunshot_prob,
+            risk_level=_risk_level(gunshot_prob),
+            detections=detections,
+            method=method,
+            model_type=model_type,
+            onsets={
+                "count": int(onsets.size),
+                "windows": len(spans),
+                "window_seconds": WINDOW_SECONDS,
+                "scored_fraction": round(
+                    min(1.0, float(scored_seconds) / max(features.duration, 1e-9)), 4
+                ),
+                "times": onsets,
+                "probabilities": probs[groups],
+            },
+        )
 
-            # Uma detecção sintética no meio da duração para UI
-            detections = []
-            if gunshot_detected:
-                duration = features.get("duration", 0)
-                detections.append(
-                    {
-                        "timestamp": round(float(duration) / 2 if duration else 0.0, 2),
-                        "confidence": round(float(gunshot_prob), 2),
-                        "type": "gunshot",
-                    }
-                )
+    def _per_channel_tf_prediction(self, features: AudioFeatures) -> AnalysisResult:
+        """
+        Predição Keras por canal (arranjos de microfones, estéreo)
 
-            logger.info(
-                f"🎯 Predição Keras: {'TIRO' if gunshot_detected else 'NÃO-TIRO'} (conf: {gunshot_prob:.2%})"
+        Decodifica todos os canais uma vez e monta um log-mel por
+        (canal, janela de WINDOW_SECONDS); todos seguem juntos para
+        predict_spectrograms, em lotes de até WINDOW_BATCH_SIZE. A
+        probabilidade final é a maior entre canais e janelas. O filtro DSP é
+        aplicado à mistura: janelas descartadas ficam com probabilidade 0 em
+        todos os canais.
+        """
+        from audio_decoder import load_audio
+
+        H, W, _ = self.model_input_shape()
+        with span("audio_decoder.load"):
+            channels, sr = load_audio(
+                features.audio_path,
+                sr=features.sample_rate,
+                mono=False,
             )
 
-            return {
-                "gunshot_detected": bool(gunshot_detected),
-                "confidence": round(float(gunshot_prob), 2),
-                "probability": round(float(gunshot_prob), 2),
-                "risk_level": risk_level,
-                "detections": detections,
-                "method": "keras_efficientnet",
-                "model_type": self.model_info.get("type", "keras"),
+        window = int(WINDOW_SECONDS * sr)
+        n_samples = channels.shape[-1]
+        # Sobra final muito curta não forma uma janela útil
+        starts = [
+            s
+            for s in range(0, n_samples, window)
+            if s == 0 or n_samples - s >= window // 4
+        ]
+
+        mask = self.gate.candidates(features, window, len(starts))
+        candidates = [w for w in range(len(starts)) if mask is None or mask[w]]
+        if mask is not None:
+            count_windows(len(candidates), len(starts) - len(candidates))
+        if not candidates:
+            return self._gated_result(features, len(starts))
+
+        with span("per_channel_spectrograms", stage="spectrogram_preprocessing"):
+            specs = [
+                self.window_input(channels[c, starts[w] : starts[w] + window], sr, H, W)
+                for c in range(channels.shape[0])
+                for w in candidates
+            ]
+        probs = np.zeros((channels.shape[0], len(starts)))
+        probs[:, candidates] = np.concatenate(
+            [
+                self.predict_windows(specs[i : i + WINDOW_BATCH_SIZE], sr)
+                for i in range(0, len(specs), WINDOW_BATCH_SIZE)
+            ]
+        ).reshape(channels.shape[0], len(candidates))
+
+        result = self._tf_result(float(probs.max()), features)
+        result.gate = {
+            "windows": len(starts),
+            "gated": len(starts) - len(candidates),
+            "scored": len(candidates),
+        }
+
+        # Uma detecção por janela em que algum canal passou de 50%
+        # (centro de cada janela; a última pode ser mais curta)
+        timestamps = [(s + min(s + window, n_samples)) / 2 / sr for s in starts]
+        window_max = probs.max(axis=0)
+        result.detections = [
+            Detection(
+                timestamps[w],
+                float(window_max[w]),
+                channels=np.flatnonzero(probs[:, w] >= 0.5).tolist(),
+            )
+            for w in np.flatnonzero(window_max >= 0.5)
+        ]
+        channel_max = probs.max(axis=1)
+        result.channels = [
+            {
+                "channel": c,
+                "gunshot_detected": bool(channel_max[c] >= 0.5),
+                "probability": float(channel_max[c]),
+                "risk_level": _risk_level(float(channel_max[c])),
+                "window_probabilities": probs[c],
             }
-        except Exception as e:
-            logger.error(f"Erro na predição TF/Keras: {e}")
-            return self._rule_based_prediction(features)
+            for c in range(channels.shape[0])
+        ]
+        return result
 
     def is_loaded(self) -> bool:
         """Verifica se o modelo está carregado"""
@@ -448,9 +1011,12 @@ class ModelLoader:
                 }
             )
         elif self.model_framework == "sklearn":
+            is_compact = self.model_info.get("format") == "compact_forest"
             info.update(
                 {
-                    "model_path": str(self.model_file),
+                    "model_path": str(
+                        self.compact_dir if is_compact else self.model_file
+                    ),
                     "framework": "sklearn",
                 }
             )
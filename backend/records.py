@@ -0,0 +1,206 @@
+"""
+Registros compactos de features e resultados da análise.
+
+Features e predições circulavam como dicts aninhados de floats Python
+(MFCCs e onsets em listas, detecções como lista de dicts), convertidos com
+float()/round() a cada camada. Aqui são dataclasses com ``__slots__``: os
+vetores ficam nos arrays NumPy de origem e os escalares sem arredondamento;
+a conversão para JSON (listas, round) acontece uma única vez, em
+``to_dict``, na borda da resposta (main.run_analysis).
+
+Os registros também atravessam o socket do servidor de inferência
+(pickle), então só guardam tipos que serializam sem custo extra.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Quantos tempos de onset vão na resposta (onset_count traz o total)
+MAX_ONSET_TIMES = 10
+
+
+def first_onset_times(values) -> np.ndarray:
+    """Tempos de onset (segundos) exibidos na resposta"""
+    return np.asarray(values[:MAX_ONSET_TIMES], dtype=np.float64)
+
+
+def _floats(values: np.ndarray, ndigits: Optional[int] = None) -> List[float]:
+    """Array -> lista de floats para JSON (arredondados se ``ndigits``)"""
+    values = np.asarray(values, dtype=np.float64).tolist()
+    if ndigits is None:
+        return values
+    return [round(v, ndigits) for v in values]
+
+
+@dataclass(slots=True)
+class ChannelFeatures:
+    """Características de um canal (modo por canal)"""
+
+    channel: int
+    duration: float
+    energy: float
+    peak_frequency: float
+    spectral_centroid: float
+    spectral_rolloff: float
+    zero_crossing_rate: float
+    onset_count: int
+    onset_times: np.ndarray
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "channel": self.channel,
+            "duration": self.duration,
+            "energy": self.energy,
+            "peak_frequency": self.peak_frequency,
+            "spectral_centroid": self.spectral_centroid,
+            "spectral_rolloff": self.spectral_rolloff,
+            "zero_crossing_rate": self.zero_crossing_rate,
+            "onset_count": self.onset_count,
+            "onset_times": _floats(self.onset_times),
+        }
+
+
+@dataclass(slots=True)
+class AudioFeatures:
+    """
+    Características de um arquivo (AudioProcessor.extract_features)
+
+    ``rms_frames``/``onset_envelope`` são os envelopes por quadro (hop 512)
+    usados pelo filtro da cascata (detection_gate.py); nas gravações em
+    blocos ``rms_frames`` traz o pico e ``rms_means`` a média do RMS a cada
+    ``rms_hop`` amostras; ``onsets`` traz o
+    tempo de todos os onsets (``onset_times`` só os primeiros, para a
+    resposta); ``chunked`` marca as gravações longas extraídas em blocos;
+    ``fingerprint`` traz os hashes de picos do log-mel (fingerprint.py).
+    """
+
+    duration: float
+    sample_rate: int
+    channels: int
+    energy: float
+    peak_frequency: float
+    spectral_centroid: float
+    spectral_rolloff: float
+    zero_crossing_rate: float
+    mfccs: np.ndarray
+    onset_count: int
+    onset_times: np.ndarray
+    audio_path: Optional[str] = None
+    rms_frames: Optional[np.ndarray] = None
+    rms_means: Optional[np.ndarray] = None
+    rms_hop: int = 512
+    onset_envelope: Optional[np.ndarray] = None
+    onsets: Optional[np.ndarray] = None
+    chunked: bool = False
+    chunks: int = 0
+    per_channel: Optional[List[ChannelFeatures]] = None
+    events: Optional[List[Dict[str, Any]]] = None
+    fingerprint: Optional[np.ndarray] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Resumo serializável (sem os envelopes por quadro)"""
+        result = {
+            "duration": self.duration,
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+            "energy": self.energy,
+            "peak_frequency": self.peak_frequency,
+            "spectral_centroid": self.spectral_centroid,
+            "spectral_rolloff": self.spectral_rolloff,
+            "zero_crossing_rate": self.zero_crossing_rate,
+            "mfccs": _floats(self.mfccs),
+            "onset_count": self.onset_count,
+            "onset_times": _floats(self.onset_times),
+        }
+        if self.chunked:
+            result["chunked"] = True
+            result["chunks"] = self.chunks
+        return result
+
+
+@dataclass(slots=True)
+class Detection:
+    """Um evento detectado (tempo em segundos a partir do início)"""
+
+    timestamp: float
+    confidence: float
+    type: str = "gunshot"
+    channels: Optional[List[int]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            "timestamp": round(float(self.timestamp), 2),
+            "confidence": round(float(self.confidence), 2),
+            "type": self.type,
+        }
+        if self.channels is not None:
+            result["channels"] = [int(c) for c in self.channels]
+        return result
+
+
+@dataclass(slots=True)
+class AnalysisResult:
+    """
+    Predição do ModelLoader (regras, sklearn ou Keras)
+
+    ``probability`` é a probabilidade de tiro sem arredondamento; na
+    resposta sai como ``confidence`` e ``probability`` com 2 casas.
+    ``channels`` traz a predição de cada canal (``window_probabilities``
+    em array), ``windows``/``gate`` os resumos das janelas avaliadas e
+    ``onsets`` a probabilidade da janela de cada onset (modo por onsets).
+    """
+
+    gunshot_detected: bool
+    probability: float
+    risk_level: str
+    method: Optional[str] = None
+    detections: List[Detection] = field(default_factory=list)
+    model_type: Optional[str] = None
+    channels: Optional[List[Dict[str, Any]]] = None
+    windows: Optional[Dict[str, Any]] = None
+    gate: Optional[Dict[str, Any]] = None
+    onsets: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    @property
+    def confidence(self) -> float:
+        return self.probability
+
+    def channels_to_dict(self) -> List[Dict[str, Any]]:
+        channels = []
+        for channel in self.channels or []:
+            channel = {
+                **channel,
+                "probability": round(float(channel["probability"]), 2),
+            }
+            if "window_probabilities" in channel:
+                channel["window_probabilities"] = _floats(
+                    channel["window_probabilities"], 4
+                )
+            channels.append(channel)
+        return channels
+
+    def to_dict(self) -> Dict[str, Any]:
+        probability = round(float(self.probability), 2)
+        result = {
+            "gunshot_detected": bool(self.gunshot_detected),
+            "confidence": probability,
+            "probability": probability,
+            "risk_level": self.risk_level,
+            "detections": [d.to_dict() for d in self.detections],
+        }
+        for name in ("method", "model_type", "windows", "gate", "error"):
+            value = getattr(self, name)
+            if value is not None:
+                result[name] = value
+        if self.channels is not None:
+            result["channels"] = self.channels_to_dict()
+        if self.onsets is not None:
+            result["onsets"] = {
+                **self.onsets,
+                "times": _floats(self.onsets["times"], 3),
+                "probabilities": _floats(self.onsets["probabilities"], 4),
+            }
+        return result
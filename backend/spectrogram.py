@@ -0,0 +1,148 @@
+"""
+Log-mel de entrada do modelo Keras calculado direto na resolução do modelo.
+
+Antes o log-mel saía com 128 bandas e o hop padrão (512) e era
+redimensionado para H x W com tf.image.resize e replicado em 3 canais com
+grayscale_to_rgb, alocando vários arrays intermediários por janela. Aqui um
+``SpectrogramPlan`` (um por taxa / tamanho de entrada / duração, em cache)
+define de antemão:
+
+- o hop que produz exatamente W quadros; se isso exigir hop > 512 (áudio
+  longo), o hop fica <= 512 e grupos de ``pool`` quadros são somados no
+  domínio de potência (nenhuma amostra fica fora da STFT);
+- a matriz (H x 1025) que já inclui o banco mel de 128 bandas e a
+  interpolação linear 128 -> H (mesmos centros de pixel do resize bilinear).
+
+O resultado (dB relativo ao máximo, top_db 80, normalizado 0..1) é escrito
+em um buffer float32 preexistente; os canais do modelo são uma view com
+broadcast, sem cópia (``model_batch``).
+"""
+
+import threading
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+N_FFT = 2048
+MAX_HOP = N_FFT // 4
+BASE_MELS = 128
+TOP_DB = 80.0
+AMIN = 1e-10
+
+
+def interpolation_matrix(n_out: int, n_in: int) -> np.ndarray:
+    """
+    Matriz (n_out x n_in) da interpolação linear 1-D com centros de pixel
+    (a mesma amostragem de tf.image.resize bilinear, sem antialias)
+    """
+    matrix = np.zeros((n_out, n_in), dtype=np.float64)
+    if n_in == 1:
+        matrix[:, 0] = 1.0
+        return matrix
+    x = np.clip((np.arange(n_out) + 0.5) * n_in / n_out - 0.5, 0, n_in - 1)
+    lo = np.floor(x).astype(int)
+    hi = np.minimum(lo + 1, n_in - 1)
+    frac = x - lo
+    rows = np.arange(n_out)
+    np.add.at(matrix, (rows, lo), 1.0 - frac)
+    np.add.at(matrix, (rows, hi), frac)
+    return matrix
+
+
+@lru_cache(maxsize=8)
+def mel_matrix(sr: int, height: int) -> np.ndarray:
+    """Banco mel (até 128 bandas) já interpolado para ``height`` linhas, float32"""
+    import librosa
+
+    n_mels = min(BASE_MELS, height)
+    basis = librosa.filters.mel(sr=sr, n_fft=N_FFT, n_mels=n_mels, fmax=sr / 2)
+    if n_mels != height:
+        basis = interpolation_matrix(height, n_mels) @ basis
+    return np.ascontiguousarray(basis, dtype=np.float32)
+
+
+class SpectrogramPlan:
+    """Parâmetros da STFT para um sinal de ``n_samples`` virar (H, W)"""
+
+    def __init__(self, sr: int, height: int, width: int, n_samples: int):
+        self.sr = sr
+        self.height = height
+        self.width = width
+        self.n_samples = n_samples
+        # Quadros necessários: width * pool, com hop <= MAX_HOP
+        self.pool = max(1, -(-n_samples // (width * MAX_HOP)))
+        self.frames = width * self.pool
+        self.hop = max(1, n_samples // max(1, self.frames - 1))
+        self.mel = mel_matrix(sr, height)
+        self.window = np.hanning(N_FFT + 1)[:-1].astype(np.float32)  # hann periódica
+
+    def power(self, y: np.ndarray) -> np.ndarray:
+        """Espectro de potência (1 + N_FFT/2, width) do sinal"""
+        import librosa
+
+        S = librosa.stft(
+            y,
+            n_fft=N_FFT,
+            hop_length=self.hop,
+            window=self.window,
+            center=True,
+            pad_mode="constant",
+        )
+        power = np.abs(S) ** 2
+        # 1 + n // hop >= frames, exceto em sinais com menos amostras que quadros
+        if power.shape[1] < self.frames:
+            power = np.pad(
+                power, ((0, 0), (0, self.frames - power.shape[1])), mode="edge"
+            )
+        power = power[:, : self.frames]
+        if self.pool > 1:
+            power = power.reshape(power.shape[0], self.width, self.pool).sum(axis=2)
+        return power
+
+    def log_mel(self, y: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Log-mel normalizado (0..1) em ``out`` (H, W) float32"""
+        if out is None:
+            out = np.empty((self.height, self.width), dtype=np.float32)
+        np.matmul(self.mel, self.power(y).astype(np.float32, copy=False), out=out)
+
+        # power_to_db(ref=np.max, top_db=80) e normalização min/max, in-place
+        ref = max(float(out.max()), AMIN)
+        np.maximum(out, AMIN, out=out)
+        np.log10(out, out=out)
+        out *= 10.0
+        out -= 10.0 * np.log10(ref)
+        np.maximum(out, -TOP_DB, out=out)
+        low, high = float(out.min()), float(out.max())
+        out -= low
+        out /= high - low + 1e-8
+        return out
+
+
+@lru_cache(maxsize=32)
+def spectrogram_plan(
+    sr: int, height: int, width: int, n_samples: int
+) -> SpectrogramPlan:
+    return SpectrogramPlan(sr, height, width, n_samples)
+
+
+_buffers = threading.local()
+
+
+def model_batch(spectrograms, channels: int) -> np.ndarray:
+    """
+    Lote (N, H, W, C) para model.predict a partir de log-mels (H, W)
+
+    Os log-mels são copiados uma vez para um buffer float32 reaproveitado
+    pela thread; os C canais são uma view com broadcast do mesmo buffer.
+    """
+    n = len(spectrograms)
+    height, width = spectrograms[0].shape
+    buffer = getattr(_buffers, "batch", None)
+    if buffer is None or buffer.shape[1:] != (height, width) or buffer.shape[0] < n:
+        buffer = np.empty((max(n, 1), height, width), dtype=np.float32)
+        _buffers.batch = buffer
+    for i, spec in enumerate(spectrograms):
+        if spec is not buffer[i]:
+            buffer[i] = spec
+    return np.broadcast_to(buffer[:n, :, :, None], (n, height, width, channels))
@@ -0,0 +1,167 @@
+"""
+Spans leves para medir as etapas de uma análise.
+
+``span(name, stage=...)`` mede um bloco: a duração vai para o histograma de
+etapas (metrics.py) e, se houver um trace ativo na requisição corrente
+(contextvars), também para a lista de spans devolvida em ``timings``.
+
+Também oferece captura de perfil (cProfile ou pyinstrument) para uma
+amostra das requisições, gravada em ``PROFILES_DIR``.
+"""
+
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILES_DIR = Path(os.getenv("PROFILES_DIR", "profiles"))
+PROFILER = os.getenv("PROFILER", "cprofile")  # 'cprofile' | 'pyinstrument'
+
+
+class Trace:
+    """Spans de uma requisição, com início relativo ao começo do trace"""
+
+    __slots__ = ("start", "spans", "depth", "profile_path")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.depth = 0
+        self.profile_path: Optional[str] = None
+
+    def add(
+        self, name: str, stage: Optional[str], start: float, duration: float, depth: int
+    ):
+        self.spans.append(
+            {
+                "name": name,
+                "stage": stage,
+                "start_ms": round((start - self.start) * 1000.0, 3),
+                "duration_ms": round(duration * 1000.0, 3),
+                "depth": depth,
+            }
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        stages: Dict[str, float] = {}
+        for item in self.spans:
+            if item["stage"]:
+                stages[item["stage"]] = round(
+                    stages.get(item["stage"], 0.0) + item["duration_ms"], 3
+                )
+        result = {
+            "total_ms": round((time.perf_counter() - self.start) * 1000.0, 3),
+            "stages": stages,
+            "spans": sorted(self.spans, key=lambda item: item["start_ms"]),
+        }
+        if self.profile_path:
+            result["profile"] = self.profile_path
+        return result
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def begin_trace():
+    """Ativa um trace para o contexto corrente; retorna (trace, token)"""
+    trace = Trace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, stage: Optional[str] = None):
+    """
+    Mede um bloco de código
+
+    Args:
+        name: Nome descritivo (ex.: 'audio_decoder.load', 'model.predict')
+        stage: Etapa agregada no histograma de métricas (opcional)
+    """
+    trace = _current_trace.get()
+    depth = 0
+    if trace is not None:
+        depth = trace.depth
+        trace.depth += 1
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        if stage:
+            STAGE_SECONDS.labels(stage=stage).observe(duration)
+        if trace is not None:
+            trace.depth -= 1
+            trace.add(name, stage, start, duration, depth)
+
+
+def _should_profile(force: bool) -> bool:
+    return force or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+
+
+@contextmanager
+def profile_request(name: str, force: bool = False):
+    """
+    Captura um perfil do bloco para requisições amostradas
+
+    Usa pyinstrument (HTML) se PROFILER=pyinstrument e o pacote estiver
+    instalado; caso contrário cProfile (.prof, abrir com snakeviz/pstats).
+    """
+    if not _should_profile(force):
+        yield None
+        return
+
+    PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+    stem = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{Path(name).stem}"
+
+    profiler = None
+    if PROFILER == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+
+            profiler = Profiler()
+        except ImportError:
+            logger.warning("pyinstrument não instalado; usando cProfile")
+
+    if profiler is not None:
+        output = PROFILES_DIR / f"{stem}.html"
+        profiler.start()
+        try:
+            yield str(output)
+        finally:
+            profiler.stop()
+            output.write_text(profiler.output_html(), encoding="utf-8")
+    else:
+        import cProfile
+
+        output = PROFILES_DIR / f"{stem}.prof"
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield str(output)
+        finally:
+            profiler.disable()
+            profiler.dump_stats(str(output))
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.profile_path = str(output)
+    logger.info(f"Perfil salvo em: {output}")
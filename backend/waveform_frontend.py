@@ -0,0 +1,158 @@
+"""
+Frontend do modelo Keras dentro do grafo TensorFlow (opcional).
+
+Com ``MODEL_WAVEFORM_FRONTEND=true`` o ModelLoader envolve a EfficientNet em
+um ``WaveformModel``: a entrada passa a ser um lote de janelas de forma de
+onda (float32, ``WINDOW_SECONDS`` a 22050 Hz) e STFT, banco mel, dB e
+normalização rodam com tf.signal no mesmo grafo do modelo. Um lote inteiro
+de janelas vai de amostras a probabilidades em uma única chamada, sem passar
+por NumPy/librosa a cada janela.
+
+Os parâmetros (hop, agrupamento de quadros, matriz mel já interpolada para
+H, janela hann periódica) vêm do mesmo ``spectrogram.SpectrogramPlan`` do
+caminho em NumPy, então as duas entradas coincidem (a menos de float32).
+
+O mesmo artefato pode ser exportado para execução na borda:
+
+  python backend/waveform_frontend.py --output models/waveform_frontend --tflite
+
+Requer TensorFlow; só é importado quando o frontend está habilitado.
+"""
+
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+from spectrogram import AMIN, N_FFT, TOP_DB, spectrogram_plan
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_RATE = 22050
+
+
+class WaveformModel(tf.Module):
+    """
+    Modelo Keras (N, H, W, C) com o log-mel calculado no grafo
+
+    ``serve`` recebe (N, window_samples) float32 e devolve a saída do modelo
+    Keras para cada janela.
+    """
+
+    def __init__(
+        self,
+        model,
+        window_samples: int,
+        sample_rate: int = DEFAULT_SAMPLE_RATE,
+    ):
+        super().__init__(name="waveform_model")
+        self.model = model
+        _, height, width, channels = model.input_shape
+        plan = spectrogram_plan(sample_rate, height, width, window_samples)
+
+        self.sample_rate = sample_rate
+        self.window_samples = window_samples
+        self.height, self.width, self.channels = height, width, channels
+        self.hop, self.pool, self.frames = plan.hop, plan.pool, plan.frames
+        # (1 + N_FFT/2, H): o banco mel multiplica pela direita no layout do tf.signal
+        self.mel = tf.constant(plan.mel.T)
+
+        self.serve = tf.function(
+            self._serve,
+            input_signature=[
+                tf.TensorSpec([None, window_samples], tf.float32, name="waveform")
+            ],
+        )
+
+    def log_mel(self, waveforms: tf.Tensor) -> tf.Tensor:
+        """Log-mel normalizado (N, H, W), equivalente a SpectrogramPlan.log_mel"""
+        # center=True do librosa: N_FFT/2 zeros de cada lado
+        padded = tf.pad(waveforms, [[0, 0], [N_FFT // 2, N_FFT // 2]])
+        stft = tf.signal.stft(
+            padded,
+            frame_length=N_FFT,
+            frame_step=self.hop,
+            fft_length=N_FFT,
+            window_fn=tf.signal.hann_window,
+        )
+        power = tf.math.square(tf.math.abs(stft[:, : self.frames]))
+        if self.pool > 1:
+            power = tf.reduce_sum(
+                tf.reshape(power, [-1, self.width, self.pool, N_FFT // 2 + 1]), axis=2
+            )
+        mel = tf.matmul(power, self.mel)  # (N, W, H)
+
+        # power_to_db(ref=np.max, top_db=80) e normalização min/max por janela
+        log10 = tf.math.log(tf.constant(10.0))
+        ref = tf.reduce_max(mel, axis=[1, 2], keepdims=True)
+        db = 10.0 * (
+            tf.math.log(tf.maximum(mel, AMIN)) - tf.math.log(tf.maximum(ref, AMIN))
+        )
+        db = tf.maximum(db / log10, -TOP_DB)
+        low = tf.reduce_min(db, axis=[1, 2], keepdims=True)
+        high = tf.reduce_max(db, axis=[1, 2], keepdims=True)
+        db = (db - low) / (high - low + 1e-8)
+        return tf.transpose(db, [0, 2, 1])
+
+    def _serve(self, waveforms: tf.Tensor) -> tf.Tensor:
+        spec = self.log_mel(waveforms)[..., tf.newaxis]
+        images = tf.broadcast_to(
+            spec,
+            tf.concat([tf.shape(spec)[:3], [self.channels]], axis=0),
+        )
+        return self.model(images, training=False)
+
+    def predict(self, waveforms: np.ndarray) -> np.ndarray:
+        """Saída do modelo para um lote (N, window_samples)"""
+        return self.serve(tf.convert_to_tensor(waveforms, dtype=tf.float32)).numpy()
+
+    def export(self, output_dir, tflite: bool = False) -> Path:
+        """Grava o SavedModel (assinatura ``serving_default``) e, opcionalmente, .tflite"""
+        output_dir = Path(output_dir)
+        tf.saved_model.save(
+            self, str(output_dir), signatures={"serving_default": self.serve}
+        )
+        if tflite:
+            converter = tf.lite.TFLiteConverter.from_saved_model(str(output_dir))
+            # RFFT em lote ainda não é op nativa em todas as versões do TFLite
+            converter.target_spec.supported_ops = [
+                tf.lite.OpsSet.TFLITE_BUILTINS,
+                tf.lite.OpsSet.SELECT_TF_OPS,
+            ]
+            (output_dir / "model.tflite").write_bytes(converter.convert())
+        return output_dir
+
+
+def main():
+    from model_loader import WINDOW_SECONDS, ModelLoader
+
+    parser = argparse.ArgumentParser(
+        description="Exporta o modelo Keras com o frontend de forma de onda"
+    )
+    parser.add_argument("--output", default="models/waveform_frontend")
+    parser.add_argument("--sample-rate", type=int, default=DEFAULT_SAMPLE_RATE)
+    parser.add_argument("--window-seconds", type=float, default=WINDOW_SECONDS)
+    parser.add_argument(
+        "--tflite", action="store_true", help="Também gera model.tflite"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    loader = ModelLoader()
+    if loader.model_framework != "tf_keras":
+        raise SystemExit(f"Modelo Keras não carregado: {loader.last_error}")
+
+    wrapper = WaveformModel(
+        loader.model,
+        window_samples=int(args.window_seconds * args.sample_rate),
+        sample_rate=args.sample_rate,
+    )
+    output = wrapper.export(args.output, tflite=args.tflite)
+    logger.info(f"✓ Modelo com frontend exportado em: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+// Ponto de entrada do frontend em produção (build standalone do Next.js)
+//
+// Os route handlers não enxergam o socket, e o Next só preenche
+// X-Forwarded-For quando o cliente não mandou um (que então pode ser forjado).
+// Aqui o endereço da conexão vai em X-Real-IP, sobrescrevendo qualquer valor
+// vindo do cliente, para a rota repassá-lo ao backend como último salto.
+const http = require("http")
+
+const createServer = http.createServer
+
+http.createServer = function (...args) {
+  const listenerIndex = args.findIndex((arg) => typeof arg === "function")
+  if (listenerIndex !== -1) {
+    const listener = args[listenerIndex]
+    args[listenerIndex] = function (req, res) {
+      req.headers["x-real-ip"] = req.socket.remoteAddress || ""
+      return listener.call(this, req, res)
+    }
+  }
+  return createServer.apply(this, args)
+}
+
+require("./server.js")
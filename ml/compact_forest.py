@@ -0,0 +1,245 @@
+"""
+Representação compacta (achatada) do RandomForest do detector de tiros.
+
+Todas as árvores são concatenadas em vetores NumPy contíguos (feature,
+threshold, filhos, probabilidades das folhas) salvos como arquivos .npy
+independentes. Assim o artefato pode ser aberto com ``mmap_mode="r"``:
+carrega em milissegundos e as páginas são compartilhadas entre processos
+(workers do uvicorn) pelo cache do sistema operacional.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+FORMAT_VERSION = 1
+ARRAY_NAMES = (
+    "feature",
+    "threshold",
+    "children_left",
+    "children_right",
+    "value",
+    "roots",
+    "classes",
+)
+
+
+def export_forest(model, out_dir, scaler=None, metadata=None):
+    """
+    Exporta um RandomForestClassifier treinado para o formato compacto
+
+    Args:
+        model: RandomForestClassifier (sklearn) já treinado
+        out_dir: Diretório de destino dos arquivos .npy
+        scaler: StandardScaler opcional; média/escala são embutidas no artefato
+        metadata: Dicionário extra salvo junto em meta.json
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n_nodes = tree.node_count
+        left = tree.children_left.astype(np.int64)
+        right = tree.children_right.astype(np.int64)
+        is_leaf = left == -1
+        own_index = np.arange(n_nodes, dtype=np.int64)
+
+        # Folhas apontam para si mesmas: a travessia vetorizada pode rodar
+        # um número fixo de passos sem precisar de máscara por amostra
+        left = np.where(is_leaf, own_index, left) + offset
+        right = np.where(is_leaf, own_index, right) + offset
+
+        # Probabilidades por classe em cada nó (normaliza contagens/pesos)
+        value = tree.value[:, 0, :].astype(np.float64)
+        value = value / np.maximum(value.sum(axis=1, keepdims=True), 1e-12)
+
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+        lefts.append(left)
+        rights.append(right)
+        values.append(value)
+        roots.append(offset)
+
+        offset += n_nodes
+        max_depth = max(max_depth, int(tree.max_depth))
+
+    arrays = {
+        "feature": np.concatenate(features).astype(np.int32),
+        # thresholds em float64: o sklearn compara X (float32) com limiares float64
+        "threshold": np.concatenate(thresholds).astype(np.float64),
+        "children_left": np.concatenate(lefts).astype(np.int32),
+        "children_right": np.concatenate(rights).astype(np.int32),
+        "value": np.concatenate(values).astype(np.float32),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "classes": np.asarray(model.classes_),
+    }
+
+    if scaler is not None:
+        arrays["scaler_mean"] = np.asarray(scaler.mean_, dtype=np.float64)
+        arrays["scaler_scale"] = np.asarray(scaler.scale_, dtype=np.float64)
+
+    for name, array in arrays.items():
+        np.save(out_dir / f"{name}.npy", np.ascontiguousarray(array))
+
+    meta = {
+        "format": "compact_forest",
+        "format_version": FORMAT_VERSION,
+        "n_estimators": len(model.estimators_),
+        "n_features": int(model.n_features_in_),
+        "n_nodes": int(offset),
+        "max_depth": max_depth,
+        "has_scaler": scaler is not None,
+        **(metadata or {}),
+    }
+    with open(out_dir / "meta.json", "w") as f:
+        json.dump(meta, f, indent=2)
+
+    return meta
+
+
+class CompactForest:
+    """
+    Preditor vetorizado sobre o artefato achatado
+
+    Avalia todas as árvores para todo o lote de uma vez: o estado da
+    travessia é uma matriz (n_amostras, n_árvores) de índices de nós que
+    avança ``max_depth`` passos com indexação NumPy.
+    """
+
+    def __init__(self, arrays, meta):
+        self.meta = meta
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.children_left = arrays["children_left"]
+        self.children_right = arrays["children_right"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.classes_ = np.asarray(arrays["classes"])
+        self.scaler_mean = arrays.get("scaler_mean")
+        self.scaler_scale = arrays.get("scaler_scale")
+        self.max_depth = int(meta["max_depth"])
+        self.n_estimators = int(meta["n_estimators"])
+        self.n_features_in_ = int(meta["n_features"])
+
+    @classmethod
+    def load(cls, model_dir, mmap=True):
+        """Abre o artefato (memory-mapped por padrão)"""
+        model_dir = Path(model_dir)
+        with open(model_dir / "meta.json", "r") as f:
+            meta = json.load(f)
+
+        if meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Versão de artefato não suportada: {meta.get('format_version')}"
+            )
+
+        mmap_mode = "r" if mmap else None
+        arrays = {}
+        names = ARRAY_NAMES
+        if meta.get("has_scaler"):
+            names = names + ("scaler_mean", "scaler_scale")
+        for name in names:
+            # classes é pequeno e pode ter dtype objeto; nunca mapeia
+            mode = None if name == "classes" else mmap_mode
+            arrays[name] = np.load(model_dir / f"{name}.npy", mmap_mode=mode)
+
+        return cls(arrays, meta)
+
+    @staticmethod
+    def exists(model_dir):
+        return (Path(model_dir) / "meta.json").exists()
+
+    @property
+    def has_scaler(self):
+        return self.scaler_mean is not None
+
+    def transform(self, X):
+        """
+        Aplica o StandardScaler embutido (se houver)
+
+        Em float32, com as mesmas operações in-place do StandardScaler do
+        sklearn (parâmetros float64, arredondamento a cada passo).
+        """
+        X = np.array(X, dtype=np.float32)
+        if self.has_scaler:
+            X -= self.scaler_mean
+            X /= self.scaler_scale
+        return X
+
+    def apply(self, X):
+        """Retorna o índice da folha alcançada em cada árvore (n_amostras, n_árvores)"""
+        # Mesma precisão usada pelo sklearn na comparação com os limiares
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.roots.shape[0])).copy()
+
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(
+                go_left, self.children_left[nodes], self.children_right[nodes]
+            )
+
+        return nodes
+
+    def predict_proba(self, X, scaled=True):
+        """
+        Probabilidade média das árvores (equivalente ao sklearn)
+
+        Args:
+            X: Matriz (n_amostras, n_features)
+            scaled: Se False, aplica o scaler embutido antes da travessia
+        """
+        if not scaled:
+            X = self.transform(X)
+        leaves = self.apply(X)
+        return self.value[leaves].mean(axis=1)
+
+    def predict(self, X, scaled=True):
+        proba = self.predict_proba(X, scaled=scaled)
+        return self.classes_[np.argmax(proba, axis=1)]
+
+
+def main():
+    """Converte um modelo pickle/joblib existente para o formato compacto"""
+    import pickle
+
+    if len(sys.argv) < 2:
+        print(
+            "Uso: python compact_forest.py <modelo.pkl> [scaler.joblib] [diretório_saída]"
+        )
+        sys.exit(1)
+
+    model_path = Path(sys.argv[1])
+    scaler_path = Path(sys.argv[2]) if len(sys.argv) > 2 else None
+    out_dir = (
+        Path(sys.argv[3])
+        if len(sys.argv) > 3
+        else model_path.with_name(model_path.stem + "_compact")
+    )
+
+    with open(model_path, "rb") as f:
+        model = pickle.load(f)
+
+    scaler = None
+    if scaler_path is not None and scaler_path.exists():
+        import joblib
+
+        scaler = joblib.load(scaler_path)
+
+    meta = export_forest(model, out_dir, scaler=scaler)
+    print(f"✓ Modelo compacto salvo em: {out_dir}")
+    print(f"  Árvores: {meta['n_estimators']} | Nós: {meta['n_nodes']}")
+
+
+if __name__ == "__main__":
+    main()
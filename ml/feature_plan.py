@@ -0,0 +1,107 @@
+"""
+Plano de extração de features pré-calculado
+
+``librosa.feature.mfcc``/``melspectrogram`` (e ``onset_strength``, que chama
+melspectrogram por dentro) refazem a cada chamada a janela da STFT, o banco
+mel e a base da DCT para o mesmo (sr, n_fft, n_mels). Em clipes curtos esse
+preparo pesa tanto quanto o cálculo. Um ``FeaturePlan`` é montado uma vez
+por configuração (``feature_plan`` guarda em cache) com essas matrizes em
+float32 contíguo e as aplica com um único matmul:
+
+    plan = feature_plan(sr)
+    magnitude = plan.magnitude(y)          # uma STFT para todas as features
+    mel_db = plan.mel_db(magnitude)
+    mfcc = plan.mfcc(mel_db)
+    onset_envelope = plan.onset_strength(mel_db)
+
+Os parâmetros padrão são os do librosa (n_fft 2048, hop 512, 128 bandas,
+hann), então os resultados coincidem com as funções do librosa a menos de
+arredondamento em float32. Usado pelo backend (audio_processor), pelo treino
+(train_gunshot_detector) e pelo analisador (scripts/audio_analyzer).
+"""
+
+from functools import lru_cache
+
+import librosa
+import numpy as np
+import scipy.fft
+import scipy.signal
+
+
+class FeaturePlan:
+    """Janela, banco mel e DCT de uma configuração (sr, n_fft, hop, n_mels, n_mfcc)"""
+
+    def __init__(self, sr=22050, n_fft=2048, hop_length=512, n_mels=128, n_mfcc=13):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mels = n_mels
+        self.n_mfcc = n_mfcc
+
+        # Hann periódica, como librosa.filters.get_window("hann", n_fft)
+        self.window = scipy.signal.get_window("hann", n_fft, fftbins=True).astype(
+            np.float32
+        )
+        self.mel_basis = np.ascontiguousarray(
+            librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels), dtype=np.float32
+        )
+        # Linhas da DCT-II ortonormal: dct @ x == scipy.fft.dct(x, norm="ortho")[:n_mfcc]
+        self.dct = np.ascontiguousarray(
+            scipy.fft.dct(np.eye(n_mels), type=2, norm="ortho", axis=0)[:n_mfcc],
+            dtype=np.float32,
+        )
+        self.freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft).astype(np.float32)
+
+    def magnitude(self, y):
+        """|STFT| (..., 1 + n_fft/2, quadros); aceita (amostras) ou (canais, amostras)"""
+        return np.abs(
+            librosa.stft(
+                np.asarray(y, dtype=np.float32),
+                n_fft=self.n_fft,
+                hop_length=self.hop_length,
+                window=self.window,
+            )
+        )
+
+    def mel_db(self, magnitude):
+        """Log-mel em dB (ref 1.0, top_db 80), como em mfcc e onset_strength"""
+        return librosa.power_to_db(np.matmul(self.mel_basis, magnitude**2))
+
+    def mfcc(self, mel_db):
+        """MFCCs (..., n_mfcc, quadros) a partir do log-mel"""
+        return np.matmul(self.dct, mel_db)
+
+    def spectral_centroid(self, magnitude):
+        """
+        Centroide (..., 1, quadros), como librosa.feature.spectral_centroid
+
+        Um produto (freqs @ S) em float32, sem o S normalizado e o produto
+        freq * S em float64 que o librosa aloca (3x o espectrograma).
+        """
+        norm = magnitude.sum(axis=-2, keepdims=True)
+        # librosa.util.normalize deixa intactos os quadros com norma ~0
+        norm[norm < np.finfo(magnitude.dtype).tiny] = 1.0
+        return np.matmul(self.freqs, magnitude)[..., None, :] / norm
+
+    def spectral_rolloff(self, magnitude, roll_percent=0.85):
+        """
+        Rolloff (..., 1, quadros), como librosa.feature.spectral_rolloff
+
+        A primeira frequência em que a energia acumulada chega a
+        ``roll_percent`` do total (o librosa usa máscaras em float64).
+        """
+        total = np.cumsum(magnitude, axis=-2)
+        reached = total >= roll_percent * total[..., -1:, :]
+        return self.freqs[np.argmax(reached, axis=-2)][..., None, :]
+
+    def onset_strength(self, mel_db):
+        """Envelope de onsets (..., quadros) a partir do log-mel"""
+        return librosa.onset.onset_strength(
+            S=mel_db, sr=self.sr, hop_length=self.hop_length
+        )
+
+
+@lru_cache(maxsize=16)
+def feature_plan(sr=22050, n_fft=2048, hop_length=512, n_mels=128, n_mfcc=13):
+    """FeaturePlan compartilhado por configuração"""
+    return FeaturePlan(sr, n_fft, hop_length, n_mels, n_mfcc)
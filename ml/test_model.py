@@ -1,90 +1,262 @@
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import joblib
 import numpy as np
 from train_gunshot_detector import GunshotDetectorTrainer
 
-def test_single_audio(audio_path, model_path='models/gunshot_detector.pkl'):
+# Trainer por processo (criado uma vez em cada worker do pool)
+_trainer = None
+
+
+def load_scaler(model_path="models/gunshot_detector.pkl"):
+    """
+    Carrega o scaler ajustado em train() (scaler.joblib ao lado do modelo)
+    """
+    scaler_path = Path(model_path).parent / "scaler.joblib"
+    if not scaler_path.exists():
+        print(f"⚠️  Scaler não encontrado em {scaler_path}; usando features brutas")
+        return None
+    return joblib.load(scaler_path)
+
+
+def test_single_audio(audio_path, model_path="models/gunshot_detector.pkl"):
     """
     Testa o modelo com um único arquivo de áudio
     """
     print(f"\nTestando: {audio_path}")
-    print("="*50)
-    
+    print("=" * 50)
+
     # Carrega o modelo
     trainer = GunshotDetectorTrainer()
     metadata = trainer.load_model(model_path)
-    
+    scaler = load_scaler(model_path)
+
     # Extrai features
     print("Extraindo features...")
     features = trainer.extract_features(audio_path)
-    
+
     if features is None:
         print("❌ Erro ao processar o áudio")
         return
-    
+
     # Faz a predição
     features = features.reshape(1, -1)
+    if scaler is not None:
+        features = scaler.transform(features)
     prediction = trainer.model.predict(features)[0]
     probability = trainer.model.predict_proba(features)[0]
-    
+
     # Mostra resultados
     print("\nRESULTADOS:")
     print(f"  Predição: {'🔫 TIRO DETECTADO' if prediction == 1 else '✓ Não é tiro'}")
     print(f"  Confiança (não-tiro): {probability[0]:.2%}")
     print(f"  Confiança (tiro): {probability[1]:.2%}")
-    print("="*50)
-    
+    print("=" * 50)
+
     return prediction, probability
 
 
-def batch_test(test_dir, model_path='models/gunshot_detector.pkl'):
+def label_from_path(audio_file, test_dir):
+    """
+    Rótulo pelo diretório (mesma convenção do treino): gunshots=1, non_gunshots=0
+    """
+    parts = Path(audio_file).relative_to(test_dir).parts[:-1]
+    if "non_gunshots" in parts:
+        return 0
+    if "gunshots" in parts:
+        return 1
+    return None
+
+
+def _init_worker(trainer_params):
+    global _trainer
+    _trainer = GunshotDetectorTrainer(**trainer_params)
+
+
+def _featurize(audio_file):
+    """Extrai as features de um arquivo (executado em um worker)"""
+    start = time.perf_counter()
+    features = _trainer.extract_features(audio_file)
+    return features, time.perf_counter() - start
+
+
+def featurize_files(audio_files, trainer_params, workers=1):
+    """
+    Extrai features de vários arquivos, em paralelo quando workers > 1
+
+    Returns:
+        Lista de (features ou None, segundos) na mesma ordem de ``audio_files``
+    """
+    if workers <= 1:
+        _init_worker(trainer_params)
+        return [_featurize(f) for f in audio_files]
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(trainer_params,)
+    ) as pool:
+        return list(pool.map(_featurize, audio_files, chunksize=4))
+
+
+def evaluation_metrics(y_true, y_pred, y_score):
+    """
+    Precisão, recall, F1, ROC-AUC e matriz de confusão para os arquivos rotulados
+    """
+    from sklearn.metrics import (
+        confusion_matrix,
+        f1_score,
+        precision_score,
+        recall_score,
+        roc_auc_score,
+    )
+
+    metrics = {
+        "samples": int(len(y_true)),
+        "accuracy": float(np.mean(y_true == y_pred)),
+        "precision": float(precision_score(y_true, y_pred, zero_division=0)),
+        "recall": float(recall_score(y_true, y_pred, zero_division=0)),
+        "f1": float(f1_score(y_true, y_pred, zero_division=0)),
+        "roc_auc": None,
+        "confusion_matrix": confusion_matrix(y_true, y_pred, labels=[0, 1]).tolist(),
+    }
+    # ROC-AUC só é definido com as duas classes presentes
+    if len(np.unique(y_true)) == 2:
+        metrics["roc_auc"] = float(roc_auc_score(y_true, y_score))
+    return metrics
+
+
+def batch_test(test_dir, model_path="models/gunshot_detector.pkl", workers=None):
     """
     Testa o modelo com múltiplos arquivos
+
+    As features são extraídas em paralelo, empilhadas em uma matriz,
+    normalizadas com o scaler salvo no treino e classificadas com uma
+    única chamada a predict_proba. Se o diretório seguir a estrutura
+    gunshots/ e non_gunshots/, também calcula as métricas de avaliação.
     """
-    from pathlib import Path
-    
     print(f"\nTestando todos os áudios em: {test_dir}")
-    print("="*50 + "\n")
-    
+    print("=" * 50 + "\n")
+
     trainer = GunshotDetectorTrainer()
-    trainer.load_model(model_path)
-    
+    metadata = trainer.load_model(model_path)
+    scaler = load_scaler(model_path)
+
     test_path = Path(test_dir)
+    audio_files = sorted(str(f) for f in test_path.glob("**/*.wav"))
+    if not audio_files:
+        print("Nenhum arquivo .wav encontrado.")
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    trainer_params = {
+        "sample_rate": metadata["sample_rate"],
+        "n_mfcc": metadata["n_mfcc"],
+        "n_fft": metadata["n_fft"],
+        "hop_length": metadata["hop_length"],
+    }
+
+    # Extração de features (paralela)
+    start = time.perf_counter()
+    extracted = featurize_files(audio_files, trainer_params, workers)
+    featurize_wall = time.perf_counter() - start
+
+    valid = [i for i, (features, _) in enumerate(extracted) if features is not None]
+    if not valid:
+        print("❌ Nenhum áudio pôde ser processado")
+        return []
+
+    # Uma única inferência para todos os arquivos
+    X = np.vstack([extracted[i][0] for i in valid])
+    start = time.perf_counter()
+    if scaler is not None:
+        X = scaler.transform(X)
+    probabilities = trainer.model.predict_proba(X)
+    inference_time = time.perf_counter() - start
+
+    classes = list(trainer.model.classes_)
+    predictions = np.asarray(trainer.model.classes_)[np.argmax(probabilities, axis=1)]
+    gunshot_scores = probabilities[:, classes.index(1)]
+
     results = []
-    
-    for audio_file in test_path.glob("**/*.wav"):
-        features = trainer.extract_features(str(audio_file))
-        if features is not None:
-            features = features.reshape(1, -1)
-            prediction = trainer.model.predict(features)[0]
-            probability = trainer.model.predict_proba(features)[0]
-            
-            results.append({
-                'file': audio_file.name,
-                'prediction': prediction,
-                'confidence': probability[1]
-            })
-            
-            status = "🔫 TIRO" if prediction == 1 else "✓ Não-tiro"
-            print(f"{status} - {audio_file.name} (confiança: {probability[1]:.2%})")
-    
-    print("\n" + "="*50)
+    for row, i in enumerate(valid):
+        audio_file = audio_files[i]
+        results.append(
+            {
+                "file": Path(audio_file).name,
+                "path": audio_file,
+                "label": label_from_path(audio_file, test_path),
+                "prediction": int(predictions[row]),
+                "confidence": float(gunshot_scores[row]),
+                "featurize_seconds": round(extracted[i][1], 4),
+            }
+        )
+        status = "🔫 TIRO" if predictions[row] == 1 else "✓ Não-tiro"
+        print(
+            f"{status} - {Path(audio_file).name} (confiança: {gunshot_scores[row]:.2%})"
+        )
+
+    failed = len(audio_files) - len(valid)
+    featurize_times = np.array([r["featurize_seconds"] for r in results])
+
+    print("\n" + "=" * 50)
     print(f"Total testado: {len(results)}")
+    if failed:
+        print(f"Falhas na extração: {failed}")
     print(f"Tiros detectados: {sum(r['prediction'] == 1 for r in results)}")
     print(f"Não-tiros: {sum(r['prediction'] == 0 for r in results)}")
-    print("="*50)
+
+    print("\nLATÊNCIA:")
+    print(f"  Workers: {workers}")
+    print(
+        f"  Extração por arquivo: média {featurize_times.mean() * 1000:.1f}ms, "
+        f"p95 {np.percentile(featurize_times, 95) * 1000:.1f}ms"
+    )
+    print(f"  Extração total (parede): {featurize_wall:.2f}s")
+    print(
+        f"  Inferência: {inference_time * 1000:.1f}ms no lote "
+        f"({inference_time / len(results) * 1000:.3f}ms por arquivo)"
+    )
+
+    labeled = [r for r in results if r["label"] is not None]
+    if labeled:
+        y_true = np.array([r["label"] for r in labeled])
+        y_pred = np.array([r["prediction"] for r in labeled])
+        y_score = np.array([r["confidence"] for r in labeled])
+        metrics = evaluation_metrics(y_true, y_pred, y_score)
+
+        print("\nMÉTRICAS (arquivos rotulados por gunshots/ e non_gunshots/):")
+        print(f"  Amostras: {metrics['samples']}")
+        print(f"  Acurácia: {metrics['accuracy']:.2%}")
+        print(f"  Precisão: {metrics['precision']:.2%}")
+        print(f"  Recall: {metrics['recall']:.2%}")
+        print(f"  F1: {metrics['f1']:.2%}")
+        if metrics["roc_auc"] is not None:
+            print(f"  ROC-AUC: {metrics['roc_auc']:.4f}")
+        print(
+            f"  Matriz de confusão [[VN, FP], [FN, VP]]: {metrics['confusion_matrix']}"
+        )
+    print("=" * 50)
+
+    return results
 
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Uso:")
         print("  python ml/test_model.py <arquivo.wav>")
-        print("  python ml/test_model.py --batch <diretorio>")
+        print("  python ml/test_model.py --batch <diretorio> [--workers N]")
         sys.exit(1)
-    
+
     if sys.argv[1] == "--batch":
         if len(sys.argv) < 3:
             print("Especifique o diretório para teste em batch")
             sys.exit(1)
-        batch_test(sys.argv[2])
+        workers = None
+        if "--workers" in sys.argv:
+            workers = int(sys.argv[sys.argv.index("--workers") + 1])
+        batch_test(sys.argv[2], workers=workers)
     else:
         test_single_audio(sys.argv[1])
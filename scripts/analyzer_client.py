@@ -0,0 +1,80 @@
+"""
+Cliente leve do daemon do analisador (audio_analyzer.py --daemon)
+
+Envia o caminho do arquivo pelo socket Unix e imprime o mesmo JSON da CLI
+``python audio_analyzer.py <arquivo>``, sem pagar a inicialização do
+Python científico (librosa/numba) a cada chamada. Se o daemon não estiver
+rodando, analisa no próprio processo.
+
+Uso:
+  python audio_analyzer.py --daemon [socket] &
+  python analyzer_client.py <arquivo> [--socket PATH]
+"""
+
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+
+# Diretório de runtime do usuário (XDG_RUNTIME_DIR, só ele escreve) quando existe
+DEFAULT_SOCKET = os.getenv(
+    "ANALYZER_SOCKET",
+    os.path.join(os.getenv("XDG_RUNTIME_DIR") or "/tmp", "gunshot-analyzer.sock"),
+)
+
+
+def request_analysis(file_path, socket_path=DEFAULT_SOCKET, timeout=300.0):
+    """Pede a análise ao daemon; levanta OSError se ele não estiver disponível"""
+    # Caminho absoluto: o daemon pode ter sido iniciado em outro diretório
+    payload = json.dumps({"file": str(Path(file_path).resolve())}) + "\n"
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(timeout)
+        conn.connect(socket_path)
+        conn.sendall(payload.encode("utf-8"))
+        with conn.makefile("r", encoding="utf-8") as reader:
+            line = reader.readline()
+
+    if not line:
+        raise ConnectionError("Daemon encerrou a conexão sem responder")
+    return json.loads(line)
+
+
+def analyze_locally(file_path):
+    from audio_analyzer import GunshotDetector, analyze_to_output, json_default
+
+    output, _ = analyze_to_output(GunshotDetector(), file_path)
+    return json.loads(json.dumps(output, default=json_default))
+
+
+def main():
+    args = sys.argv[1:]
+    socket_path = DEFAULT_SOCKET
+    if "--socket" in args:
+        i = args.index("--socket")
+        socket_path = args[i + 1] if i + 1 < len(args) else DEFAULT_SOCKET
+        del args[i : i + 2]
+
+    if len(args) != 1:
+        result = {
+            "error": "Uso incorreto. Forneça o caminho do arquivo de áudio.",
+            "is_gunshot": False,
+            "confidence": 0.0,
+        }
+        print(json.dumps(result))
+        sys.exit(1)
+
+    try:
+        output = request_analysis(args[0], socket_path)
+    except (OSError, ValueError) as e:
+        print(f"[v0] Daemon indisponível ({e}); analisando localmente", file=sys.stderr)
+        output = analyze_locally(args[0])
+
+    print(json.dumps(output))
+    if "error" in output:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import threading
+import time
+
+import pytest
+
+import admission
+from admission import AdmissionController, AdmissionRejected, ProxyTrust, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(admission.time, "monotonic", fake)
+    return fake
+
+
+def test_token_bucket_burst_then_refill(clock):
+    bucket = TokenBucket(rate_per_minute=60, burst=3)
+    assert [bucket.consume("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.consume("a") == pytest.approx(1.0)
+    # Outro cliente tem o próprio balde
+    assert bucket.consume("b") == 0.0
+
+    clock.now += 1.0
+    assert bucket.consume("a") == 0.0
+    assert bucket.consume("a") > 0
+
+
+def test_token_bucket_batch_larger_than_burst(clock):
+    bucket = TokenBucket(rate_per_minute=60, burst=3)
+    # Aceito com o balde cheio, que fica negativo
+    assert bucket.consume("a", tokens=5) == 0.0
+    assert bucket.consume("a") == pytest.approx(3.0)
+    clock.now += 3.0
+    assert bucket.consume("a") == 0.0
+
+
+def test_token_bucket_disabled():
+    bucket = TokenBucket(rate_per_minute=0, burst=1)
+    assert all(bucket.consume("a") == 0.0 for _ in range(10))
+
+
+def _wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condição não atingida"
+        time.sleep(0.005)
+
+
+def test_interactive_lane_passes_pending_batch():
+    controller = AdmissionController(memory_budget=100, batch_fraction=0.5)
+    order = []
+
+    def run(lane):
+        with controller.admit(10, lane):
+            order.append(lane)
+
+    with controller.admit(100):
+        batch = threading.Thread(target=run, args=("batch",))
+        batch.start()
+        _wait_until(lambda: len(controller._waiting["batch"]) == 1)
+        interactive = threading.Thread(target=run, args=("interactive",))
+        interactive.start()
+        _wait_until(lambda: len(controller._waiting["interactive"]) == 1)
+
+    batch.join(2)
+    interactive.join(2)
+    assert order == ["interactive", "batch"]
+    assert controller.reserved == 0
+
+
+def test_batch_lane_limited_to_its_fraction():
+    controller = AdmissionController(
+        memory_budget=100, batch_fraction=0.5, timeout=0.05
+    )
+    with controller.admit(40, "batch"):
+        with pytest.raises(AdmissionRejected) as exc:
+            with controller.admit(20, "batch"):
+                pass
+        # A faixa interativa ainda tem espaço
+        with controller.admit(60):
+            assert controller.reserved == 100
+    assert exc.value.reason == "timeout"
+    assert exc.value.status_code == 503
+
+
+def test_admission_timeout_and_release():
+    controller = AdmissionController(memory_budget=100, timeout=0.05)
+    with controller.admit(100):
+        start = time.monotonic()
+        with pytest.raises(AdmissionRejected) as exc:
+            with controller.admit(1):
+                pass
+        assert time.monotonic() - start >= 0.05
+    assert exc.value.reason == "timeout"
+    assert exc.value.retry_after >= 1
+    assert not controller._waiting["interactive"]
+    # Liberado o orçamento, a próxima reserva passa direto
+    with controller.admit(100):
+        assert controller.reserved == 100
+
+
+def test_admission_queue_full():
+    controller = AdmissionController(memory_budget=100, max_waiting=0)
+    with pytest.raises(AdmissionRejected) as exc:
+        with controller.admit(1):
+            pass
+    assert exc.value.reason == "queue_full"
+
+
+def test_admission_without_shedding_waits_past_timeout():
+    controller = AdmissionController(memory_budget=100, timeout=0.01)
+    admitted = threading.Event()
+
+    def run():
+        with controller.admit(50, shed=False):
+            admitted.set()
+
+    with controller.admit(100):
+        worker = threading.Thread(target=run)
+        worker.start()
+        time.sleep(0.05)
+        assert not admitted.is_set()
+    worker.join(2)
+    assert admitted.is_set()
+
+
+def test_proxy_trust_ignores_untrusted_peer():
+    trust = ProxyTrust("10.0.0.0/8")
+    assert trust.client("203.0.113.7", "1.2.3.4") == "203.0.113.7"
+    assert ProxyTrust("").client("10.1.2.3", "1.2.3.4") == "10.1.2.3"
+
+
+def test_proxy_trust_uses_last_hop_only():
+    trust = ProxyTrust("10.0.0.0/8, 192.168.1.5")
+    # O cliente forjou "1.1.1.1"; o proxy acrescentou o endereço real
+    assert trust.client("10.0.0.2", "1.1.1.1, 198.51.100.9") == "198.51.100.9"
+    assert trust.client("192.168.1.5", "198.51.100.9") == "198.51.100.9"
+    assert trust.client("::ffff:10.0.0.2", "::ffff:198.51.100.9") == "198.51.100.9"
+    # Último salto inválido ou ausente: vale a conexão
+    assert trust.client("10.0.0.2", "1.1.1.1, lixo") == "10.0.0.2"
+    assert trust.client("10.0.0.2", None) == "10.0.0.2"
+    assert trust.client(None, "198.51.100.9") == "unknown"
+
+
+def test_proxy_trust_resolves_hostnames():
+    trust = ProxyTrust("localhost")
+    assert trust.is_trusted("127.0.0.1")
+    assert trust.client("127.0.0.1", "198.51.100.9") == "198.51.100.9"
+    assert not trust.is_trusted("198.51.100.9")
@@ -0,0 +1,59 @@
+import os
+import socket
+import socketserver
+import stat
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+sys.path.insert(0, str(ROOT / "scripts"))
+
+import audio_analyzer  # noqa: E402
+from audio_analyzer import remove_stale_socket, serve_socket  # noqa: E402
+
+
+def test_remove_stale_socket_refuses_regular_file(tmp_path):
+    path = tmp_path / "gunshot-analyzer.sock"
+    path.write_text("não é socket")
+    with pytest.raises(RuntimeError):
+        remove_stale_socket(str(path))
+    assert path.read_text() == "não é socket"
+
+
+def test_remove_stale_socket_keeps_live_listener(tmp_path):
+    path = str(tmp_path / "gunshot-analyzer.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        listener.bind(path)
+        listener.listen()
+        with pytest.raises(RuntimeError):
+            remove_stale_socket(path)
+        assert os.path.exists(path)
+
+    # Sem ninguém ouvindo, o socket abandonado é removido
+    remove_stale_socket(path)
+    assert not os.path.exists(path)
+    remove_stale_socket(path)
+
+
+def test_serve_socket_private_and_removes_only_own(tmp_path, monkeypatch):
+    path = str(tmp_path / "gunshot-analyzer.sock")
+    seen = {}
+
+    def serve_forever(server):
+        seen["mode"] = stat.S_IMODE(os.stat(path).st_mode)
+        # Outro processo assumiu o caminho enquanto o daemon rodava
+        os.unlink(path)
+        with open(path, "w") as handle:
+            handle.write("outro")
+
+    monkeypatch.setattr(
+        socketserver.ThreadingUnixStreamServer, "serve_forever", serve_forever
+    )
+    serve_socket(
+        audio_analyzer.GunshotDetector.__new__(audio_analyzer.GunshotDetector), path
+    )
+    assert seen["mode"] == 0o600
+    with open(path) as handle:
+        assert handle.read() == "outro"
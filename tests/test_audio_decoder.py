@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+import audio_decoder
+from audio_decoder import (
+    audio_channels,
+    audio_duration,
+    iter_audio_blocks,
+    load_segments,
+)
+
+SR = 8000
+
+
+@pytest.fixture
+def stereo_wav(tmp_path):
+    rng = np.random.default_rng(0)
+    data = rng.uniform(-0.5, 0.5, (5 * SR + 123, 2)).astype(np.float32)
+    path = tmp_path / "stereo.wav"
+    sf.write(path, data, SR, subtype="PCM_16")
+    return str(path)
+
+
+def _refuse(*args, **kwargs):
+    raise RuntimeError("formato não suportado")
+
+
+@pytest.fixture
+def without_soundfile(monkeypatch):
+    """Simula um formato que o libsndfile não abre (ex.: M4A): só o audioread lê"""
+    for name in ("info", "blocks", "SoundFile"):
+        monkeypatch.setattr(audio_decoder.sf, name, _refuse)
+
+
+@pytest.fixture
+def stereo_mono(stereo_wav):
+    data, _ = sf.read(stereo_wav, dtype="float32")
+    return data.mean(axis=1)
+
+
+def test_fallback_reads_duration_and_channels(stereo_wav, without_soundfile):
+    assert audio_duration(stereo_wav) == pytest.approx((5 * SR + 123) / SR)
+    assert audio_channels(stereo_wav) == 2
+
+
+def test_fallback_blocks_match_soundfile(stereo_wav, monkeypatch):
+    expected = [
+        (start, y.copy()) for start, y in iter_audio_blocks(stereo_wav, SR, 1.5)
+    ]
+
+    monkeypatch.setattr(audio_decoder.sf, "info", _refuse)
+    blocks = list(iter_audio_blocks(stereo_wav, SR, 1.5))
+    assert [start for start, _ in blocks] == [start for start, _ in expected]
+    for (_, y), (_, ref) in zip(blocks, expected):
+        np.testing.assert_allclose(y, ref, atol=1e-6)
+    assert all(len(y) == int(1.5 * SR) for _, y in blocks[:-1])
+
+
+def test_resampled_blocks_keep_every_sample(stereo_wav):
+    total = sum(len(y) for _, y in iter_audio_blocks(stereo_wav, 2 * SR, 1.0))
+    assert total == 2 * (5 * SR + 123)
+
+
+def test_fallback_segments_streamed(
+    stereo_wav, stereo_mono, without_soundfile, monkeypatch
+):
+    monkeypatch.setattr(audio_decoder, "SEGMENT_BLOCK_SECONDS", 1.0)
+    spans = [(0.5, 1.0), (0.8, 2.2), (4.9, 6.0)]
+    segments = load_segments(stereo_wav, spans, SR)
+    assert [len(y) for y in segments] == [4000, 11200, 923]
+    for y, (start, end) in zip(segments, spans):
+        np.testing.assert_allclose(
+            y, stereo_mono[int(start * SR) : int(end * SR)], atol=1e-4
+        )
+    assert load_segments(stereo_wav, [], SR) == []
@@ -0,0 +1,108 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from audio_processor import MAX_TDOA_EVENTS, AudioProcessor, gcc_phat
+
+SR = 22050
+
+
+def _click_train(n=SR, positions=(2000, 9000, 15000), seed=0):
+    rng = np.random.default_rng(seed)
+    y = rng.normal(0, 0.01, n).astype(np.float32)
+    for p in positions:
+        y[p : p + 200] += rng.normal(0, 1, 200).astype(np.float32)
+    return y
+
+
+def test_gcc_phat_recovers_delay():
+    ref = _click_train()
+    delay = 37
+    sig = np.concatenate((np.zeros(delay, np.float32), ref[:-delay]))
+    assert gcc_phat(sig, ref, SR, max_tau=0.01) == pytest.approx(delay / SR, abs=1e-4)
+    assert gcc_phat(ref, sig, SR) == pytest.approx(-delay / SR, abs=1e-4)
+
+
+def test_gcc_phat_zero_max_shift():
+    ref = _click_train()
+    sig = np.roll(ref, 5)
+    # max_tau abaixo de uma amostra interpolada: nenhum deslocamento possível
+    assert gcc_phat(sig, ref, SR, max_tau=0.0) == 0.0
+    assert gcc_phat(sig, ref, SR, max_tau=1e-6) == 0.0
+
+
+def test_event_tdoas_uses_feature_onsets():
+    ref = _click_train()
+    channels = np.stack((ref, np.roll(ref, 20)))
+    onsets = np.array([2000, 9000, 15000]) / SR
+    features = SimpleNamespace(onsets=onsets)
+
+    events = AudioProcessor(SR)._event_tdoas(channels, SR, features)
+    assert [e["time"] for e in events] == [round(t, 4) for t in onsets]
+    for event in events:
+        assert event["tdoa_ms"][0] == 0.0
+        assert event["tdoa_ms"][1] == pytest.approx(20 / SR * 1000, abs=0.1)
+
+    many = SimpleNamespace(onsets=np.linspace(0.05, 0.9, MAX_TDOA_EVENTS + 5))
+    assert len(AudioProcessor(SR)._event_tdoas(channels, SR, many)) == MAX_TDOA_EVENTS
+    assert (
+        AudioProcessor(SR)._event_tdoas(channels, SR, SimpleNamespace(onsets=None))
+        == []
+    )
+
+
+def test_per_channel_on_chunked_recording(tmp_path, monkeypatch):
+    import soundfile as sf
+
+    import audio_processor
+
+    path = tmp_path / "stereo.wav"
+    stereo = np.stack((_click_train(2 * SR), _click_train(2 * SR, seed=1)), axis=1)
+    sf.write(path, stereo, SR)
+    monkeypatch.setattr(audio_processor, "CHUNKED_THRESHOLD_SECONDS", 1.0)
+
+    features = AudioProcessor(SR).extract_features(str(path), per_channel=True)
+    assert features.chunked
+    assert features.per_channel is None
+    assert features.channels == 2
+    assert features.mfccs.dtype == np.float32
+
+
+def test_aligned_blocks_keep_samples_and_order():
+    from audio_processor import _aligned_blocks
+
+    signal = np.arange(1000, dtype=np.float32)
+    blocks = [(0.0, signal[:300]), (0.0, signal[300:350]), (0.0, signal[350:])]
+    out = list(_aligned_blocks(iter(blocks), 128))
+    assert [(len(y), last) for y, last in out] == [
+        (256, False),
+        (640, False),
+        (104, True),
+    ]
+    np.testing.assert_array_equal(np.concatenate([y for y, _ in out]), signal)
+
+
+def test_chunked_matches_full_extraction(tmp_path):
+    import soundfile as sf
+
+    from audio_processor import CHUNKED_RMS_DECIMATION, ONSET_HOP
+
+    positions = np.arange(1, 10) * 21000 + 777
+    y = _click_train(10 * SR, positions)
+    path = tmp_path / "long.wav"
+    sf.write(path, y, SR)
+
+    processor = AudioProcessor(SR)
+    full = processor.extract_features(str(path))
+    chunked = processor.extract_features_chunked(str(path), chunk_seconds=1.3)
+
+    assert chunked.chunked and chunked.chunks > 1
+    assert len(chunked.onset_envelope) == len(full.onset_envelope)
+    np.testing.assert_allclose(chunked.onsets, full.onsets)
+    assert chunked.energy == pytest.approx(full.energy, rel=1e-3)
+    # RMS reduzido: pico e média por grupo de quadros
+    n_groups = -(-len(full.rms_frames) // CHUNKED_RMS_DECIMATION)
+    assert chunked.rms_hop == ONSET_HOP * CHUNKED_RMS_DECIMATION
+    assert len(chunked.rms_frames) == len(chunked.rms_means) == n_groups
+    assert chunked.rms_frames.max() == pytest.approx(full.rms_frames.max(), rel=1e-3)
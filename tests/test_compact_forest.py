@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from ml.compact_forest import CompactForest, export_forest
+
+
+def _data(seed=0):
+    X, y = make_classification(
+        n_samples=600, n_features=12, n_informative=6, random_state=seed
+    )
+    return X.astype(np.float32), y
+
+
+@pytest.mark.parametrize("max_depth", [None, 1, 3, 8])
+def test_predict_proba_matches_sklearn(tmp_path, max_depth):
+    X, y = _data()
+    model = RandomForestClassifier(
+        n_estimators=15, max_depth=max_depth, min_samples_leaf=3, random_state=0
+    ).fit(X, y)
+    meta = export_forest(model, tmp_path)
+    forest = CompactForest.load(tmp_path)
+
+    expected_depth = max(e.tree_.max_depth for e in model.estimators_)
+    assert meta["max_depth"] == forest.max_depth == expected_depth
+    np.testing.assert_allclose(
+        forest.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-6
+    )
+    np.testing.assert_array_equal(forest.predict(X), model.predict(X))
+
+
+def test_apply_reaches_sklearn_leaves(tmp_path):
+    X, y = _data(1)
+    model = RandomForestClassifier(n_estimators=5, random_state=1).fit(X, y)
+    export_forest(model, tmp_path)
+    forest = CompactForest.load(tmp_path, mmap=False)
+
+    leaves = forest.apply(X) - forest.roots
+    np.testing.assert_array_equal(leaves, model.apply(X))
+    # Uma amostra isolada (1-D) também é aceita
+    np.testing.assert_array_equal(forest.apply(X[0]), forest.apply(X[:1]))
+
+
+def test_single_leaf_tree(tmp_path):
+    # Classe única: cada árvore é só a raiz (max_depth 0)
+    X = np.random.default_rng(0).normal(size=(20, 3)).astype(np.float32)
+    y = np.ones(20, dtype=int)
+    model = RandomForestClassifier(n_estimators=3, random_state=0).fit(X, y)
+    export_forest(model, tmp_path)
+    forest = CompactForest.load(tmp_path)
+
+    assert forest.max_depth == 0
+    np.testing.assert_allclose(forest.predict_proba(X), model.predict_proba(X))
+
+
+def test_embedded_scaler(tmp_path):
+    X, y = _data(2)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=10, random_state=2).fit(
+        scaler.transform(X), y
+    )
+    export_forest(model, tmp_path, scaler=scaler)
+    forest = CompactForest.load(tmp_path)
+
+    assert forest.has_scaler
+    np.testing.assert_allclose(
+        forest.predict_proba(X, scaled=False),
+        model.predict_proba(scaler.transform(X)),
+        atol=1e-6,
+    )
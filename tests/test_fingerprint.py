@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+from fingerprint import (
+    FINGERPRINT_DTYPE,
+    FINGERPRINT_THRESHOLD,
+    MIN_HASHES,
+    FingerprintIndex,
+    fingerprint,
+)
+
+
+def _mel_db(seed, frames=400):
+    rng = np.random.default_rng(seed)
+    return rng.normal(-40.0, 10.0, size=(128, frames)).astype(np.float32)
+
+
+def _index(**kwargs):
+    return FingerprintIndex(
+        **{"threshold": FINGERPRINT_THRESHOLD, "path": None, **kwargs}
+    )
+
+
+def test_default_threshold_is_conservative():
+    assert FINGERPRINT_THRESHOLD >= 0.5
+
+
+def test_fingerprint_hashes_and_offset():
+    mel = _mel_db(0)
+    fp = fingerprint(mel)
+    assert fp.dtype == FINGERPRINT_DTYPE
+    assert len(fp) >= MIN_HASHES
+    dt = fp["hash"] & 0x3F
+    assert dt.min() >= 1 and dt.max() <= 63
+    np.testing.assert_array_equal(
+        fingerprint(mel, frame_offset=100)["time"], fp["time"] + 100
+    )
+    assert len(fingerprint(np.zeros((128, 0), np.float32))) == 0
+
+
+def test_lookup_same_audio_and_key():
+    index = _index()
+    mel = _mel_db(0)
+    index.add(fingerprint(mel), "k", {"filename": "a.wav"})
+
+    match = index.lookup(fingerprint(mel), "k")
+    assert match["result"] == {"filename": "a.wav"}
+    assert match["similarity"] == pytest.approx(1.0)
+    assert match["offset_frames"] == 0
+    # Outra chave (modo por canal, modelo) não reaproveita a análise
+    assert index.lookup(fingerprint(mel), "outra") is None
+    assert index.lookup(fingerprint(_mel_db(1)), "k") is None
+
+
+def test_lookup_trimmed_copy_reports_offset():
+    index = _index()
+    mel = _mel_db(0)
+    index.add(fingerprint(mel), "k", {"filename": "a.wav"})
+
+    match = index.lookup(fingerprint(mel[:, 50:]), "k")
+    assert match is not None
+    assert match["offset_frames"] == 50
+
+
+def test_eviction_removes_oldest_entry():
+    index = _index(max_entries=2)
+    mels = [_mel_db(seed) for seed in range(3)]
+    for i, mel in enumerate(mels):
+        index.add(fingerprint(mel), "k", {"i": i})
+
+    assert len(index) == 2
+    assert index.lookup(fingerprint(mels[0]), "k") is None
+    assert index.lookup(fingerprint(mels[2]), "k")["result"] == {"i": 2}
+    # Nenhuma posting aponta mais para a entrada 0
+    assert all(p >> 24 != 0 for postings in index._postings.values() for p in postings)
+
+
+def test_times_outside_packing_are_dropped():
+    index = _index()
+    fp = fingerprint(_mel_db(0))
+    late = fp.copy()
+    late["time"] += 1 << 24
+    index.add(late, "k", {"i": 0})
+    assert len(index) == 0
+
+    mixed = np.concatenate((fp, late))
+    index.add(mixed, "k", {"i": 1})
+    assert len(index) == 1
+    stored = index._entries[next(iter(index._entries))][0]
+    assert stored["time"].max() < 1 << 24
+    # Consultas com tempos fora do intervalo não corrompem o id da entrada
+    assert index.lookup(mixed, "k")["result"] == {"i": 1}
+    assert index.lookup(late, "k") is None
+
+
+def test_short_fingerprints_ignored():
+    index = _index()
+    short = np.zeros(MIN_HASHES - 1, dtype=FINGERPRINT_DTYPE)
+    index.add(short, "k", {})
+    assert len(index) == 0
+    assert index.lookup(short, "k") is None
+
+
+def test_save_and_load(tmp_path):
+    path = tmp_path / "index.npz"
+    index = _index(path=str(path))
+    mel = _mel_db(0)
+    index.add(fingerprint(mel), "k", {"filename": "a.wav"})
+    index.save()
+
+    loaded = _index(path=str(path))
+    assert len(loaded) == 1
+    assert loaded.lookup(fingerprint(mel), "k")["result"] == {"filename": "a.wav"}
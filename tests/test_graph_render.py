@@ -0,0 +1,99 @@
+import struct
+import zlib
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+import generate_audio_graphs
+from graph_render import (
+    PNG_SIGNATURE,
+    colormap_lut,
+    encode_png,
+    log_frequency_rows,
+    render,
+)
+
+
+def _decode_png(data: bytes) -> np.ndarray:
+    """Decodifica o PNG RGB 8 bits sem filtros gerado por encode_png"""
+    assert data.startswith(PNG_SIGNATURE)
+    offset = len(PNG_SIGNATURE)
+    chunks = []
+    while offset < len(data):
+        (length,) = struct.unpack(">I", data[offset : offset + 4])
+        tag = data[offset + 4 : offset + 8]
+        body = data[offset + 8 : offset + 8 + length]
+        (crc,) = struct.unpack(">I", data[offset + 8 + length : offset + 12 + length])
+        assert crc == zlib.crc32(tag + body) & 0xFFFFFFFF
+        chunks.append((tag, body))
+        offset += 12 + length
+
+    assert [tag for tag, _ in chunks] == [b"IHDR", b"IDAT", b"IEND"]
+    width, height, depth, color, _, _, _ = struct.unpack(">IIBBBBB", chunks[0][1])
+    assert (depth, color) == (8, 2)
+    raw = np.frombuffer(zlib.decompress(chunks[1][1]), dtype=np.uint8)
+    raw = raw.reshape(height, width * 3 + 1)
+    assert not raw[:, 0].any()
+    return raw[:, 1:].reshape(height, width, 3)
+
+
+def test_encode_png_round_trip():
+    rng = np.random.default_rng(0)
+    rgb = rng.integers(0, 256, size=(7, 13, 3), dtype=np.uint8)
+    np.testing.assert_array_equal(_decode_png(encode_png(rgb)), rgb)
+    np.testing.assert_array_equal(_decode_png(encode_png(rgb, level=9)), rgb)
+
+
+def test_render_maps_range_to_colormap():
+    matrix = np.array([[0.0, 1.0], [2.0, 3.0]])
+    image = render(matrix, "magma", 4, 2)
+    lut = colormap_lut("magma")
+    assert image.shape == (2, 4, 3)
+    # Frequências baixas (linha 0) embaixo
+    np.testing.assert_array_equal(image[1, 0], lut[0])
+    np.testing.assert_array_equal(image[0, -1], lut[255])
+
+
+def test_render_empty_matrix_is_blank():
+    lut = colormap_lut("RdBu_r")
+    for matrix in (np.zeros((20, 0)), np.zeros((0, 5))):
+        image = render(matrix, "RdBu_r", 6, 3)
+        assert image.shape == (3, 6, 3)
+        assert image.dtype == np.uint8
+        assert (image == lut[0]).all()
+        assert image.flags.writeable
+
+    rows = log_frequency_rows(0, 3)
+    image = render(np.zeros((0, 0)), "magma", 6, 3, rows=rows)
+    assert (image == colormap_lut("magma")[0]).all()
+
+
+def test_generate_graphs_for_very_short_audio(tmp_path, monkeypatch):
+    monkeypatch.setattr(generate_audio_graphs, "GRAPHS_DIR", tmp_path)
+    audio = tmp_path / "curto.wav"
+    sf.write(audio, np.full(10, 0.1, dtype=np.float32), 22050)
+
+    paths = generate_audio_graphs.generate_audio_graphs(str(audio), renderer="fast")
+    for path in paths.values():
+        with open(path, "rb") as f:
+            image = _decode_png(f.read())
+        assert image.shape == (
+            generate_audio_graphs.GRAPH_HEIGHT,
+            generate_audio_graphs.GRAPH_WIDTH,
+            3,
+        )
+
+
+def test_unknown_renderer_rejected_at_import(monkeypatch):
+    import importlib
+
+    monkeypatch.setenv("GRAPH_RENDERER", "svg")
+    try:
+        with pytest.raises(ValueError, match="GRAPH_RENDERER"):
+            importlib.reload(generate_audio_graphs)
+    finally:
+        monkeypatch.delenv("GRAPH_RENDERER")
+        importlib.reload(generate_audio_graphs)
+    with pytest.raises(ValueError):
+        generate_audio_graphs.generate_audio_graphs("x.wav", renderer="svg")
@@ -0,0 +1,67 @@
+import pytest
+
+import history
+from history import HistoryStore, decode_cursor, encode_cursor
+
+
+def _result(i, risk="low", detected=False):
+    return {
+        "filename": f"audio_{i}.wav",
+        "analysis": {"gunshot_detected": detected, "risk_level": risk},
+        "audio_features": {"duration": 1.0, "sample_rate": 22050, "channels": 1},
+        "detections": [{"time": 0.5}] if detected else [],
+    }
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    clock = iter(1_700_000_000.0 + i * 0.1 for i in range(1000))
+    monkeypatch.setattr(history.time, "time", lambda: next(clock))
+    return HistoryStore(tmp_path / "history.db")
+
+
+def test_cursor_round_trip():
+    created_at = 1_700_000_000.123456789
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+    with pytest.raises(ValueError):
+        decode_cursor("lixo")
+
+
+def test_pages_cover_every_row_once(store):
+    ids = [store.record(_result(i)) for i in range(23)]
+
+    seen, cursor = [], None
+    while True:
+        page = store.list(limit=5, cursor=cursor)
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ids[::-1]
+
+
+def test_cursor_with_equal_timestamps(tmp_path, monkeypatch):
+    monkeypatch.setattr(history.time, "time", lambda: 1_700_000_000.5)
+    store = HistoryStore(tmp_path / "history.db")
+    ids = [store.record(_result(i)) for i in range(7)]
+
+    first = store.list(limit=4)
+    second = store.list(limit=4, cursor=first["next_cursor"])
+    assert [i["id"] for i in first["items"] + second["items"]] == ids[::-1]
+    assert second["next_cursor"] is None
+
+
+def test_filters_and_details(store):
+    for i in range(10):
+        store.record(
+            _result(i, risk="high" if i % 3 == 0 else "low", detected=i % 3 == 0)
+        )
+    high = store.list(limit=2, risk_level="high")
+    rest = store.list(limit=2, risk_level="high", cursor=high["next_cursor"])
+    assert len(high["items"] + rest["items"]) == 4
+    assert all(i["risk_level"] == "high" for i in high["items"] + rest["items"])
+
+    record = store.get(high["items"][0]["id"])
+    assert record["detections"] == [{"time": 0.5}]
+    assert record["result"]["filename"] == high["items"][0]["filename"]
+    assert store.get(10_000) is None
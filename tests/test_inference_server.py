@@ -0,0 +1,48 @@
+import os
+import socket
+import stat
+
+import pytest
+
+import inference_server
+from inference_server import InferenceServer, parse_address, resolve_authkey
+
+
+def test_tcp_address_requires_authkey(monkeypatch):
+    monkeypatch.setattr(inference_server, "INFERENCE_SERVER_AUTHKEY", b"")
+    with pytest.raises(ValueError):
+        resolve_authkey(parse_address("127.0.0.1:9000"))
+    with pytest.raises(ValueError):
+        resolve_authkey(parse_address("0.0.0.0:9000"))
+    assert resolve_authkey(parse_address("0.0.0.0:9000"), b"segredo") == b"segredo"
+
+    monkeypatch.setattr(inference_server, "INFERENCE_SERVER_AUTHKEY", b"do-env")
+    assert resolve_authkey(parse_address("10.0.0.1:9000")) == b"do-env"
+
+
+def test_unix_socket_created_private(tmp_path, monkeypatch):
+    monkeypatch.setattr(inference_server, "INFERENCE_SERVER_AUTHKEY", b"")
+    path = str(tmp_path / "inference.sock")
+    server = InferenceServer(None, address=path)
+    with server.listen():
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_stale_socket_replaced_but_not_other_files(tmp_path):
+    stale = tmp_path / "stale.sock"
+    orphan = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    orphan.bind(str(stale))
+    orphan.close()  # arquivo fica, ninguém ouve
+    with InferenceServer(None, address=str(stale), authkey=b"k").listen():
+        pass
+
+    regular = tmp_path / "dados.txt"
+    regular.write_text("não apagar")
+    with pytest.raises(RuntimeError):
+        InferenceServer(None, address=str(regular), authkey=b"k").listen()
+    assert regular.read_text() == "não apagar"
+
+    live = str(tmp_path / "live.sock")
+    with InferenceServer(None, address=live, authkey=b"k").listen():
+        with pytest.raises(RuntimeError):
+            InferenceServer(None, address=live, authkey=b"k").listen()
@@ -0,0 +1,135 @@
+import time
+
+import pytest
+
+import jobs
+from jobs import JobStore, JobWorkerPool, WebhookRejected, resolve_webhook
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "http://127.0.0.1:8000/metrics",
+        "http://localhost/hook",
+        "http://10.0.0.5/hook",
+        "http://192.168.0.1/hook",
+        "http://169.254.169.254/latest/meta-data/",
+        "http://[::1]/hook",
+        "http://[::ffff:127.0.0.1]/hook",
+        "http://0x7f000001/hook",
+        "ftp://93.184.216.34/hook",
+        "http:///hook",
+    ],
+)
+def test_webhook_rejects_internal_or_invalid(url):
+    with pytest.raises(WebhookRejected):
+        resolve_webhook(url)
+
+
+def test_webhook_accepts_public_address():
+    parts, addresses = resolve_webhook("https://93.184.216.34:8443/hook?x=1")
+    assert addresses == ["93.184.216.34"]
+    assert parts.port == 8443
+
+
+def test_webhook_allowlist(monkeypatch):
+    monkeypatch.setattr(jobs, "WEBHOOK_ALLOWED_HOSTS", {"localhost"})
+    _, addresses = resolve_webhook("http://localhost/hook")
+    assert addresses
+    with pytest.raises(WebhookRejected):
+        resolve_webhook("http://93.184.216.34/hook")
+
+
+def test_send_webhook_does_not_contact_internal_host(monkeypatch):
+    def fail(*args):
+        raise AssertionError("não deveria conectar")
+
+    monkeypatch.setattr(jobs, "_post_json", fail)
+    status = jobs.send_webhook("http://127.0.0.1:9/hook", {"job_id": "x"})
+    assert status.startswith("failed:")
+
+
+def test_failed_job_removes_upload(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    upload = tmp_path / "upload.wav"
+    upload.write_bytes(b"RIFF")
+    job_id = store.create("upload.wav", str(upload))
+
+    def process(job, progress):
+        raise RuntimeError("áudio corrompido")
+
+    pool = JobWorkerPool(store, process, workers=1)
+    pool._run(store.claim_next())
+    assert store.get(job_id)["status"] == "error"
+    assert not upload.exists()
+
+
+def test_abandoned_job_removes_upload(tmp_path, monkeypatch):
+    store = JobStore(tmp_path / "jobs.db")
+    upload = tmp_path / "upload.wav"
+    upload.write_bytes(b"RIFF")
+    job_id = store.create("upload.wav", str(upload))
+    monkeypatch.setattr(jobs, "JOB_STALE_SECONDS", -1.0)
+    # Cada reserva "abandona" o job (heartbeat já vencido)
+    for _ in range(jobs.JOB_MAX_ATTEMPTS):
+        assert store.claim_next() is not None
+        assert upload.exists()
+    assert store.claim_next() is None
+    assert store.get(job_id)["status"] == "error"
+    assert not upload.exists()
+
+
+def test_abandoned_job_notifies_webhook(tmp_path, monkeypatch):
+    store = JobStore(tmp_path / "jobs.db")
+    upload = tmp_path / "upload.wav"
+    upload.write_bytes(b"RIFF")
+    job_id = store.create(
+        "upload.wav", str(upload), webhook_url="https://93.184.216.34/hook"
+    )
+    sent = []
+
+    def send(url, payload):
+        sent.append((url, payload))
+        return "delivered"
+
+    monkeypatch.setattr(jobs, "send_webhook", send)
+    monkeypatch.setattr(jobs, "JOB_STALE_SECONDS", -1.0)
+    for _ in range(jobs.JOB_MAX_ATTEMPTS):
+        assert store.claim_next() is not None
+    assert store.claim_next() is None
+
+    deadline = time.monotonic() + 2.0
+    while store.get(job_id).get("webhook_status") is None:
+        assert time.monotonic() < deadline, "webhook não enviado"
+        time.sleep(0.01)
+    assert sent == [
+        (
+            "https://93.184.216.34/hook",
+            {"job_id": job_id, "status": "error", "error": jobs.JOB_ABANDONED_ERROR},
+        )
+    ]
+    assert store.get(job_id)["webhook_status"] == "delivered"
+
+
+def test_create_job_removes_upload_when_insert_fails(tmp_path, monkeypatch):
+    import sqlite3
+
+    from fastapi.testclient import TestClient
+
+    # main cria seus diretórios relativos ao diretório atual
+    monkeypatch.chdir(tmp_path)
+    import main
+
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    monkeypatch.setattr(main, "JOBS_UPLOAD_DIR", uploads)
+
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(main.job_store, "create", locked)
+    response = TestClient(main.app).post(
+        "/api/jobs", files={"file": ("tiro.wav", b"RIFF0000WAVE", "audio/wav")}
+    )
+    assert response.status_code == 500
+    assert list(uploads.iterdir()) == []
@@ -0,0 +1,164 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import model_loader
+from model_loader import ModelLoader, has_onsets, onset_windows
+from records import AnalysisResult
+
+
+def test_onset_windows_groups_close_onsets():
+    onsets = [1.0, 1.2, 1.6, 5.0, 9.0, 9.3]
+    spans, groups = onset_windows(onsets, 20.0, window_seconds=3.0, merge_seconds=0.5)
+    np.testing.assert_array_equal(groups, [0, 0, 0, 1, 2, 2])
+    # Janela centrada no meio do grupo (a primeira começa no início do áudio)
+    assert spans[0] == pytest.approx((0.0, 3.0))
+    assert spans[1] == pytest.approx((3.5, 6.5))
+    assert spans[2] == pytest.approx((7.65, 10.65))
+
+
+def test_onset_windows_group_fits_half_window():
+    # Onsets encadeados a cada 0.4 s: o grupo fecha ao passar de meia janela
+    onsets = np.arange(0, 4.0, 0.4) + 5.0
+    spans, groups = onset_windows(onsets, 20.0, window_seconds=3.0, merge_seconds=0.5)
+    for g in range(groups[-1] + 1):
+        members = onsets[groups == g]
+        assert members[-1] - members[0] <= 1.5
+        start, end = spans[g]
+        assert start <= members[0] and members[-1] <= end
+
+
+def test_onset_windows_clamped_to_audio():
+    spans, _ = onset_windows([0.1, 9.9], 10.0, window_seconds=3.0, merge_seconds=0.5)
+    assert spans == [(0.0, 3.0), (7.0, 10.0)]
+    # Áudio mais curto que a janela: começa em 0
+    spans, _ = onset_windows([0.5], 1.0, window_seconds=3.0)
+    assert spans == [(0.0, 3.0)]
+
+
+def test_onset_windows_empty():
+    spans, groups = onset_windows([], 10.0)
+    assert spans == [] and groups.size == 0
+
+
+def _features(onsets, chunked=False):
+    return SimpleNamespace(
+        onsets=np.asarray(onsets, dtype=float),
+        onset_times=np.asarray(onsets[:10], dtype=float),
+        per_channel=None,
+        chunked=chunked,
+    )
+
+
+class _Loader(ModelLoader):
+    """Loader sem modelo: registra qual caminho de predição rodou"""
+
+    def __init__(self):
+        self.calls = []
+
+    def _onset_prediction(self, features, trainer=None):
+        self.calls.append("onsets")
+        return AnalysisResult(True, 0.9, "high", onsets={"count": 1})
+
+    def _tf_audio_prediction(self, features):
+        self.calls.append("windowed" if features.chunked else "clip")
+        return AnalysisResult(False, 0.2, "none", method="keras_efficientnet")
+
+
+@pytest.fixture
+def onset_mode(monkeypatch):
+    monkeypatch.setattr(model_loader, "ONSET_WINDOWS", True)
+
+
+def test_onset_mode_uses_onsets(onset_mode):
+    loader = _Loader()
+    result = loader._keras_prediction(_features([1.0, 2.0]))
+    assert loader.calls == ["onsets"]
+    assert result.probability == 0.9
+
+
+@pytest.mark.parametrize("chunked, path", [(False, "clip"), (True, "windowed")])
+def test_onset_mode_without_onsets_runs_normal_path(onset_mode, chunked, path):
+    loader = _Loader()
+    features = _features([], chunked=chunked)
+    assert not has_onsets(features)
+
+    result = loader._keras_prediction(features)
+    assert loader.calls == [path]
+    assert result.probability == 0.2
+    onsets = result.to_dict()["onsets"]
+    assert onsets["fallback"] == path
+    assert onsets["count"] == 0 and onsets["times"] == []
+
+
+def test_normal_mode_ignores_onsets(monkeypatch):
+    monkeypatch.setattr(model_loader, "ONSET_WINDOWS", False)
+    loader = _Loader()
+    result = loader._keras_prediction(_features([1.0]))
+    assert loader.calls == ["clip"]
+    assert result.onsets is None
+
+
+class _Trainer:
+    """Extrator sklearn mínimo: pico absoluto de cada janela"""
+
+    sample_rate = 8000
+
+    def extract_signal_features(self, y, sr):
+        return np.array([np.abs(y).max()], dtype=np.float32)
+
+    def extract_features(self, audio_path):
+        raise AssertionError("gravação longa não usa só os primeiros 3 s")
+
+
+class _Model:
+    classes_ = np.array([0, 1])
+
+    def predict_proba(self, matrix):
+        p = (matrix[:, 0] > 0.5).astype(float) * 0.8 + 0.1
+        return np.stack([1 - p, p], axis=1)
+
+
+def test_sklearn_chunked_recording_scored_per_window(tmp_path, monkeypatch):
+    import soundfile as sf
+
+    from detection_gate import DetectionGate
+    from records import AudioFeatures
+
+    monkeypatch.setattr(model_loader, "ONSET_WINDOWS", False)
+    monkeypatch.setattr(model_loader, "WINDOW_SECONDS", 3.0)
+    sr = _Trainer.sample_rate
+    y = np.full(12 * sr, 0.01, dtype=np.float32)
+    y[int(7.2 * sr)] = 0.9
+    path = tmp_path / "longo.wav"
+    sf.write(path, y, sr)
+
+    loader = ModelLoader.__new__(ModelLoader)
+    loader.model = _Model()
+    loader.model_info = {"model_type": "RandomForest"}
+    loader.feature_scaler = None
+    loader.gate = DetectionGate(enabled=False)
+    monkeypatch.setattr(loader, "_sklearn_trainer", _Trainer)
+
+    features = AudioFeatures(
+        duration=12.0,
+        sample_rate=sr,
+        channels=1,
+        energy=0.0,
+        peak_frequency=0.0,
+        spectral_centroid=0.0,
+        spectral_rolloff=0.0,
+        zero_crossing_rate=0.0,
+        mfccs=np.zeros(13, dtype=np.float32),
+        onset_count=0,
+        onset_times=np.zeros(0),
+        audio_path=str(path),
+        chunked=True,
+    )
+    result = loader._ml_prediction(features)
+    assert result.method == "machine_learning"
+    assert result.model_type == "RandomForest"
+    assert result.windows["count"] == 4
+    assert result.probability == pytest.approx(0.9)
+    assert [d.timestamp for d in result.detections] == [7.5]
@@ -0,0 +1,148 @@
+import numpy as np
+import pytest
+
+from ml.rules_engine import RuleSet, load_rules
+
+
+def backend_if_chain(features):
+    """ModelLoader._rule_based_prediction anterior ao motor de regras"""
+    confidence = 0.0
+    if features.get("energy", 0) > 0.7:
+        confidence += 0.3
+    if 100 <= features.get("peak_frequency", 0) <= 4000:
+        confidence += 0.25
+    if features.get("zero_crossing_rate", 0) > 0.15:
+        confidence += 0.2
+    if features.get("spectral_centroid", 0) > 2000:
+        confidence += 0.25
+
+    if confidence >= 0.7:
+        risk_level = "high"
+    elif confidence >= 0.4:
+        risk_level = "medium"
+    elif confidence >= 0.2:
+        risk_level = "low"
+    else:
+        risk_level = "none"
+    return confidence, risk_level != "none", risk_level
+
+
+def analyzer_if_chain(features):
+    """GunshotDetector.detect_gunshot_patterns anterior ao motor de regras"""
+    score = 0.0
+    score += 0.2 if 0.1 <= features["duration"] <= 2.0 else 0.0
+    score += 0.25 if features["rms_energy"] > 0.7 else 0.1
+    score += 0.2 if 200 <= features["spectral_centroid"] <= 8000 else 0.05
+    rolloff_ok = features["spectral_rolloff"] > 0.85 * features["spectral_centroid"]
+    score += 0.15 if rolloff_ok else 0.05
+    score += 0.2 if features["onset_count"] >= 1 else 0.0
+    return min(score, 1.0), min(score, 1.0) > 0.6
+
+
+def _boundary_column(rng, n, edges, spread):
+    """Valores concentrados nos limiares (e exatamente neles)"""
+    centers = rng.choice(edges, n)
+    values = centers + rng.normal(0, spread, n)
+    exact = rng.random(n) < 0.2
+    values[exact] = centers[exact]
+    return values
+
+
+def test_backend_rules_match_if_chain():
+    rng = np.random.default_rng(0)
+    n = 5000
+    data = {
+        "energy": _boundary_column(rng, n, [0.7], 0.2),
+        "peak_frequency": _boundary_column(rng, n, [100, 4000], 300),
+        "zero_crossing_rate": _boundary_column(rng, n, [0.15], 0.05),
+        "spectral_centroid": _boundary_column(rng, n, [2000], 500),
+    }
+    result = load_rules("backend").score(data)
+
+    for i in range(n):
+        row = {name: float(values[i]) for name, values in data.items()}
+        confidence, detected, risk = backend_if_chain(row)
+        assert result["confidence"][i] == confidence
+        assert result["gunshot_detected"][i] == detected
+        assert result["risk_level"][i] == risk
+
+
+def test_analyzer_rules_match_if_chain():
+    rng = np.random.default_rng(1)
+    n = 5000
+    centroid = _boundary_column(rng, n, [200, 8000], 400)
+    data = {
+        "duration": _boundary_column(rng, n, [0.1, 2.0], 0.3),
+        "rms_energy": _boundary_column(rng, n, [0.7], 0.2),
+        "spectral_centroid": centroid,
+        "spectral_rolloff": centroid * _boundary_column(rng, n, [0.85], 0.1),
+        "onset_count": rng.integers(0, 3, n).astype(float),
+    }
+    result = load_rules("analyzer").score(data)
+
+    for i in range(n):
+        row = {name: float(values[i]) for name, values in data.items()}
+        confidence, detected = analyzer_if_chain(row)
+        assert result["confidence"][i] == confidence
+        assert result["gunshot_detected"][i] == detected
+
+
+def test_structured_array_and_missing_columns():
+    rules = load_rules("backend")
+    rows = np.zeros(3, dtype=[("energy", "f8"), ("spectral_centroid", "f8")])
+    rows["energy"] = [0.9, 0.1, 0.9]
+    rows["spectral_centroid"] = [3000, 100, 100]
+    result = rules.score(rows)
+    # peak_frequency e zero_crossing_rate ausentes valem 0
+    np.testing.assert_allclose(result["confidence"], [0.55, 0.0, 0.3])
+    assert list(result["risk_level"]) == ["medium", "none", "low"]
+    assert rules.messages(result["flags"][0]) == [
+        "Pico de energia alto",
+        "Centroide espectral acima de 2000 Hz",
+    ]
+
+
+def test_between_relative_to_scales_both_bounds():
+    rules = RuleSet(
+        {
+            "rules": [
+                {
+                    "name": "ratio",
+                    "feature": "a",
+                    "op": "between",
+                    "value": [0.5, 2.0],
+                    "relative_to": "b",
+                    "score": 1.0,
+                }
+            ]
+        }
+    )
+    data = {
+        "a": [1.0, 5.0, 10.0, 39.0, 40.0, 41.0],
+        "b": [1.0, 10.0, 10.0, 20.0, 20.0, 20.0],
+    }
+    flags = rules.score(data)["flags"][:, 0]
+    assert list(flags) == [True, True, True, True, True, False]
+    assert not rules.score({"a": [4.9], "b": [10.0]})["flags"][0, 0]
+
+
+@pytest.mark.parametrize("value", [0.5, [1.0], [1.0, 2.0, 3.0]])
+def test_between_requires_two_bounds(value):
+    config = {
+        "rules": [
+            {"name": "x", "feature": "a", "op": "between", "value": value, "score": 1}
+        ]
+    }
+    with pytest.raises(ValueError):
+        RuleSet(config)
+
+
+def test_unknown_operator():
+    with pytest.raises(ValueError):
+        RuleSet(
+            {
+                "rules": [
+                    {"name": "x", "feature": "a", "op": "eq", "value": 1, "score": 1}
+                ]
+            }
+        )
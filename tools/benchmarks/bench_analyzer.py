@@ -0,0 +1,139 @@
+"""
+Benchmark do GunshotDetector.extract_features (scripts/audio_analyzer.py)
+
+Compara a extração atual (uma STFT compartilhada) com a implementação
+anterior, em que centroide, rolloff, largura de banda, MFCC e onsets
+recalculavam cada um sua própria STFT. Também confere que as features
+resultantes são equivalentes.
+
+Uso:
+  python tools/benchmarks/bench_analyzer.py --durations 0.5,2,10,60
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import (  # noqa: E402
+    DEFAULT_SAMPLE_RATE,
+    REPO_ROOT,
+    save_results,
+    summarize,
+    synthetic_recording,
+    time_calls,
+)
+
+sys.path.insert(0, str(REPO_ROOT / "tools" / "scripts"))
+
+
+def legacy_extract_features(audio, sr):
+    """Extração anterior: cada feature espectral refaz a STFT"""
+    import librosa
+    from scipy.stats import kurtosis, skew
+
+    features = {}
+    features["duration"] = len(audio) / sr
+    features["rms_energy"] = np.sqrt(np.mean(audio**2))
+    features["zero_crossing_rate"] = np.mean(librosa.feature.zero_crossing_rate(audio))
+    stft = librosa.stft(audio)
+    magnitude = np.abs(stft)  # noqa: F841 - calculado e descartado (como antes)
+    features["spectral_centroid"] = np.mean(
+        librosa.feature.spectral_centroid(y=audio, sr=sr)
+    )
+    features["spectral_rolloff"] = np.mean(
+        librosa.feature.spectral_rolloff(y=audio, sr=sr)
+    )
+    features["spectral_bandwidth"] = np.mean(
+        librosa.feature.spectral_bandwidth(y=audio, sr=sr)
+    )
+    mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=13)
+    features["mfcc_mean"] = np.mean(mfccs, axis=1)
+    features["mfcc_std"] = np.std(mfccs, axis=1)
+    features["kurtosis"] = kurtosis(audio)
+    features["skewness"] = skew(audio)
+    features["onset_count"] = len(librosa.onset.onset_detect(y=audio, sr=sr))
+    return features
+
+
+def max_difference(a, b):
+    """Maior diferença relativa entre dois dicionários de features"""
+    worst = 0.0
+    for key in a:
+        x = np.asarray(a[key], dtype=float)
+        y = np.asarray(b[key], dtype=float)
+        scale = np.maximum(np.abs(x), 1e-9)
+        worst = max(worst, float(np.max(np.abs(x - y) / scale)))
+    return worst
+
+
+def inputs(durations):
+    import librosa
+
+    test_tone = REPO_ROOT / "test_tone.wav"
+    if test_tone.exists():
+        audio, sr = librosa.load(str(test_tone), sr=DEFAULT_SAMPLE_RATE)
+        yield "test_tone.wav", audio, sr
+    for duration in durations:
+        yield (
+            f"synthetic_{duration:g}s",
+            synthetic_recording(duration, DEFAULT_SAMPLE_RATE),
+            DEFAULT_SAMPLE_RATE,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--durations", default="0.5,2,10,60")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="bench_results/analyzer.json")
+    args = parser.parse_args()
+
+    from audio_analyzer import GunshotDetector
+
+    detector = GunshotDetector()
+    durations = [float(d) for d in args.durations.split(",") if d]
+    results = []
+
+    print(
+        f"{'entrada':<22} {'antes p50':>11} {'agora p50':>11} {'speedup':>8} {'dif. máx':>10}"
+    )
+    for name, audio, sr in inputs(durations):
+        before = summarize(
+            time_calls(lambda: legacy_extract_features(audio, sr), args.repeat)
+        )
+        after = summarize(
+            time_calls(lambda: detector.extract_features(audio, sr), args.repeat)
+        )
+        diff = max_difference(
+            legacy_extract_features(audio, sr), detector.extract_features(audio, sr)
+        )
+        speedup = before["p50_ms"] / after["p50_ms"] if after["p50_ms"] else None
+
+        print(
+            f"{name:<22} {before['p50_ms']:>9.1f}ms {after['p50_ms']:>9.1f}ms "
+            f"{speedup:>7.2f}x {diff:>10.2e}"
+        )
+        for target, stats in (("legacy", before), ("shared_stft", after)):
+            results.append(
+                {
+                    "benchmark": "analyzer",
+                    "target": target,
+                    "input": name,
+                    "duration_s": round(len(audio) / sr, 3),
+                    "format": "array",
+                    **stats,
+                }
+            )
+        results[-1]["speedup"] = round(speedup, 3) if speedup else None
+        results[-1]["max_relative_difference"] = diff
+
+    output = save_results(args.output, results)
+    print(f"\n✓ Resultados salvos em: {output}")
+
+
+if __name__ == "__main__":
+    main()
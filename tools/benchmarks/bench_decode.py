@@ -0,0 +1,126 @@
+"""
+Benchmark da decodificação de áudio (backend/audio_decoder.py)
+
+Compara ``librosa.load(path, sr=22050)`` (caminho anterior, soxr_hq) com
+``audio_decoder.load_audio`` usando cada reamostrador, nos cinco formatos
+aceitos pela API e em duas taxas nativas (22050 Hz dispensa reamostragem).
+A coluna "dif." é o maior erro absoluto em relação ao librosa.load.
+
+Uso:
+  python tools/benchmarks/bench_decode.py --durations 10,60 --formats wav,flac,ogg,mp3,m4a
+"""
+
+import argparse
+import sys
+import tempfile
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import (  # noqa: E402
+    DEFAULT_SAMPLE_RATE,
+    make_input,
+    save_results,
+    summarize,
+    time_calls,
+    use_backend_imports,
+)
+
+ALLOWED_FORMATS = "wav,flac,ogg,mp3,m4a"
+RESAMPLERS = "soxr_hq,soxr_qq,polyphase"
+
+
+def max_abs_difference(a, b):
+    n = min(len(a), len(b))
+    return float(np.max(np.abs(a[:n] - b[:n]))) if n else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--durations", default="10,60")
+    parser.add_argument("--formats", default=ALLOWED_FORMATS)
+    parser.add_argument("--native-rates", default="22050,44100")
+    parser.add_argument("--resamplers", default=RESAMPLERS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument("--output", default="bench_results/decode.json")
+    args = parser.parse_args()
+
+    use_backend_imports()
+    import librosa
+    from audio_decoder import load_audio
+
+    warnings.simplefilter("ignore")  # avisos do fallback para audioread
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="gunshot_decode_"))
+    durations = [float(d) for d in args.durations.split(",") if d]
+    formats = [f.strip().lower() for f in args.formats.split(",") if f]
+    rates = [int(r) for r in args.native_rates.split(",") if r]
+    resamplers = [r.strip() for r in args.resamplers.split(",") if r]
+
+    results = []
+    print(f"{'entrada':<24} {'alvo':<22} {'p50':>10} {'speedup':>8} {'dif.':>10}")
+    for duration in durations:
+        for rate in rates:
+            for fmt in formats:
+                name = f"{duration:g}s_{rate}hz.{fmt}"
+                try:
+                    path = str(make_input(work_dir, duration, fmt, sr=rate))
+                except Exception as e:
+                    print(f"{name:<24} (ignorado: {e})")
+                    results.append(
+                        {
+                            "benchmark": "decode",
+                            "target": "all",
+                            "duration_s": duration,
+                            "format": fmt,
+                            "native_rate": rate,
+                            "skipped": str(e),
+                        }
+                    )
+                    continue
+
+                reference = librosa.load(path, sr=DEFAULT_SAMPLE_RATE)[0]
+                targets = {
+                    "librosa.load": lambda: librosa.load(path, sr=DEFAULT_SAMPLE_RATE)
+                }
+                for res_type in resamplers:
+                    targets[f"load_audio[{res_type}]"] = (
+                        lambda res_type=res_type: load_audio(
+                            path, sr=DEFAULT_SAMPLE_RATE, res_type=res_type
+                        )
+                    )
+
+                baseline_p50 = None
+                for target, fn in targets.items():
+                    stats = summarize(time_calls(fn, args.repeat))
+                    baseline_p50 = baseline_p50 or stats["p50_ms"]
+                    diff = max_abs_difference(reference, fn()[0])
+                    speedup = (
+                        baseline_p50 / stats["p50_ms"] if stats["p50_ms"] else None
+                    )
+                    print(
+                        f"{name:<24} {target:<22} {stats['p50_ms']:>8.1f}ms "
+                        f"{speedup:>7.2f}x {diff:>10.2e}"
+                    )
+                    results.append(
+                        {
+                            "benchmark": "decode",
+                            "target": target,
+                            "duration_s": duration,
+                            "format": fmt,
+                            "native_rate": rate,
+                            **stats,
+                            "speedup": round(speedup, 3) if speedup else None,
+                            "max_abs_difference": diff,
+                        }
+                    )
+
+    output = save_results(args.output, results)
+    print(f"\n✓ Resultados salvos em: {output}")
+
+
+if __name__ == "__main__":
+    main()
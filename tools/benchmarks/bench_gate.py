@@ -0,0 +1,226 @@
+"""
+Avaliação do filtro DSP da cascata (backend/detection_gate.py)
+
+Para cada combinação de limiares mostra a perda de recall (janelas com tiro
+descartadas pelo filtro) e o cálculo poupado (janelas que deixam de gerar
+log-mel e passar pela EfficientNet). O custo por janela do log-mel é medido;
+o do modelo Keras também, quando ele carrega, senão só o log-mel entra na
+conta.
+
+Sem ``--data-dir`` usa gravações sintéticas (tiros sobre ruído ambiente com
+níveis variados) com o rótulo de cada janela conhecido. Com ``--data-dir``
+no formato do treino (gunshots/ e non_gunshots/) a avaliação é por arquivo:
+um tiro é perdido quando todas as janelas do arquivo são descartadas.
+
+Uso:
+  python tools/benchmarks/bench_gate.py --crest-db 3,4.5,6 --flux-ratio 2,2.5,4
+  python tools/benchmarks/bench_gate.py --data-dir data/ --peak-db -50,-45,-40
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import (  # noqa: E402
+    DEFAULT_SAMPLE_RATE,
+    REPO_ROOT,
+    save_results,
+    synthetic_gunshot,
+    use_backend_imports,
+    write_audio,
+)
+
+NOISE_LEVELS = "0.002,0.01,0.03,0.06"
+
+
+def parse_floats(value):
+    return [float(v) for v in value.split(",") if v]
+
+
+def synthetic_cases(work_dir, duration, noise_levels, window_seconds, seed=0):
+    """
+    Gravações sintéticas e o rótulo de cada janela
+
+    Metade das janelas recebe um tiro (amplitude aleatória) em posição
+    aleatória inteiramente dentro da janela.
+    """
+    rng = np.random.default_rng(seed)
+    sr = DEFAULT_SAMPLE_RATE
+    window = int(window_seconds * sr)
+    n_windows = int(duration // window_seconds)
+    shot = synthetic_gunshot(sr, rng=rng)
+
+    cases = []
+    for noise in noise_levels:
+        audio = rng.normal(0, noise, n_windows * window).astype(np.float32)
+        # Ruído ambiente não estacionário (variação lenta de nível)
+        t = np.arange(audio.size) / sr
+        audio *= (1.0 + 0.5 * np.sin(2 * np.pi * t / 40.0)).astype(np.float32)
+
+        labels = rng.random(n_windows) < 0.5
+        for w in np.flatnonzero(labels):
+            start = w * window + rng.integers(0, window - len(shot))
+            audio[start : start + len(shot)] += shot * rng.uniform(0.1, 1.0)
+        np.clip(audio, -1.0, 1.0, out=audio)
+
+        path = Path(work_dir) / f"gate_noise{noise:g}.wav"
+        write_audio(path, audio, sr)
+        cases.append({"path": str(path), "noise": noise, "labels": labels})
+    return cases
+
+
+def labeled_cases(data_dir):
+    cases = []
+    for label, folder in ((True, "gunshots"), (False, "non_gunshots")):
+        for path in sorted((Path(data_dir) / folder).glob("**/*.wav")):
+            cases.append({"path": str(path), "label": label})
+    return cases
+
+
+def measure_costs(loader, y, sr, input_shape, window, repeat=5):
+    """Milissegundos por janela do log-mel e (se carregado) do modelo Keras"""
+    segment = y[:window]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        spec = loader.log_mel_spectrogram(segment, sr, *input_shape[:2])
+    logmel_ms = (time.perf_counter() - start) / repeat * 1000.0
+
+    model_ms = None
+    if loader.model_framework == "tf_keras":
+        loader.predict_spectrograms([spec])  # aquecimento
+        start = time.perf_counter()
+        for _ in range(repeat):
+            loader.predict_spectrograms([spec])
+        model_ms = (time.perf_counter() - start) / repeat * 1000.0
+    return logmel_ms, model_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--data-dir", default=None)
+    parser.add_argument("--duration", type=float, default=300.0)
+    parser.add_argument("--noise-levels", default=NOISE_LEVELS)
+    parser.add_argument("--peak-db", default=None)
+    parser.add_argument("--crest-db", default=None)
+    parser.add_argument("--flux-ratio", default=None)
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument("--output", default="bench_results/gate.json")
+    args = parser.parse_args()
+
+    import logging
+
+    logging.disable(logging.INFO)
+    os.chdir(REPO_ROOT)  # ModelLoader usa caminhos relativos (models/, IA_*)
+    use_backend_imports()
+    from audio_decoder import load_audio
+    from audio_processor import AudioProcessor
+    from detection_gate import (
+        GATE_MIN_CREST_DB,
+        GATE_MIN_FLUX_RATIO,
+        GATE_MIN_PEAK_DB,
+        DetectionGate,
+    )
+    from model_loader import WINDOW_SECONDS, ModelLoader
+
+    sr = DEFAULT_SAMPLE_RATE
+    window = int(WINDOW_SECONDS * sr)
+    if args.data_dir:
+        cases = labeled_cases(args.data_dir)
+        if not cases:
+            print(f"Nenhum .wav em {args.data_dir}/gunshots ou non_gunshots")
+            return
+    else:
+        work_dir = args.work_dir or tempfile.mkdtemp(prefix="gunshot_gate_")
+        cases = synthetic_cases(
+            work_dir, args.duration, parse_floats(args.noise_levels), WINDOW_SECONDS
+        )
+
+    # Envelopes por quadro calculados uma vez; cada combinação só refaz o filtro
+    processor = AudioProcessor(sample_rate=sr)
+    for case in cases:
+        features = processor.extract_features(case["path"])
+        case["features"] = features
+        case["n_windows"] = max(1, int(np.ceil(features.duration * sr / window)))
+
+    loader = ModelLoader()
+    input_shape = loader.model_input_shape()
+    y, _ = load_audio(cases[0]["path"], sr=sr)
+    logmel_ms, model_ms = measure_costs(loader, y, sr, input_shape, window)
+    window_ms = logmel_ms + (model_ms or 0.0)
+
+    grid = itertools.product(
+        parse_floats(args.peak_db) if args.peak_db else [GATE_MIN_PEAK_DB],
+        parse_floats(args.crest_db) if args.crest_db else [GATE_MIN_CREST_DB],
+        parse_floats(args.flux_ratio) if args.flux_ratio else [GATE_MIN_FLUX_RATIO],
+    )
+
+    results = []
+    print(
+        f"Custo por janela: log-mel {logmel_ms:.2f}ms, modelo "
+        + (f"{model_ms:.2f}ms" if model_ms is not None else "não carregado")
+    )
+    print(
+        f"{'pico dB':>8} {'crista':>7} {'fluxo':>6} {'perda recall':>13} "
+        f"{'janelas poupadas':>17} {'filtro ms':>10} {'poupado ms':>11}"
+    )
+    for peak_db, crest_db, flux_ratio in grid:
+        gate = DetectionGate(True, peak_db, crest_db, flux_ratio)
+        positives = missed = total = gated = 0
+        gate_seconds = 0.0
+        for case in cases:
+            start = time.perf_counter()
+            mask = gate.candidates(case["features"], window, case["n_windows"])
+            gate_seconds += time.perf_counter() - start
+
+            total += mask.size
+            gated += int(mask.size - np.count_nonzero(mask))
+            if "labels" in case:
+                labels = case["labels"][: mask.size]
+                positives += int(np.count_nonzero(labels))
+                missed += int(np.count_nonzero(labels & ~mask[: labels.size]))
+            elif case["label"]:
+                positives += 1
+                missed += int(not mask.any())
+
+        recall_loss = missed / positives if positives else 0.0
+        saved_ms = gated * window_ms - gate_seconds * 1000.0
+        print(
+            f"{peak_db:>8g} {crest_db:>7g} {flux_ratio:>6g} {recall_loss:>12.2%} "
+            f"{gated / total:>16.2%} {gate_seconds * 1000.0:>10.2f} {saved_ms:>11.1f}"
+        )
+        results.append(
+            {
+                "benchmark": "gate",
+                "min_peak_db": peak_db,
+                "min_crest_db": crest_db,
+                "min_flux_ratio": flux_ratio,
+                "evaluation": "file" if args.data_dir else "window",
+                "positives": positives,
+                "missed": missed,
+                "recall_loss": round(recall_loss, 4),
+                "windows": total,
+                "gated_windows": gated,
+                "gated_fraction": round(gated / total, 4),
+                "gate_ms": round(gate_seconds * 1000.0, 3),
+                "logmel_ms_per_window": round(logmel_ms, 3),
+                "model_ms_per_window": (
+                    round(model_ms, 3) if model_ms is not None else None
+                ),
+                "saved_ms": round(saved_ms, 1),
+            }
+        )
+
+    output = save_results(args.output, results)
+    print(f"\n✓ Resultados salvos em: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark dos gráficos da análise (backend/generate_audio_graphs.py)
+
+Compara o renderizador "fast" (tabela de cores + PNG via zlib,
+backend/graph_render.py) com o "matplotlib" (specshow + savefig). As duas
+linhas partem das mesmas matrizes (uma STFT): "render" mede só a
+renderização e gravação dos três PNGs, "total" a chamada completa
+(decodificação e STFT incluídas) e "1ª chamada" um processo novo, com o
+import do módulo (e do matplotlib) e o pico de RSS. O matplotlib leva
+minutos por chamada em 300 s a 44.1 kHz.
+
+Uso:
+  python tools/benchmarks/bench_graphs.py --durations 10,60
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import (  # noqa: E402
+    make_input,
+    peak_rss_mb,
+    run_isolated,
+    save_results,
+    summarize,
+    time_calls,
+    use_backend_imports,
+)
+
+RENDERERS = "matplotlib,fast"
+
+
+def first_call(path, renderer, work_dir):
+    """Import + primeira chamada em processo novo: (segundos, pico de RSS em MB)"""
+    os.chdir(work_dir)  # GRAPHS_DIR é relativo ao diretório corrente
+    use_backend_imports()
+    start = time.perf_counter()
+    from generate_audio_graphs import generate_audio_graphs
+
+    generate_audio_graphs(path, renderer)
+    return time.perf_counter() - start, peak_rss_mb()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--durations", default="10,60")
+    parser.add_argument("--renderers", default=RENDERERS)
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument("--output", default="bench_results/graphs.json")
+    args = parser.parse_args()
+
+    output_path = Path(args.output).resolve()
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="gunshot_graphs_"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    os.chdir(work_dir)  # os PNGs vão para <work_dir>/graphs
+    durations = [float(d) for d in args.durations.split(",") if d]
+    renderers = [r.strip() for r in args.renderers.split(",") if r]
+    inputs = {
+        d: str(make_input(work_dir, d, "wav", sr=args.sample_rate)) for d in durations
+    }
+
+    # Processos novos antes de carregar qualquer coisa aqui: o filho herda o
+    # pico de RSS do pai (fork + exec), o que contaminaria a medida
+    cold = {
+        (d, r): run_isolated(first_call, inputs[d], r, str(work_dir))
+        for d in durations
+        for r in renderers
+    }
+
+    use_backend_imports()
+    from audio_decoder import load_audio
+    from generate_audio_graphs import (
+        GRAPH_MAX_SECONDS,
+        RENDERERS as RENDER_FUNCTIONS,
+        generate_audio_graphs,
+        graph_matrices,
+    )
+
+    results = []
+    print(
+        f"{'entrada':<14} {'renderizador':<12} {'render':>10} {'total':>10} "
+        f"{'speedup':>8} {'1ª chamada':>11} {'rss MB':>8} {'PNGs KB':>8}"
+    )
+    for duration in durations:
+        path = inputs[duration]
+        y, sr = load_audio(path, sr=None, duration=GRAPH_MAX_SECONDS)
+        matrices = graph_matrices(y, sr)
+        name = f"{duration:g}s_{sr}hz"
+
+        baseline_p50 = None
+        for renderer in renderers:
+            cold_seconds, cold_rss = cold[duration, renderer]
+            paths = generate_audio_graphs(path, renderer)
+            render_fn = RENDER_FUNCTIONS[renderer]
+            render_paths = {k: Path(v) for k, v in paths.items()}
+            render = summarize(
+                time_calls(lambda: render_fn(matrices, sr, render_paths), args.repeat)
+            )
+            total = summarize(
+                time_calls(lambda: generate_audio_graphs(path, renderer), args.repeat)
+            )
+            png_kb = sum(os.path.getsize(p) for p in paths.values()) / 1024.0
+
+            baseline_p50 = baseline_p50 or render["p50_ms"]
+            speedup = baseline_p50 / render["p50_ms"] if render["p50_ms"] else None
+            print(
+                f"{name:<14} {renderer:<12} {render['p50_ms']:>8.1f}ms "
+                f"{total['p50_ms']:>8.1f}ms {speedup:>7.2f}x "
+                f"{cold_seconds * 1000.0:>9.0f}ms {cold_rss:>8.1f} {png_kb:>8.1f}"
+            )
+            results.append(
+                {
+                    "benchmark": "graphs",
+                    "target": renderer,
+                    "duration_s": duration,
+                    "format": "wav",
+                    "sample_rate": sr,
+                    **total,
+                    "render_p50_ms": render["p50_ms"],
+                    "render_p95_ms": render["p95_ms"],
+                    "speedup": round(speedup, 3) if speedup else None,
+                    "first_call_ms": round(cold_seconds * 1000.0, 1),
+                    "peak_rss_mb": round(cold_rss, 1),
+                    "png_kb": round(png_kb, 1),
+                }
+            )
+
+    output = save_results(output_path, results)
+    print(f"\n✓ Resultados salvos em: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Pico de memória do pipeline em gravações longas
+
+Para cada duração, cada etapa roda em um processo próprio (spawn) sobre um
+WAV sintético a 44.1 kHz e mede o pico de RSS e o pico de memória alocada
+rastreado pelo tracemalloc (inclui os arrays NumPy):
+
+  - decode:      audio_decoder.load_audio (leitura + reamostragem a 22050 Hz)
+  - features:    AudioProcessor.extract_features (caminho em memória)
+  - model_input: ModelLoader.compute_spectrogram (log-mel de entrada do Keras)
+
+Também registra o dtype dos arrays que cada etapa devolve. Para comparar
+duas versões, grave o baseline na primeira e rode de novo na segunda (por
+padrão durações até CHUNKED_THRESHOLD_SECONDS, acima disso as features são
+extraídas em blocos):
+
+  python tools/benchmarks/bench_memory.py --durations 60,300 --save-baseline
+  python tools/benchmarks/bench_memory.py --durations 60,300
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import (  # noqa: E402
+    REPO_ROOT,
+    compare_with_baseline,
+    make_input,
+    peak_rss_mb,
+    run_isolated,
+    save_results,
+    use_backend_imports,
+)
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "memory_baseline.json"
+STAGES = ("decode", "features", "model_input")
+INPUT_SAMPLE_RATE = 44100
+
+
+def _dtypes(value):
+    """dtype de cada array devolvido pela etapa"""
+    if hasattr(value, "dtype"):
+        return {"output": str(value.dtype)}
+    if isinstance(value, tuple):
+        return _dtypes(value[0])
+    if dataclasses.is_dataclass(value):
+        value = {f.name: getattr(value, f.name) for f in dataclasses.fields(value)}
+    if isinstance(value, dict):
+        return {k: str(v.dtype) for k, v in value.items() if hasattr(v, "dtype")}
+    return {}
+
+
+def _bench_stage(stage, audio_path):
+    """Executado no processo isolado: pico de memória de uma etapa"""
+    import logging
+    import tracemalloc
+
+    logging.disable(logging.INFO)
+    os.chdir(REPO_ROOT)
+    use_backend_imports()
+    from audio_decoder import load_audio
+    from audio_processor import AudioProcessor
+    from model_loader import ModelLoader
+
+    if stage == "decode":
+        fn = lambda: load_audio(str(audio_path), sr=22050)  # noqa: E731
+    elif stage == "features":
+        processor = AudioProcessor()
+        fn = lambda: processor.extract_features(str(audio_path))  # noqa: E731
+    elif stage == "model_input":
+        fn = lambda: ModelLoader.compute_spectrogram(str(audio_path))  # noqa: E731
+    else:
+        raise ValueError(f"Etapa desconhecida: {stage}")
+
+    rss_before = peak_rss_mb()
+    tracemalloc.start()
+    output = fn()
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rss_delta_mb": round(peak_rss_mb() - rss_before, 1),
+        "traced_peak_mb": round(traced_peak / (1024 * 1024), 1),
+        "dtypes": _dtypes(output),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--durations", default="60,300")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument("--output", default="bench_results/memory.json")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    durations = [float(d) for d in args.durations.split(",") if d]
+    stages = [s.strip() for s in args.stages.split(",") if s]
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="gunshot_memory_"))
+
+    baseline = {}
+    if not args.save_baseline and Path(args.baseline).exists():
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = {
+                (c["target"], c["duration_s"]): c for c in json.load(f)["results"]
+            }
+
+    results = []
+    print(
+        f"{'etapa':<12} {'dur(s)':>7} {'rss MB':>8} {'Δrss MB':>8} {'alocado MB':>11} "
+        f"{'baseline':>9}  dtypes"
+    )
+    for duration in durations:
+        audio_path = make_input(work_dir, duration, "wav", sr=INPUT_SAMPLE_RATE)
+        for stage in stages:
+            case = {
+                "benchmark": "memory",
+                "target": stage,
+                "duration_s": duration,
+                "format": "wav",
+            }
+            case.update(run_isolated(_bench_stage, stage, audio_path))
+            results.append(case)
+
+            ref = baseline.get((stage, duration), {}).get("traced_peak_mb")
+            print(
+                f"{stage:<12} {duration:>7g} {case['peak_rss_mb']:>8.1f} "
+                f"{case['rss_delta_mb']:>8.1f} {case['traced_peak_mb']:>11.1f} "
+                f"{ref if ref is not None else '-':>9}  "
+                + ",".join(sorted(set(case["dtypes"].values())))
+            )
+
+    output = save_results(args.output, results)
+    print(f"\n✓ Resultados salvos em: {output}")
+
+    if args.save_baseline:
+        save_results(args.baseline, results)
+        print(f"✓ Baseline atualizado: {args.baseline}")
+        return
+
+    if baseline:
+        regressions = compare_with_baseline(
+            results,
+            args.baseline,
+            args.tolerance,
+            metrics=("peak_rss_mb", "traced_peak_mb"),
+        )
+        for r in regressions:
+            print(
+                f"⚠️  {r['case']} {r['metric']}: {r['baseline']} → {r['current']} (+{r['change_pct']}%)"
+            )
+        if regressions:
+            sys.exit(1)
+        print("✓ Nenhuma regressão de memória em relação ao baseline")
+
+
+if __name__ == "__main__":
+    main()
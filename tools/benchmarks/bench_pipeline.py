@@ -0,0 +1,255 @@
+"""
+Benchmark ponta a ponta do pipeline de análise
+
+Mede latência (p50/p95/p99), throughput e pico de RSS para:
+  - features:  AudioProcessor.extract_features
+  - rule_based / sklearn / keras: cada caminho do ModelLoader
+  - graphs:    generate_audio_graphs
+  - http:      POST /api/analyze com requisições concorrentes (--url)
+
+Cada caso (alvo x duração x formato) roda em um processo próprio para que
+o pico de RSS seja do caso e não do benchmark inteiro.
+
+Uso:
+  python tools/benchmarks/bench_pipeline.py --durations 1,10,60 --formats wav,flac
+  python tools/benchmarks/bench_pipeline.py --targets http --url http://localhost:8000 --concurrency 8
+  python tools/benchmarks/bench_pipeline.py --save-baseline   # grava baseline.json
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import (  # noqa: E402
+    REPO_ROOT,
+    compare_with_baseline,
+    make_input,
+    peak_rss_mb,
+    print_table,
+    run_isolated,
+    save_results,
+    summarize,
+    time_calls,
+    use_backend_imports,
+)
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+MODEL_TARGETS = {"rule_based": None, "sklearn": "sklearn", "keras": "tf_keras"}
+LOCAL_TARGETS = ("features", "rule_based", "sklearn", "keras", "graphs")
+
+
+def _bench_local(target, audio_path, repeat, warmup, graphs_dir):
+    """Executado no processo isolado: mede um alvo local sobre um arquivo"""
+    import logging
+
+    logging.disable(logging.INFO)
+    os.chdir(REPO_ROOT)  # ModelLoader usa caminhos relativos (models/, IA_*)
+    use_backend_imports()
+
+    rss_before = peak_rss_mb()
+    extra = {}
+
+    if target == "features":
+        from audio_processor import AudioProcessor
+
+        processor = AudioProcessor()
+        fn = lambda: processor.extract_features(str(audio_path))  # noqa: E731
+
+    elif target in MODEL_TARGETS:
+        from audio_processor import AudioProcessor
+        from model_loader import ModelLoader
+
+        start = time.perf_counter()
+        loader = ModelLoader()
+        extra["model_load_ms"] = round((time.perf_counter() - start) * 1000.0, 3)
+
+        required = MODEL_TARGETS[target]
+        if required is not None and loader.model_framework != required:
+            return {"skipped": f"modelo {required} não carregado"}
+
+        features = AudioProcessor().extract_features(str(audio_path))
+        predictors = {
+            "rule_based": loader._rule_based_prediction,
+            "sklearn": loader._ml_prediction,
+            "keras": loader._tf_prediction,
+        }
+        predict = predictors[target]
+        fn = lambda: predict(features)  # noqa: E731
+
+    elif target == "graphs":
+        import generate_audio_graphs as graphs
+
+        graphs.GRAPHS_DIR = Path(graphs_dir)
+        graphs.GRAPHS_DIR.mkdir(parents=True, exist_ok=True)
+        fn = lambda: graphs.generate_audio_graphs(str(audio_path))  # noqa: E731
+
+    else:
+        raise ValueError(f"Alvo desconhecido: {target}")
+
+    latencies = time_calls(fn, repeat, warmup)
+    return {
+        **summarize(latencies),
+        **extra,
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def bench_http(url, audio_path, requests_total, concurrency, timeout=600):
+    """Dispara POST /api/analyze concorrentes e mede latência e throughput"""
+    import requests
+
+    endpoint = url.rstrip("/") + "/api/analyze"
+    payload = Path(audio_path).read_bytes()
+    name = Path(audio_path).name
+
+    def one_request(_):
+        start = time.perf_counter()
+        response = requests.post(
+            endpoint, files={"file": (name, payload)}, timeout=timeout
+        )
+        elapsed = time.perf_counter() - start
+        return elapsed, response.status_code
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one_request, range(requests_total)))
+    wall = time.perf_counter() - wall_start
+
+    latencies = [elapsed for elapsed, _ in outcomes]
+    errors = sum(1 for _, status in outcomes if status != 200)
+    return {
+        **summarize(latencies, wall_time=wall),
+        "concurrency": concurrency,
+        "errors": errors,
+        "peak_rss_mb": None,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline de análise")
+    parser.add_argument(
+        "--durations",
+        default="1,10,60",
+        help="Segundos, separados por vírgula (até 1800)",
+    )
+    parser.add_argument("--formats", default="wav", help="wav,flac,ogg,mp3,m4a")
+    parser.add_argument(
+        "--targets",
+        default=",".join(LOCAL_TARGETS),
+        help=f"{','.join(LOCAL_TARGETS)},http",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument(
+        "--url", default="http://localhost:8000", help="Backend para o alvo http"
+    )
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--requests", type=int, default=20, help="Total de requisições HTTP por caso"
+    )
+    parser.add_argument(
+        "--work-dir", default=None, help="Onde gerar os áudios sintéticos"
+    )
+    parser.add_argument("--output", default="bench_results/pipeline.json")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Piora tolerada (0.2 = 20%%)"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    durations = [float(d) for d in args.durations.split(",") if d]
+    formats = [f.strip().lower() for f in args.formats.split(",") if f]
+    targets = [t.strip() for t in args.targets.split(",") if t]
+
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="gunshot_bench_"))
+    graphs_dir = work_dir / "graphs"
+    results = []
+
+    for duration in durations:
+        for fmt in formats:
+            try:
+                audio_path = make_input(work_dir, duration, fmt)
+            except Exception as e:
+                for target in targets:
+                    results.append(
+                        {
+                            "benchmark": "pipeline",
+                            "target": target,
+                            "duration_s": duration,
+                            "format": fmt,
+                            "skipped": str(e),
+                        }
+                    )
+                continue
+
+            for target in targets:
+                case = {
+                    "benchmark": "pipeline",
+                    "target": target,
+                    "duration_s": duration,
+                    "format": fmt,
+                }
+                print(f"[bench] {target} | {duration:g}s | {fmt}", flush=True)
+                try:
+                    if target == "http":
+                        case.update(
+                            bench_http(
+                                args.url, audio_path, args.requests, args.concurrency
+                            )
+                        )
+                    else:
+                        case.update(
+                            run_isolated(
+                                _bench_local,
+                                target,
+                                audio_path,
+                                args.repeat,
+                                args.warmup,
+                                str(graphs_dir),
+                            )
+                        )
+                except Exception as e:
+                    case["skipped"] = f"erro: {e}"
+                results.append(case)
+
+    print()
+    print_table(results)
+
+    settings = {
+        "settings": {k: v for k, v in vars(args).items() if k != "save_baseline"}
+    }
+    output = save_results(args.output, results, settings)
+    print(f"\n✓ Resultados salvos em: {output}")
+
+    if args.save_baseline:
+        save_results(args.baseline, results, settings)
+        print(f"✓ Baseline atualizado: {args.baseline}")
+        return
+
+    if Path(args.baseline).exists():
+        regressions = compare_with_baseline(results, args.baseline, args.tolerance)
+        if regressions:
+            print(
+                f"\n⚠️  {len(regressions)} regressão(ões) acima de {args.tolerance:.0%}:"
+            )
+            for r in regressions:
+                print(
+                    f"  {r['case']} {r['metric']}: {r['baseline']} → {r['current']} (+{r['change_pct']}%)"
+                )
+            sys.exit(1)
+        print("\n✓ Nenhuma regressão em relação ao baseline")
+
+
+if __name__ == "__main__":
+    main()
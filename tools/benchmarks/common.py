@@ -0,0 +1,262 @@
+"""
+Utilitários compartilhados pelos benchmarks
+
+- Geração de áudio sintético reprodutível (tiros simulados sobre ruído
+  ambiente, no mesmo estilo de scripts/test_detector.py)
+- Escrita nos formatos aceitos pela API (wav/flac/ogg via soundfile,
+  mp3/m4a via ffmpeg quando disponível)
+- Estatísticas de latência (p50/p95/p99), pico de RSS e comparação com
+  um baseline salvo em JSON
+"""
+
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+BACKEND_DIR = REPO_ROOT / "backend"
+DEFAULT_SAMPLE_RATE = 22050
+SOUNDFILE_FORMATS = {"wav", "flac", "ogg"}
+FFMPEG_FORMATS = {"mp3": ["-codec:a", "libmp3lame"], "m4a": ["-codec:a", "aac"]}
+
+
+def use_backend_imports():
+    """Permite importar os módulos do backend (import plano, como no uvicorn)"""
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+
+
+def synthetic_gunshot(sr=DEFAULT_SAMPLE_RATE, duration=0.5, rng=None):
+    """Impulso com envelope exponencial e ruído passa-alta (tiro simulado)"""
+    from scipy.signal import butter, filtfilt
+
+    rng = rng or np.random.default_rng(0)
+    t = np.linspace(0, duration, int(sr * duration), endpoint=False)
+    envelope = np.exp(-t * 10)
+    b, a = butter(4, 1000 / (sr / 2), btype="high")
+    noise = filtfilt(b, a, rng.normal(0, 1, len(t)))
+    return (envelope * noise * 0.8).astype(np.float32)
+
+
+def synthetic_recording(
+    duration, sr=DEFAULT_SAMPLE_RATE, events_per_minute=6.0, channels=1, seed=0
+):
+    """
+    Ruído ambiente com tiros simulados em posições aleatórias
+
+    Returns:
+        Array float32 (n,) para mono ou (n, channels) para multicanal
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    audio = rng.normal(0, 0.05, n).astype(np.float32)
+
+    shot = synthetic_gunshot(sr, rng=rng)
+    n_events = max(1, int(round(duration / 60.0 * events_per_minute)))
+    for start in rng.integers(0, max(1, n - len(shot)), n_events):
+        end = min(n, start + len(shot))
+        audio[start:end] += shot[: end - start]
+
+    np.clip(audio, -1.0, 1.0, out=audio)
+    if channels == 1:
+        return audio
+
+    # Canais com pequeno atraso entre si (como um arranjo de microfones)
+    out = np.empty((n, channels), dtype=np.float32)
+    for ch in range(channels):
+        out[:, ch] = np.roll(audio, ch * 7)
+    return out
+
+
+def ffmpeg_available():
+    return shutil.which("ffmpeg") is not None
+
+
+def write_audio(path, audio, sr=DEFAULT_SAMPLE_RATE):
+    """Grava o áudio no formato indicado pela extensão de ``path``"""
+    import soundfile as sf
+
+    path = Path(path)
+    fmt = path.suffix.lstrip(".").lower()
+
+    if fmt in SOUNDFILE_FORMATS:
+        sf.write(str(path), audio, sr)
+        return path
+
+    if fmt in FFMPEG_FORMATS:
+        if not ffmpeg_available():
+            raise RuntimeError(f"ffmpeg não encontrado para gerar .{fmt}")
+        tmp_wav = path.with_suffix(".tmp.wav")
+        sf.write(str(tmp_wav), audio, sr)
+        try:
+            subprocess.run(
+                ["ffmpeg", "-y", "-loglevel", "error", "-i", str(tmp_wav)]
+                + FFMPEG_FORMATS[fmt]
+                + [str(path)],
+                check=True,
+            )
+        finally:
+            tmp_wav.unlink(missing_ok=True)
+        return path
+
+    raise ValueError(f"Formato não suportado: {fmt}")
+
+
+def make_input(work_dir, duration, fmt, sr=DEFAULT_SAMPLE_RATE, channels=1, seed=0):
+    """Gera (ou reaproveita) um arquivo sintético para o caso de benchmark"""
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    path = work_dir / f"synthetic_{duration:g}s_{channels}ch_{sr}hz.{fmt}"
+    if not path.exists():
+        write_audio(
+            path, synthetic_recording(duration, sr, channels=channels, seed=seed), sr
+        )
+    return path
+
+
+def peak_rss_mb():
+    """Pico de memória residente do processo corrente (MB)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB, macOS em bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(latencies, wall_time=None):
+    """Estatísticas de latência em milissegundos"""
+    values = np.asarray(latencies, dtype=float) * 1000.0
+    wall_time = wall_time if wall_time is not None else float(np.sum(latencies))
+    return {
+        "runs": int(values.size),
+        "mean_ms": round(float(np.mean(values)), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "min_ms": round(float(np.min(values)), 3),
+        "max_ms": round(float(np.max(values)), 3),
+        "throughput_per_s": (
+            round(values.size / wall_time, 3) if wall_time > 0 else None
+        ),
+    }
+
+
+def time_calls(fn, repeat, warmup=1):
+    """Executa ``fn`` (warmup + repeat vezes) e devolve as latências em segundos"""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_isolated(fn, *args):
+    """
+    Executa ``fn(*args)`` em um processo novo (spawn)
+
+    Cada caso tem seu próprio pico de RSS, sem contaminação de casos
+    anteriores. ``fn`` deve ser uma função de módulo (picklable).
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def environment_info():
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+    try:
+        import librosa
+
+        info["librosa"] = librosa.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def case_key(case):
+    return "|".join(
+        str(case.get(k)) for k in ("benchmark", "target", "duration_s", "format")
+    )
+
+
+def save_results(path, results, extra=None):
+    payload = {
+        "created_at": datetime.now().isoformat(),
+        "environment": environment_info(),
+        **(extra or {}),
+        "results": results,
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def compare_with_baseline(
+    results, baseline_path, tolerance=0.2, metrics=("p50_ms", "peak_rss_mb")
+):
+    """
+    Compara resultados com um baseline salvo
+
+    Returns:
+        Lista de regressões: casos cuja métrica piorou mais que ``tolerance``
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {case_key(c): c for c in json.load(f)["results"]}
+
+    regressions = []
+    for case in results:
+        ref = baseline.get(case_key(case))
+        if ref is None or case.get("skipped") or ref.get("skipped"):
+            continue
+        for metric in metrics:
+            new, old = case.get(metric), ref.get(metric)
+            if new is None or not old:
+                continue
+            change = (new - old) / old
+            if change > tolerance:
+                regressions.append(
+                    {
+                        "case": case_key(case),
+                        "metric": metric,
+                        "baseline": old,
+                        "current": new,
+                        "change_pct": round(change * 100.0, 1),
+                    }
+                )
+    return regressions
+
+
+def print_table(results):
+    header = f"{'benchmark':<12} {'target':<22} {'dur(s)':>7} {'fmt':>5} {'p50':>10} {'p95':>10} {'p99':>10} {'rss MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for case in results:
+        if case.get("skipped"):
+            print(
+                f"{case['benchmark']:<12} {case['target']:<22} {case.get('duration_s', ''):>7} "
+                f"{case.get('format', ''):>5}  (ignorado: {case['skipped']})"
+            )
+            continue
+        print(
+            f"{case['benchmark']:<12} {case['target']:<22} {case.get('duration_s', ''):>7} "
+            f"{case.get('format', ''):>5} {case['p50_ms']:>10.1f} {case['p95_ms']:>10.1f} "
+            f"{case['p99_ms']:>10.1f} {case.get('peak_rss_mb', 0):>8.1f}"
+        )
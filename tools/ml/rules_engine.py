@@ -0,0 +1,176 @@
+"""
+Motor de regras vetorizado
+
+O fallback sem modelo do backend (``ModelLoader._rule_based_prediction``) e
+o analisador standalone (``GunshotDetector.detect_gunshot_patterns``)
+pontuavam um dict de features por vez com cadeias de if. Aqui as mesmas
+regras são aplicadas a todas as linhas de uma vez: a entrada é um array
+estruturado do NumPy ou um dict de colunas (arrays 1-D do mesmo tamanho) e
+cada regra vira uma máscara booleana sobre a coluna.
+
+As regras e limiares ficam em JSON (``ml/rules/<nome>.json``):
+
+    {
+      "rules": [
+        {"name": "high_energy", "feature": "energy", "op": "gt",
+         "value": 0.7, "score": 0.3, "message": "..."},
+        {"name": "rolloff", "feature": "spectral_rolloff", "op": "gt",
+         "value": 0.85, "relative_to": "spectral_centroid",
+         "score": 0.15, "else_score": 0.05, "message": "...",
+         "else_message": "..."}
+      ],
+      "max_confidence": 1.0,
+      "detection": {"op": "ge", "value": 0.2},
+      "risk_levels": {"high": 0.7, "medium": 0.4, "low": 0.2}
+    }
+
+``op`` é gt, ge, lt, le ou between (``value`` = [mín, máx], inclusivo);
+com ``relative_to`` o limiar (ou os dois limites do between) é
+``value * coluna``. Colunas ausentes valem 0,
+como o ``features.get(x, 0)`` das versões anteriores.
+
+    rules = load_rules("backend")
+    result = rules.score({"energy": energy, "peak_frequency": peak, ...})
+    result["confidence"], result["risk_level"], result["flags"]
+"""
+
+import json
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+RULES_DIR = Path(__file__).resolve().parent / "rules"
+NO_RISK = "none"
+
+_OPS = {
+    "gt": np.greater,
+    "ge": np.greater_equal,
+    "lt": np.less,
+    "le": np.less_equal,
+}
+
+
+def _condition(values, op, threshold):
+    """Máscara booleana de ``values <op> threshold``"""
+    if op == "between":
+        low, high = threshold
+        return (values >= low) & (values <= high)
+    if op not in _OPS:
+        raise ValueError(f"Operador de regra desconhecido: {op}")
+    return _OPS[op](values, threshold)
+
+
+class RuleSet:
+    """Conjunto de regras de pontuação carregado de um config"""
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.rules = config["rules"]
+        self.names = [rule["name"] for rule in self.rules]
+        self.max_confidence = float(config.get("max_confidence", 1.0))
+        self.detection = config.get("detection", {"op": "gt", "value": 0.0})
+        # Do maior limiar para o menor: o primeiro atingido define o nível
+        levels = sorted(
+            config.get("risk_levels", {}).items(), key=lambda item: -item[1]
+        )
+        self.risk_names = np.array([name for name, _ in levels] + [NO_RISK])
+        self.risk_thresholds = np.array([value for _, value in levels])
+
+        for rule in self.rules:
+            if rule["op"] == "between":
+                if np.shape(rule["value"]) != (2,):
+                    raise ValueError(
+                        f"Regra {rule['name']}: between exige value = [mín, máx]"
+                    )
+            elif rule["op"] not in _OPS:
+                raise ValueError(
+                    f"Regra {rule['name']}: operador desconhecido {rule['op']}"
+                )
+
+    def features(self):
+        """Colunas lidas pelas regras"""
+        columns = []
+        for rule in self.rules:
+            for name in (rule["feature"], rule.get("relative_to")):
+                if name and name not in columns:
+                    columns.append(name)
+        return columns
+
+    @staticmethod
+    def _columns(data):
+        """Dict nome -> array 1-D a partir de array estruturado ou dict"""
+        if isinstance(data, np.ndarray) and data.dtype.names:
+            return {name: data[name] for name in data.dtype.names}, len(data)
+        columns = {name: np.atleast_1d(values) for name, values in data.items()}
+        n = len(next(iter(columns.values()))) if columns else 0
+        return columns, n
+
+    def score(self, data) -> dict:
+        """
+        Pontua todas as linhas em uma passada
+
+        Retorna arrays de tamanho N: ``confidence`` (float64),
+        ``gunshot_detected`` (bool), ``risk_level`` (str) e ``flags``
+        (bool, N x regras, na ordem de ``names``).
+        """
+        columns, n = self._columns(data)
+
+        def column(name):
+            values = columns.get(name)
+            if values is None:
+                return np.zeros(n)
+            return np.asarray(values, dtype=np.float64)
+
+        flags = np.empty((n, len(self.rules)), dtype=bool)
+        # Soma em float64 na ordem das regras, como a soma escalar em Python:
+        # os limiares de risco/detecção decidem exatamente igual
+        confidence = np.zeros(n)
+        for i, rule in enumerate(self.rules):
+            threshold = rule["value"]
+            if rule.get("relative_to"):
+                # (2, N) no between: cada limite escalado pela coluna
+                threshold = np.asarray(threshold, dtype=np.float64)[..., None] * column(
+                    rule["relative_to"]
+                )
+            passed = _condition(column(rule["feature"]), rule["op"], threshold)
+            flags[:, i] = passed
+            confidence += np.where(passed, rule["score"], rule.get("else_score", 0.0))
+        np.minimum(confidence, self.max_confidence, out=confidence)
+
+        detected = _condition(confidence, self.detection["op"], self.detection["value"])
+        # Índice do primeiro limiar atingido; nenhum -> NO_RISK (último)
+        codes = np.full(n, len(self.risk_thresholds))
+        if len(self.risk_thresholds):
+            reached = confidence[:, None] >= self.risk_thresholds[None, :]
+            hit = reached.any(axis=1)
+            codes[hit] = reached.argmax(axis=1)[hit]
+        return {
+            "confidence": confidence,
+            "gunshot_detected": detected,
+            "risk_level": self.risk_names[codes],
+            "flags": flags,
+        }
+
+    def messages(self, flags_row) -> list:
+        """Mensagens de uma linha de ``flags`` (a regra passou ou não)"""
+        messages = []
+        for rule, passed in zip(self.rules, flags_row):
+            message = rule.get("message") if passed else rule.get("else_message")
+            if message:
+                messages.append(message)
+        return messages
+
+
+def load_rules(name_or_path="backend") -> RuleSet:
+    """RuleSet de ``ml/rules/<nome>.json`` ou de um caminho para .json"""
+    path = Path(name_or_path)
+    if path.suffix != ".json":
+        path = RULES_DIR / f"{name_or_path}.json"
+    return _load_rules(str(path.resolve()))
+
+
+@lru_cache(maxsize=8)
+def _load_rules(path: str) -> RuleSet:
+    with open(path, "r", encoding="utf-8") as f:
+        return RuleSet(json.load(f))
@@ -10,6 +10,13 @@ from sklearn.metrics import classification_report, confusion_matrix
 import json
 from pathlib import Path
 
+try:
+    from compact_forest import export_forest
+    from feature_plan import feature_plan
+except ImportError:  # importado como pacote (ex.: backend -> ml.train_gunshot_detector)
+    from ml.compact_forest import export_forest
+    from ml.feature_plan import feature_plan
+
 
 class GunshotDetectorTrainer:
     """
@@ -39,61 +46,79 @@ class GunshotDetectorTrainer:
         try:
             # Carrega o áudio
             y, sr = librosa.load(audio_path, sr=self.sample_rate, duration=3.0)
+            return self.extract_signal_features(y, sr)
 
-            # Normaliza o áudio
-            y = librosa.util.normalize(y)
-
-            features = []
+        except Exception as e:
+            print(f"Erro ao extrair features de {audio_path}: {e}")
+            return None
 
-            # MFCCs - características importantes para classificação de áudio
-            mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=self.n_mfcc)
-            features.extend(
-                [
-                    np.mean(mfccs, axis=1),
-                    np.std(mfccs, axis=1),
-                    np.max(mfccs, axis=1),
-                    np.min(mfccs, axis=1),
-                ]
-            )
+    def extract_signal_features(self, y, sr):
+        """
+        Features de um sinal já decodificado (mesmo vetor de extract_features)
 
-            # Spectral Centroid - centro de massa do espectro
-            spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr)
-            features.extend(
-                [
-                    np.mean(spectral_centroid),
-                    np.std(spectral_centroid),
-                    np.max(spectral_centroid),
-                ]
-            )
+        Usado pelo backend para pontuar trechos de uma gravação (janelas em
+        torno de onsets) sem gravá-los em arquivo.
+        """
+        # Normaliza o áudio
+        y = librosa.util.normalize(y)
+
+        features = []
+
+        # Uma única STFT (janela, banco mel e DCT em cache) para as features espectrais
+        plan = feature_plan(sr, self.n_fft, self.hop_length, n_mfcc=self.n_mfcc)
+        magnitude = plan.magnitude(y)
+
+        # MFCCs - características importantes para classificação de áudio
+        mfccs = plan.mfcc(plan.mel_db(magnitude))
+        features.extend(
+            [
+                np.mean(mfccs, axis=1),
+                np.std(mfccs, axis=1),
+                np.max(mfccs, axis=1),
+                np.min(mfccs, axis=1),
+            ]
+        )
 
-            # Spectral Rolloff - frequência abaixo da qual está 85% da energia
-            spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)
-            features.extend([np.mean(spectral_rolloff), np.std(spectral_rolloff)])
+        # Spectral Centroid - centro de massa do espectro
+        spectral_centroid = plan.spectral_centroid(magnitude)
+        features.extend(
+            [
+                np.mean(spectral_centroid),
+                np.std(spectral_centroid),
+                np.max(spectral_centroid),
+            ]
+        )
 
-            # Zero Crossing Rate - taxa de mudança de sinal
-            zcr = librosa.feature.zero_crossing_rate(y)
-            features.extend([np.mean(zcr), np.std(zcr)])
+        # Spectral Rolloff - frequência abaixo da qual está 85% da energia
+        spectral_rolloff = plan.spectral_rolloff(magnitude)
+        features.extend([np.mean(spectral_rolloff), np.std(spectral_rolloff)])
 
-            # Chroma Features - representação de classes de pitch
-            chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-            features.extend([np.mean(chroma, axis=1), np.std(chroma, axis=1)])
+        # Zero Crossing Rate - taxa de mudança de sinal
+        zcr = librosa.feature.zero_crossing_rate(y)
+        features.extend([np.mean(zcr), np.std(zcr)])
 
-            # Spectral Contrast - diferença entre picos e vales no espectro
-            contrast = librosa.feature.spectral_contrast(y=y, sr=sr)
-            features.extend([np.mean(contrast, axis=1), np.std(contrast, axis=1)])
+        # Chroma Features - representação de classes de pitch
+        chroma = librosa.feature.chroma_stft(
+            S=magnitude**2, sr=sr, n_fft=self.n_fft, hop_length=self.hop_length
+        )
+        features.extend([np.mean(chroma, axis=1), np.std(chroma, axis=1)])
 
-            # RMS Energy - energia do sinal
-            rms = librosa.feature.rms(y=y)
-            features.extend([np.mean(rms), np.std(rms), np.max(rms)])
+        # Spectral Contrast - diferença entre picos e vales no espectro
+        contrast = librosa.feature.spectral_contrast(
+            S=magnitude, sr=sr, n_fft=self.n_fft, hop_length=self.hop_length
+        )
+        features.extend([np.mean(contrast, axis=1), np.std(contrast, axis=1)])
 
-            # Flatten todas as features
-            feature_vector = np.concatenate([np.array(f).flatten() for f in features])
+        # RMS Energy - energia do sinal
+        rms = librosa.feature.rms(y=y)
+        features.extend([np.mean(rms), np.std(rms), np.max(rms)])
 
-            return feature_vector
+        # Flatten todas as features (float32, a precisão usada pelas árvores)
+        feature_vector = np.concatenate(
+            [np.asarray(f, dtype=np.float32).ravel() for f in features]
+        )
 
-        except Exception as e:
-            print(f"Erro ao extrair features de {audio_path}: {e}")
-            return None
+        return feature_vector
 
     def prepare_dataset(self, gunshot_dir, non_gunshot_dir):
         """
@@ -124,7 +149,7 @@ class GunshotDetectorTrainer:
                 y.append(0)  # 0 = não-tiro
                 print(f"✓ Processado: {audio_file.name}")
 
-        X = np.array(X)
+        X = np.array(X, dtype=np.float32)
         y = np.array(y)
 
         print(f"\n{'='*50}")
@@ -230,9 +255,13 @@ class GunshotDetectorTrainer:
         self,
         model_path="models/gunshot_detector.pkl",
         metadata_path="models/model_metadata.json",
+        compact_dir=None,
     ):
         """
         Salva o modelo treinado
+
+        Além do pickle, grava o formato compacto em ``<model_path>_compact/``
+        (ou em ``compact_dir``), com o scaler embutido.
         """
         os.makedirs(os.path.dirname(model_path), exist_ok=True)
 
@@ -266,6 +295,18 @@ class GunshotDetectorTrainer:
         print(f"✓ Modelo salvo em: {model_path}")
         print(f"✓ Metadados salvos em: {metadata_path}")
 
+        # Exporta também o formato compacto (memory-mappable) usado pelo backend
+        if compact_dir is None:
+            root, _ = os.path.splitext(model_path)
+            compact_dir = root + "_compact"
+        try:
+            export_forest(
+                self.model, compact_dir, scaler=self.feature_scaler, metadata=metadata
+            )
+            print(f"✓ Modelo compacto salvo em: {compact_dir}")
+        except Exception as e:
+            print(f"Erro ao exportar modelo compacto: {e}")
+
     def load_model(
         self,
         model_path="models/gunshot_detector.pkl",
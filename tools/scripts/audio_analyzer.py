@@ -3,19 +3,29 @@ import librosa
 import scipy.signal
 from scipy.stats import kurtosis, skew
 import json
+import os
+import socket
+import stat
 import sys
 from pathlib import Path
 
+# Plano de features (janela, banco mel e DCT em cache) compartilhado com o
+# backend e o treino: ml/ é irmão de scripts/ no repositório e nas imagens
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ml"))
+from feature_plan import feature_plan  # noqa: E402
+from rules_engine import load_rules  # noqa: E402
+
+# Diretório de runtime do usuário (XDG_RUNTIME_DIR, só ele escreve) quando existe
+DEFAULT_SOCKET = os.getenv(
+    "ANALYZER_SOCKET",
+    os.path.join(os.getenv("XDG_RUNTIME_DIR") or "/tmp", "gunshot-analyzer.sock"),
+)
+
 
 class GunshotDetector:
-    def __init__(self):
-        # Características típicas de tiros
-        self.gunshot_features = {
-            "duration_range": (0.1, 2.0),  # segundos
-            "frequency_peak_range": (200, 8000),  # Hz
-            "energy_threshold": 0.7,
-            "spectral_rolloff_threshold": 0.85,
-        }
+    def __init__(self, rules="analyzer"):
+        # Características típicas de tiros (faixas e limiares em ml/rules/)
+        self.rules = load_rules(rules)
 
     def load_audio(self, file_path, sr=22050):
         """Carrega arquivo de áudio"""
@@ -37,27 +47,27 @@ class GunshotDetector:
             librosa.feature.zero_crossing_rate(audio)
         )
 
-        # Características espectrais
-        stft = librosa.stft(audio)
-        magnitude = np.abs(stft)
+        # Características espectrais: uma única STFT compartilhada por todas
+        # as features (centroide, rolloff, largura de banda, MFCC e onsets)
+        plan = feature_plan(sr)
+        magnitude = plan.magnitude(audio)
 
         # Centroide espectral
-        features["spectral_centroid"] = np.mean(
-            librosa.feature.spectral_centroid(y=audio, sr=sr)
-        )
+        features["spectral_centroid"] = np.mean(plan.spectral_centroid(magnitude))
 
         # Rolloff espectral
-        features["spectral_rolloff"] = np.mean(
-            librosa.feature.spectral_rolloff(y=audio, sr=sr)
-        )
+        features["spectral_rolloff"] = np.mean(plan.spectral_rolloff(magnitude))
 
         # Largura de banda espectral
         features["spectral_bandwidth"] = np.mean(
-            librosa.feature.spectral_bandwidth(y=audio, sr=sr)
+            librosa.feature.spectral_bandwidth(S=magnitude, sr=sr)
         )
 
+        # Log-mel (mesmos parâmetros padrão do librosa para mfcc e onset)
+        mel_db = plan.mel_db(magnitude)
+
         # MFCC (Mel-frequency cepstral coefficients)
-        mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=13)
+        mfccs = plan.mfcc(mel_db)
         features["mfcc_mean"] = np.mean(mfccs, axis=1)
         features["mfcc_std"] = np.std(mfccs, axis=1)
 
@@ -66,84 +76,30 @@ class GunshotDetector:
         features["skewness"] = skew(audio)
 
         # Picos de energia
-        onset_frames = librosa.onset.onset_detect(y=audio, sr=sr)
+        onset_envelope = plan.onset_strength(mel_db)
+        onset_frames = librosa.onset.onset_detect(onset_envelope=onset_envelope, sr=sr)
         features["onset_count"] = len(onset_frames)
 
         return features
 
     def detect_gunshot_patterns(self, features):
         """Detecta padrões característicos de tiros"""
-        score = 0.0
-        confidence_factors = []
-
-        # Análise de duração
-        duration = features["duration"]
-        if (
-            self.gunshot_features["duration_range"][0]
-            <= duration
-            <= self.gunshot_features["duration_range"][1]
-        ):
-            duration_score = 0.2
-            confidence_factors.append("Duração compatível com tiro")
-        else:
-            duration_score = 0.0
-            confidence_factors.append("Duração não típica de tiro")
-
-        score += duration_score
-
-        # Análise de energia
-        energy = features["rms_energy"]
-        if energy > self.gunshot_features["energy_threshold"]:
-            energy_score = 0.25
-            confidence_factors.append("Alta energia detectada")
-        else:
-            energy_score = 0.1
-            confidence_factors.append("Energia baixa")
-
-        score += energy_score
-
-        # Análise espectral
-        centroid = features["spectral_centroid"]
-        if (
-            self.gunshot_features["frequency_peak_range"][0]
-            <= centroid
-            <= self.gunshot_features["frequency_peak_range"][1]
-        ):
-            spectral_score = 0.2
-            confidence_factors.append("Frequência central compatível")
-        else:
-            spectral_score = 0.05
-            confidence_factors.append("Frequência central atípica")
-
-        score += spectral_score
-
-        # Análise de rolloff espectral
-        rolloff = features["spectral_rolloff"]
-        if (
-            rolloff
-            > self.gunshot_features["spectral_rolloff_threshold"]
-            * features["spectral_centroid"]
-        ):
-            rolloff_score = 0.15
-            confidence_factors.append("Distribuição espectral típica de impacto")
-        else:
-            rolloff_score = 0.05
-            confidence_factors.append("Distribuição espectral não típica")
-
-        score += rolloff_score
-
-        # Análise de onset (início súbito)
-        onset_count = features["onset_count"]
-        if onset_count >= 1:
-            onset_score = 0.2
-            confidence_factors.append("Início súbito detectado")
-        else:
-            onset_score = 0.0
-            confidence_factors.append("Sem início súbito claro")
-
-        score += onset_score
-
-        return min(score, 1.0), confidence_factors
+        scored = self.score_features([features])
+        return float(scored["confidence"][0]), self.rules.messages(scored["flags"][0])
+
+    def score_features(self, features_list):
+        """
+        Pontua vários dicts de features em uma única passada do motor de regras
+
+        Returns:
+            dict de arrays (confidence, gunshot_detected, risk_level, flags)
+        """
+        return self.rules.score(
+            {
+                name: [features.get(name, 0) for features in features_list]
+                for name in self.rules.features()
+            }
+        )
 
     def analyze_audio_file(self, file_path):
         """Análise completa de um arquivo de áudio"""
@@ -165,8 +121,11 @@ class GunshotDetector:
         print(f"[v0] Características extraídas: {len(features)} features")
 
         # Detecta padrões de tiro
-        confidence, factors = self.detect_gunshot_patterns(features)
-        is_gunshot = confidence > 0.6  # Threshold para classificação
+        scored = self.score_features([features])
+        confidence = float(scored["confidence"][0])
+        factors = self.rules.messages(scored["flags"][0])
+        # Threshold para classificação: "detection" em ml/rules/analyzer.json
+        is_gunshot = bool(scored["gunshot_detected"][0])
 
         print(
             f"[v0] Análise concluída: {'TIRO' if is_gunshot else 'NÃO É TIRO'} (confiança: {confidence:.2f})"
@@ -190,29 +149,30 @@ class GunshotDetector:
         }
 
 
-def main():
-    if len(sys.argv) != 2:
-        result = {
-            "error": "Uso incorreto. Forneça o caminho do arquivo de áudio.",
-            "is_gunshot": False,
-            "confidence": 0.0,
-        }
-        print(json.dumps(result))
-        sys.exit(1)
+def json_default(value):
+    """Converte tipos NumPy (float32, int64, arrays) para JSON"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
 
-    file_path = sys.argv[1]
+def analyze_to_output(detector, file_path):
+    """
+    Analisa um arquivo e monta a saída JSON da CLI
 
+    Returns:
+        (output, ok): dicionário no formato da CLI e se a análise teve sucesso
+    """
     if not Path(file_path).exists():
-        result = {
+        return {
             "error": f"Arquivo não encontrado: {file_path}",
             "is_gunshot": False,
             "confidence": 0.0,
-        }
-        print(json.dumps(result))
-        sys.exit(1)
+        }, False
 
     try:
-        detector = GunshotDetector()
         result = detector.analyze_audio_file(file_path)
 
         output = {
@@ -222,16 +182,135 @@ def main():
             "confidence_factors": result.get("confidence_factors", []),
             "file_info": result.get("file_info", {}),
         }
-
-        print(json.dumps(output))
+        return output, True
 
     except Exception as e:
-        error_result = {
+        return {
             "error": f"Erro durante análise: {str(e)}",
             "gunshot_detected": False,
             "confidence": 0.0,
+        }, False
+
+
+def handle_request(detector, line):
+    """Atende uma linha do protocolo JSON Lines: {"file": "<caminho>", "id": ...}"""
+    try:
+        request = json.loads(line)
+        file_path = request["file"]
+    except (ValueError, KeyError, TypeError):
+        return {
+            "error": 'Pedido inválido. Envie {"file": "<caminho>"} por linha.',
+            "gunshot_detected": False,
+            "confidence": 0.0,
+        }
+
+    output, _ = analyze_to_output(detector, file_path)
+    if "id" in request:
+        output["id"] = request["id"]
+    return output
+
+
+def warm_up(detector):
+    """Aquece librosa/numba (JIT) antes do primeiro pedido real"""
+    sr = 22050
+    audio = np.random.default_rng(0).normal(0, 0.1, sr).astype(np.float32)
+    detector.extract_features(audio, sr)
+
+
+def serve_stdio(detector, out):
+    """Modo daemon via stdin/stdout: um pedido JSON por linha, uma resposta por linha"""
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        output = handle_request(detector, line)
+        out.write(json.dumps(output, default=json_default) + "\n")
+        out.flush()
+
+
+def remove_stale_socket(socket_path):
+    """Remove o socket de um daemon que já parou; recusa outros arquivos"""
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise RuntimeError(f"{socket_path} existe e não é um socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            os.unlink(socket_path)  # ninguém ouvindo
+            return
+    raise RuntimeError(f"Outro processo já ouve em {socket_path}")
+
+
+def serve_socket(detector, socket_path=DEFAULT_SOCKET):
+    """
+    Modo daemon via socket Unix (mesmo protocolo JSON Lines, várias conexões)
+
+    O socket é criado com permissão 0600: só o mesmo usuário pede análises.
+    """
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                output = handle_request(detector, line.decode("utf-8"))
+                self.wfile.write(
+                    (json.dumps(output, default=json_default) + "\n").encode("utf-8")
+                )
+                self.wfile.flush()
+
+    remove_stale_socket(socket_path)
+    # A umask vale no bind, antes de qualquer conexão ser possível
+    previous = os.umask(0o177)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+    finally:
+        os.umask(previous)
+    os.chmod(socket_path, 0o600)
+    inode = os.stat(socket_path).st_ino
+
+    with server:
+        print(f"[v0] Daemon do analisador ouvindo em {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        finally:
+            # Só remove o próprio socket (o caminho pode ter sido reutilizado)
+            try:
+                if os.stat(socket_path).st_ino == inode:
+                    os.unlink(socket_path)
+            except FileNotFoundError:
+                pass
+
+
+def main():
+    if len(sys.argv) >= 2 and sys.argv[1] in ("--daemon", "--stdio"):
+        # Logs "[v0]" do detector vão para stderr para não corromper o protocolo
+        protocol_out, sys.stdout = sys.stdout, sys.stderr
+        detector = GunshotDetector()
+        warm_up(detector)
+        if sys.argv[1] == "--stdio":
+            serve_stdio(detector, protocol_out)
+        else:
+            serve_socket(detector, sys.argv[2] if len(sys.argv) > 2 else DEFAULT_SOCKET)
+        return
+
+    if len(sys.argv) != 2:
+        result = {
+            "error": "Uso incorreto. Forneça o caminho do arquivo de áudio.",
+            "is_gunshot": False,
+            "confidence": 0.0,
         }
-        print(json.dumps(error_result))
+        print(json.dumps(result))
+        sys.exit(1)
+
+    detector = GunshotDetector()
+    output, ok = analyze_to_output(detector, sys.argv[1])
+    print(json.dumps(output, default=json_default))
+    if not ok:
         sys.exit(1)
 
 
@@ -1,28 +1,104 @@
 import os
 import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from audio_analyzer import GunshotDetector
+import numpy as np
 import time
 
-
-def analyze_directory(directory_path, output_file=None):
-    """Analisa todos os arquivos de áudio em um diretório"""
-    detector = GunshotDetector()
-    results = []
-
-    # Extensões de áudio suportadas
-    audio_extensions = {".wav", ".mp3", ".flac", ".m4a", ".ogg"}
-
+# Extensões de áudio suportadas
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".flac", ".m4a", ".ogg"}
+
+# Detector por processo (criado uma vez em cada worker do pool)
+_detector = None
+
+
+def iter_audio_files(directory):
+    """Percorre o diretório uma única vez, sem duplicatas, em ordem estável"""
+    seen = set()
+    for path in sorted(Path(directory).rglob("*")):
+        if not path.is_file() or path.suffix.lower() not in AUDIO_EXTENSIONS:
+            continue
+        resolved = path.resolve()
+        if resolved in seen:
+            continue
+        seen.add(resolved)
+        yield path
+
+
+def load_completed(output_file):
+    """Caminhos já analisados com sucesso em uma execução anterior (JSON Lines)"""
+    completed = set()
+    if not output_file or not Path(output_file).exists():
+        return completed
+
+    with open(output_file, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Última linha truncada por uma interrupção
+                continue
+            if "error" not in record and "file_path" in record:
+                completed.add(record["file_path"])
+    return completed
+
+
+def _json_default(value):
+    """Converte tipos NumPy para JSON"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+def _init_worker():
+    global _detector
+    _detector = GunshotDetector()
+
+
+def analyze_file(file_path):
+    """Analisa um arquivo (executado no processo principal ou em um worker)"""
+    global _detector
+    if _detector is None:
+        _detector = GunshotDetector()
+
+    start_time = time.time()
+    try:
+        result = _detector.analyze_audio_file(file_path)
+    except Exception as e:
+        result = {"error": str(e), "is_gunshot": False, "confidence": 0.0}
+    analysis_time = time.time() - start_time
+
+    result["file_path"] = file_path
+    result["file_name"] = Path(file_path).name
+    result["analysis_time_seconds"] = round(analysis_time, 2)
+    return result
+
+
+def analyze_directory(directory_path, output_file=None, workers=1, resume=True):
+    """
+    Analisa todos os arquivos de áudio em um diretório
+
+    Args:
+        directory_path: Diretório (percorrido recursivamente)
+        output_file: Arquivo JSON Lines; cada resultado é gravado ao terminar
+        workers: Número de processos (1 = sequencial)
+        resume: Pula arquivos já presentes em ``output_file``
+    """
     directory = Path(directory_path)
     if not directory.exists():
         print(f"Erro: Diretório não encontrado: {directory_path}")
         return
 
     # Encontra todos os arquivos de áudio
-    audio_files = []
-    for ext in audio_extensions:
-        audio_files.extend(directory.glob(f"*{ext}"))
-        audio_files.extend(directory.glob(f"**/*{ext}"))
+    # Caminhos absolutos: a retomada funciona mesmo chamada de outro diretório
+    audio_files = [str(p.resolve()) for p in iter_audio_files(directory)]
 
     if not audio_files:
         print("Nenhum arquivo de áudio encontrado no diretório.")
@@ -30,56 +106,99 @@ def analyze_directory(directory_path, output_file=None):
 
     print(f"[v0] Encontrados {len(audio_files)} arquivos de áudio")
 
-    # Analisa cada arquivo
-    for i, file_path in enumerate(audio_files, 1):
-        print(f"\n[v0] Analisando {i}/{len(audio_files)}: {file_path.name}")
-
-        start_time = time.time()
-        result = detector.analyze_audio_file(str(file_path))
-        analysis_time = time.time() - start_time
+    if resume and output_file:
+        completed = load_completed(output_file)
+        pending = [f for f in audio_files if f not in completed]
+        if len(pending) < len(audio_files):
+            print(f"[v0] Retomando: {len(audio_files) - len(pending)} já analisados")
+        audio_files = pending
+    elif output_file and Path(output_file).exists():
+        Path(output_file).unlink()
 
-        result["file_path"] = str(file_path)
-        result["file_name"] = file_path.name
-        result["analysis_time_seconds"] = round(analysis_time, 2)
+    results = []
+    out = open(output_file, "a", encoding="utf-8") if output_file else None
 
+    def record(i, result):
         results.append(result)
+        if out is not None:
+            out.write(
+                json.dumps(result, ensure_ascii=False, default=_json_default) + "\n"
+            )
+            out.flush()
 
         # Mostra resultado resumido
-        status = "TIRO" if result["is_gunshot"] else "NORMAL"
-        confidence = result["confidence"]
+        status = "TIRO" if result.get("is_gunshot") else "NORMAL"
+        if "error" in result:
+            status = f"ERRO ({result['error']})"
+        confidence = result.get("confidence", 0.0)
         print(
-            f"    Resultado: {status} (confiança: {confidence:.2f}) - {analysis_time:.2f}s"
+            f"    [{i}/{len(audio_files)}] {result['file_name']}: {status} "
+            f"(confiança: {confidence:.2f}) - {result['analysis_time_seconds']:.2f}s"
         )
 
-    # Salva resultados
+    try:
+        if workers <= 1:
+            for i, file_path in enumerate(audio_files, 1):
+                print(
+                    f"\n[v0] Analisando {i}/{len(audio_files)}: {Path(file_path).name}"
+                )
+                record(i, analyze_file(file_path))
+        else:
+            print(f"[v0] Usando {workers} processos")
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker
+            ) as pool:
+                futures = [pool.submit(analyze_file, f) for f in audio_files]
+                for i, future in enumerate(as_completed(futures), 1):
+                    record(i, future.result())
+    finally:
+        if out is not None:
+            out.close()
+
     if output_file:
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(results, f, indent=2, ensure_ascii=False)
         print(f"\n[v0] Resultados salvos em: {output_file}")
 
     # Estatísticas finais
-    gunshots_detected = sum(1 for r in results if r["is_gunshot"])
+    gunshots_detected = sum(1 for r in results if r.get("is_gunshot"))
     total_files = len(results)
 
     print(f"\n[v0] RESUMO DA ANÁLISE:")
     print(f"    Total de arquivos: {total_files}")
     print(f"    Tiros detectados: {gunshots_detected}")
-    print(f"    Taxa de detecção: {gunshots_detected/total_files*100:.1f}%")
+    if total_files:
+        print(f"    Taxa de detecção: {gunshots_detected/total_files*100:.1f}%")
 
     return results
 
 
 def main():
-    import sys
-
-    if len(sys.argv) < 2:
-        print("Uso: python batch_analyzer.py <diretório> [arquivo_saída.json]")
-        sys.exit(1)
-
-    directory_path = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else "analysis_results.json"
-
-    analyze_directory(directory_path, output_file)
+    parser = argparse.ArgumentParser(
+        description="Analisa todos os áudios de um diretório"
+    )
+    parser.add_argument("directory", help="Diretório com arquivos de áudio")
+    parser.add_argument(
+        "output",
+        nargs="?",
+        default="analysis_results.jsonl",
+        help="Arquivo de saída JSON Lines (padrão: analysis_results.jsonl)",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Número de processos (padrão: núcleos disponíveis)",
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Reanalisa tudo, sobrescrevendo o arquivo de saída",
+    )
+    args = parser.parse_args()
+
+    analyze_directory(
+        args.directory, args.output, workers=args.workers, resume=not args.no_resume
+    )
 
 
 if __name__ == "__main__":